@@ -1,9 +1,12 @@
-from flask import Flask, jsonify
+from flask import Flask, g, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
 import os
-from joblib import load
+import sys
+from .cache import PredictionCache
+from .registry import ModelRegistry
+from .warmup import Warmup
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -12,9 +15,60 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object('app.config.Config')
     
+    # ===== DATABASE POOL =====
+    # Engine options for DB_POOL_PROFILE; must be settled before the
+    # engine is created
+    from .dbpool import PoolKeepalive, engine_options
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config, app.config['SQLALCHEMY_DATABASE_URI'])
+    if app.config['DB_POOL_PROFILE'] == 'background':
+        app.pool_keepalive = PoolKeepalive(app, interval=app.config['DB_POOL_PING_INTERVAL'])
+        
+        @app.before_request
+        def keep_pool_alive():
+            app.pool_keepalive.ensure_running()
+    else:
+        app.pool_keepalive = None
+    
+    # ===== METRICS =====
+    # Set up before the engine is created so its pool can time checkouts,
+    # and before the other hooks so request timings include them
+    from .metrics import Metrics, component_gauges, model_gauges, pool_gauges, timed_pool_options
+    app.metrics = Metrics(enabled=app.config['METRICS_ENABLED'])
+    if app.metrics.enabled:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = timed_pool_options(
+            app.config['SQLALCHEMY_DATABASE_URI'], app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        )
+        app.metrics.add_gauges(lambda: pool_gauges(db.engine))
+        app.metrics.add_gauges(lambda: model_gauges(app.model_registry))
+        app.metrics.add_gauges(lambda: component_gauges(component_status(app)))
+        
+        @app.before_request
+        def start_request_timer():
+            g.metrics_started = app.metrics.start_request(request.endpoint)
+        
+        @app.after_request
+        def record_request(response):
+            started = g.pop('metrics_started', None)
+            if started is not None:
+                rule = request.url_rule
+                # Unmatched paths share one series to bound cardinality
+                app.metrics.finish_request(started, rule.rule if rule else 'unmatched',
+                                           request.method, response.status_code)
+            return response
+        
+        @app.route('/metrics')
+        def metrics():
+            return app.response_class(app.metrics.render(), mimetype='text/plain; version=0.0.4')
+    
     db.init_app(app)
     migrate.init_app(app, db)
     
+    # ===== JSON =====
+    # orjson-backed encoding/decoding with byte-identical output
+    if app.config['JSON_ENGINE'] == 'orjson':
+        from .fastjson import FastJSONProvider
+        app.json = FastJSONProvider(app)
+    
     # ===== FIX CORS =====
     # Tambahkan CORS untuk allow semua origin
     CORS(app, resources={
@@ -35,19 +89,141 @@ def create_app():
     #     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
     #     return response
     
+    # ===== PREDICTION CACHE =====
+    app.prediction_cache = PredictionCache(
+        max_entries=app.config['PREDICT_CACHE_MAX_ENTRIES'],
+        ttl=app.config['PREDICT_CACHE_TTL'],
+        max_bytes=app.config['PREDICT_CACHE_MAX_BYTES'],
+        redis_url=app.config['PREDICT_CACHE_REDIS_URL']
+    )
+    app.explanation_cache = PredictionCache(
+        max_entries=app.config['PREDICT_EXPLAIN_CACHE_MAX_ENTRIES'],
+        ttl=app.config['PREDICT_CACHE_TTL'],
+        max_bytes=app.config['PREDICT_EXPLAIN_CACHE_MAX_BYTES'],
+        redis_url=app.config['PREDICT_CACHE_REDIS_URL'],
+        namespace='explain'
+    )
+    app.model_fingerprint = None
+    
     # ===== LOAD MODEL =====
-    # Load model once at startup with error handling
-    try:
-        pipeline_path = os.path.join(app.root_path, 'ml', 'rf_model.joblib')
-        if os.path.exists(pipeline_path):
-            app.pipeline = load(pipeline_path)
-            print(f"✅ Pipeline loaded successfully from {pipeline_path}")
-        else:
-            print(f"⚠️  Pipeline file not found at {pipeline_path}")
-            app.pipeline = None
-    except Exception as e:
-        print(f"❌ Error loading pipeline: {e}")
-        app.pipeline = None
+    # Loaded by the warmup: here, once for all preloaded workers, with
+    # MODEL_WARMUP='eager', or per process in the background (see
+    # app/config.py); the registry then watches the file and hot-swaps in
+    # new versions without a restart
+    model_path = app.config['MODEL_PATH'] or os.path.join(app.root_path, 'ml', 'rf_model.joblib')
+    app.pipeline = None
+    app.engine = None
+    app.model_registry = ModelRegistry(
+        app, model_path, poll_interval=app.config['MODEL_POLL_INTERVAL']
+    )
+    app.warmup = Warmup(app)
+    if app.config['MODEL_WARMUP'] == 'eager':
+        app.warmup.run()
+    
+    @app.before_request
+    def watch_model():
+        # The watcher only starts after the first load, so the two never race
+        if app.warmup.ensure_started():
+            app.model_registry.ensure_watching()
+    
+    # ===== INFERENCE EXECUTOR =====
+    # Optional pool of model processes; started lazily per worker
+    if app.config['PREDICT_EXECUTOR'] == 'process':
+        from .executor import InferencePool
+        app.inference_pool = InferencePool(
+            app,
+            processes=app.config['PREDICT_POOL_PROCESSES'],
+            max_queue=app.config['PREDICT_POOL_MAX_QUEUE'],
+            timeout=app.config['PREDICT_POOL_TIMEOUT'],
+            queue_timeout=app.config['PREDICT_POOL_QUEUE_TIMEOUT'],
+            health_interval=app.config['PREDICT_POOL_HEALTH_INTERVAL']
+        )
+        
+        @app.before_request
+        def start_inference_pool():
+            app.inference_pool.ensure_started()
+    else:
+        app.inference_pool = None
+    
+    # ===== MICRO-BATCHING =====
+    # Coalesces concurrent single-row predictions (threaded workers only)
+    if app.config['PREDICT_MICROBATCH_ENABLED']:
+        from .batching import MicroBatcher
+        app.micro_batcher = MicroBatcher(
+            max_wait=app.config['PREDICT_MICROBATCH_MAX_WAIT_MS'] / 1000,
+            max_rows=app.config['PREDICT_MICROBATCH_MAX_ROWS'],
+            score=app.inference_pool.score if app.inference_pool else None
+        )
+    else:
+        app.micro_batcher = None
+    
+    # ===== PREDICTION PERSISTENCE =====
+    # 'sync' commits each prediction on the request thread, 'async' hands
+    # records to a background write-behind flusher
+    from .persistence import PredictionWriter
+    if app.config['PREDICTION_WRITE_MODE'] == 'async':
+        app.prediction_writer = PredictionWriter(
+            app,
+            max_queue=app.config['PREDICTION_WRITE_MAX_QUEUE'],
+            batch_size=app.config['PREDICTION_WRITE_BATCH_SIZE'],
+            flush_interval=app.config['PREDICTION_WRITE_FLUSH_INTERVAL'],
+            put_timeout=app.config['PREDICTION_WRITE_PUT_TIMEOUT']
+        )
+    else:
+        app.prediction_writer = None
+    
+    # ===== PREDICTION PARTITIONS =====
+    # Creates upcoming monthly partitions ahead of time; exits on its own
+    # when `prediction` isn't partitioned
+    from .partitions import PartitionMaintainer
+    app.partition_maintainer = PartitionMaintainer(
+        app,
+        months_ahead=app.config['PREDICTION_PARTITION_MONTHS_AHEAD'],
+        interval=app.config['PREDICTION_PARTITION_CHECK_INTERVAL']
+    )
+    
+    @app.before_request
+    def maintain_partitions():
+        app.partition_maintainer.ensure_running()
+    
+    # ===== ADMISSION CONTROL =====
+    # Sheds prediction and auth requests early (429/503 + Retry-After)
+    # instead of letting them queue; /health and /user/* are never held
+    from .admission import AdmissionControl, Lane, TokenBuckets
+    if app.config['ADMISSION_ENABLED']:
+        lane_options = dict(max_queue=app.config['ADMISSION_MAX_QUEUE'],
+                            max_wait=app.config['ADMISSION_MAX_WAIT'])
+        app.admission = AdmissionControl(
+            [Lane('predict', app.config['ADMISSION_PREDICT_MAX_IN_FLIGHT'], **lane_options),
+             Lane('auth', app.config['ADMISSION_AUTH_MAX_IN_FLIGHT'], **lane_options)],
+            user_buckets=TokenBuckets(app.config['RATE_LIMIT_PER_USER'], app.config['RATE_LIMIT_BURST'])
+            if app.config['RATE_LIMIT_PER_USER'] > 0 else None,
+            max_queue_time=app.config['ADMISSION_MAX_QUEUE_TIME']
+        )
+    else:
+        app.admission = None
+    
+    # ===== AUTH CACHE =====
+    # Verified tokens and user snapshots, so authenticated requests can
+    # skip jwt.decode and the user lookup
+    from .security import AuthCache
+    if app.config['AUTH_CACHE_ENABLED']:
+        app.auth_cache = AuthCache(
+            ttl=app.config['AUTH_CACHE_TTL'],
+            max_entries=app.config['AUTH_CACHE_MAX_ENTRIES']
+        )
+    else:
+        app.auth_cache = None
+    
+    # ===== PASSWORD HASHING =====
+    # Bounded pool for the KDF so login bursts can't take every core
+    from .hashing import PasswordHasher
+    app.password_hasher = PasswordHasher(
+        method=app.config['PASSWORD_HASH_METHOD'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_queue=app.config['PASSWORD_HASH_MAX_QUEUE'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT']
+    )
     
     # ===== HEALTH CHECK ENDPOINTS =====
     @app.route('/')
@@ -55,23 +231,20 @@ def create_app():
         return jsonify({
             'status': 'healthy',
             'message': 'Flask API is running',
-            'model_loaded': app.model is not None
+            'model_loaded': app.pipeline is not None
         }), 200
     
     @app.route('/health')
     def health():
         try:
             # Test database connection
-            db.session.execute('SELECT 1')
+            db.session.execute(db.text('SELECT 1'))
             db_status = 'connected'
         except Exception as e:
             db_status = f'error: {str(e)}'
         
-        return jsonify({
-            'status': 'ok',
-            'database': db_status,
-            'model': 'loaded' if app.model else 'not loaded'
-        }), 200
+        return jsonify(dict(component_status(app), status='ok', database=db_status,
+                            database_pool=database_pool_status(app, db.engine))), 200
     
     # ===== REGISTER BLUEPRINTS =====
     from .auth import bp as auth_bp
@@ -82,4 +255,43 @@ def create_app():
     app.register_blueprint(predict_bp, url_prefix='/api')
     app.register_blueprint(user_bp, url_prefix='/user')
     
-    return app
\ No newline at end of file
+    # ===== CLI COMMANDS =====
+    from .commands import register_commands
+    register_commands(app)
+    
+    return app
+
+
+def database_pool_status(app, engine):
+    """Live pool counters plus the configured DB_POOL_PROFILE."""
+    from .dbpool import pool_budget, pool_status
+    status = dict(pool_status(engine), profile=app.config['DB_POOL_PROFILE'])
+    if status['profile'] in ('budget', 'background'):
+        status['budget'] = {
+            'total': app.config['DB_CONNECTION_BUDGET'],
+            'reserve': app.config['DB_CONNECTION_RESERVE'],
+            'workers': app.config['DB_POOL_WORKERS'],
+            'per_worker': pool_budget(app.config),
+        }
+    if app.pool_keepalive is not None:
+        status['keepalive'] = app.pool_keepalive.stats()
+    return status
+
+
+def component_status(app):
+    """Model and in-process component stats reported by /health."""
+    return {
+        'model': 'loaded' if app.pipeline is not None else 'not loaded',
+        'model_fingerprint': app.model_fingerprint,
+        'model_registry': app.model_registry.status(),
+        'readiness': app.warmup.stats(),
+        'prediction_cache': app.prediction_cache.stats(),
+        'explanation_cache': app.explanation_cache.stats() if app.config['PREDICT_EXPLAIN_ENABLED'] else None,
+        'prediction_writer': app.prediction_writer.stats() if app.prediction_writer else {'mode': 'sync'},
+        'partition_maintainer': app.partition_maintainer.stats(),
+        'auth_cache': app.auth_cache.stats() if app.auth_cache else None,
+        'admission': app.admission.stats() if app.admission else None,
+        'password_hasher': app.password_hasher.stats(),
+        'micro_batcher': app.micro_batcher.stats() if app.micro_batcher else None,
+        'inference_pool': app.inference_pool.stats() if app.inference_pool else {'mode': 'inline'}
+    }
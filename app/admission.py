@@ -0,0 +1,291 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+
+class AdmissionRejected(Exception):
+    """A request turned away before doing any work.
+
+    `status` is 429 for a user over their rate limit and 503 when the
+    worker is saturated; `retry_after` is the suggested wait in seconds.
+    """
+
+    def __init__(self, message, status=503, retry_after=1):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    def headers(self):
+        return {'Retry-After': str(max(1, math.ceil(self.retry_after)))}
+
+
+def rejected(e):
+    return jsonify({'msg': str(e)}), e.status, e.headers()
+
+
+def queue_seconds(headers, now=None):
+    """Time a request spent queued upstream, from X-Request-Start.
+
+    Accepts the router's milliseconds since the epoch (Heroku) or nginx's
+    `t=<seconds.millis>` / `t=<microseconds>`; None when absent or garbled.
+    """
+    value = headers.get('X-Request-Start')
+    if not value:
+        return None
+    try:
+        started = float(value[2:] if value.startswith('t=') else value)
+    except ValueError:
+        return None
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return max(0.0, (now or time.time()) - started)
+
+
+class TokenBuckets:
+    """Per-key token buckets: `rate` tokens a second, up to `burst`.
+
+    Buckets are refilled lazily when touched and the least recently used
+    are dropped past `max_keys`; a dropped bucket comes back full.
+    """
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def take(self, key, cost=1):
+        """Spend `cost` tokens; returns 0 if allowed, else seconds until it would be."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                self.limited += 1
+                wait = (cost - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'keys': len(self._buckets),
+                'limited': self.limited,
+            }
+
+
+class Lane:
+    """Caps concurrent requests of one kind in this worker.
+
+    Up to `max_in_flight` run at once; up to `max_queue` more wait at most
+    `max_wait` seconds for a slot. Anything beyond that is rejected
+    straight away, so clients are told to back off quickly rather than
+    waiting and timing out; the moving service time sizes Retry-After.
+    """
+
+    def __init__(self, name, max_in_flight, max_queue=32, max_wait=0.5):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Moving average of the time an admitted request holds its slot
+        self.service_seconds = 0.0
+
+        self._cond = threading.Condition()
+        self._waiters = deque()
+
+    def _refuse(self, retry_after):
+        self.rejected += 1
+        return AdmissionRejected(f'{self.name} capacity exhausted, retry later', 503, retry_after)
+
+    def _queue_or_refuse(self):
+        # Called under the lock when every slot is taken. Only the queue
+        # bound rejects up front: predicting the wait from service times
+        # backfires under overload, when contention inflates them
+        if self.waiting >= self.max_queue:
+            raise self._refuse(self.service_seconds * (self.waiting + 1) / self.max_in_flight)
+        self.waiting += 1
+
+    def acquire(self):
+        with self._cond:
+            if self.in_flight >= self.max_in_flight:
+                self._queue_or_refuse()
+                deadline = time.monotonic() + self.max_wait
+                try:
+                    while self.in_flight >= self.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timed_out += 1
+                            raise self._refuse(self.max_wait)
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+            self.admitted += 1
+
+    async def acquire_async(self):
+        """`acquire` for the asyncio app; waits without blocking the loop."""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                self.admitted += 1
+                return
+            self._queue_or_refuse()
+        deadline = loop.time() + self.max_wait
+        try:
+            while True:
+                waiter = loop.create_future()
+                with self._cond:
+                    if self.in_flight < self.max_in_flight:
+                        self.in_flight += 1
+                        self.admitted += 1
+                        return
+                    self._waiters.append(waiter)
+                remaining = deadline - loop.time()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    await asyncio.wait_for(waiter, remaining)
+                except asyncio.TimeoutError:
+                    with self._cond:
+                        # A wake-up racing the timeout must not be lost
+                        if self.in_flight < self.max_in_flight:
+                            self.in_flight += 1
+                            self.admitted += 1
+                            return
+                        self.timed_out += 1
+                        raise self._refuse(self.max_wait)
+        finally:
+            with self._cond:
+                self.waiting -= 1
+
+    def release(self, elapsed):
+        with self._cond:
+            self.in_flight -= 1
+            self.service_seconds += 0.2 * (elapsed - self.service_seconds)
+            self._cond.notify()
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+                    break
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_in_flight': self.max_in_flight,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'service_ms': round(self.service_seconds * 1000, 3),
+            }
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AdmissionControl:
+    """Load shedding in front of the prediction and auth endpoints.
+
+    A request is turned away, in this order, when it already queued
+    upstream for longer than `max_queue_time` (X-Request-Start), when its
+    user is over their token bucket (429), or when its lane has no free
+    slot soon enough (503). Endpoints without a lane, like /health and
+    /user/profile, never wait behind shed-able work.
+    """
+
+    def __init__(self, lanes, user_buckets=None, max_queue_time=0):
+        self.lanes = {lane.name: lane for lane in lanes}
+        self.user_buckets = user_buckets
+        self.max_queue_time = max_queue_time
+        self.stale = 0
+
+    def _precheck(self, headers, user_id):
+        if self.max_queue_time > 0:
+            queued = queue_seconds(headers)
+            if queued is not None and queued > self.max_queue_time:
+                self.stale += 1
+                raise AdmissionRejected('request queued too long, retry later', 503, 1)
+        if self.user_buckets is not None and user_id is not None:
+            wait = self.user_buckets.take(user_id)
+            if wait:
+                raise AdmissionRejected('rate limit exceeded, retry later', 429, wait)
+
+    def enter(self, lane, headers, user_id=None):
+        """Admit a request into `lane` or raise AdmissionRejected; returns the Lane."""
+        self._precheck(headers, user_id)
+        lane = self.lanes[lane]
+        lane.acquire()
+        return lane
+
+    async def enter_async(self, lane, headers, user_id=None):
+        self._precheck(headers, user_id)
+        lane = self.lanes[lane]
+        await lane.acquire_async()
+        return lane
+
+    def stats(self):
+        return {
+            'lanes': {name: lane.stats() for name, lane in self.lanes.items()},
+            'user_limits': self.user_buckets.stats() if self.user_buckets is not None else None,
+            'max_queue_time': self.max_queue_time,
+            'stale': self.stale,
+        }
+
+
+def admitted(lane):
+    """Run the view only if admission control lets it into `lane`.
+
+    Stacked under token_required, the authenticated user's rate limit
+    applies as well.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            control = current_app.admission
+            if control is None or request.method == 'OPTIONS':
+                return f(*args, **kwargs)
+
+            user = args[0] if args else None
+            try:
+                with current_app.metrics.stage('admission'):
+                    slot = control.enter(lane, request.headers, user.id if user is not None else None)
+            except AdmissionRejected as e:
+                return rejected(e)
+
+            started = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                slot.release(time.perf_counter() - started)
+
+        return decorated
+    return decorator
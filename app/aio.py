@@ -0,0 +1,562 @@
+"""Asyncio serving mode: the same routes on Quart with an async DB driver.
+
+The Flask app built by `create_app` still owns the model registry, caches,
+micro-batcher, inference pool and write-behind queue; this app serves the
+same endpoints on top of them. Database I/O goes through SQLAlchemy's
+asyncio extension (asyncpg for Postgres, aiosqlite for SQLite) so a
+worker waiting on the database holds no thread. CPU-bound work (scoring,
+password hashing) runs on bounded thread pools, off the event loop.
+
+Query building and response shaping are shared with the Flask views;
+session-bound helpers run through `AsyncSession.run_sync`.
+"""
+import asyncio
+import logging
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial, wraps
+
+import jwt
+from quart import Blueprint, Quart, Response, current_app, g, jsonify, request
+from quart_cors import cors
+from sqlalchemy import select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from . import component_status, create_app, database_pool_status
+from .auth import issue_token, new_user, registration_error
+from .admission import AdmissionRejected
+from .dbpool import PoolKeepalive, engine_options
+from .executor import PoolSaturated, PoolTimeout
+from .hashing import HashingBusy
+from .metrics import TimedAsyncQueuePool, TimedQueuePool, pool_gauges
+from .export import EXPORT_FORMATS, export_encoder, prediction_rows
+from .models import User
+from .persistence import write_predictions
+from .predict import (batch_body, batch_results, explain_row, feature_matrix, model_unavailable,
+                      parse_batch, parse_row, predict_row, score_rows, wants_explanation)
+from .registry import ExplanationUnavailable
+from .security import UserSnapshot, bearer_token, verify_token
+from .user import (cache_validators, dashboard_data, data_version, history_page, profile_data,
+                   profile_version, response_etag)
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_url(url):
+    """Translate the sync SQLALCHEMY_DATABASE_URI to its async driver."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'no async driver for {backend} databases; set ASYNC_DATABASE_URL')
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+
+    sslmode = url.query.get('sslmode')
+    if backend == 'postgresql' and sslmode:
+        # asyncpg takes ssl=, not libpq's sslmode=
+        url = url.difference_update_query(['sslmode']).update_query_dict({'ssl': sslmode})
+    return url
+
+
+def create_async_app():
+    core = create_app()
+
+    app = Quart(__name__)
+    app.config.from_mapping(core.config)
+    app.flask_app = core
+    if app.config['JSON_ENGINE'] == 'orjson':
+        from .fastjson import FastJSONProvider
+        app.json = FastJSONProvider(app)
+
+    # ===== CORS =====
+    cors(
+        app,
+        allow_origin=re.compile(r'.*'),
+        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization"],
+        expose_headers=["Content-Type", "Authorization"],
+        allow_credentials=True
+    )
+
+    # ===== DATABASE =====
+    # Engine and sessions belong to the serving event loop, so they are
+    # created once it is running
+    if app.config['DB_POOL_PROFILE'] == 'background':
+        app.pool_keepalive = PoolKeepalive(app, interval=app.config['DB_POOL_PING_INTERVAL'])
+    else:
+        app.pool_keepalive = None
+
+    async def keep_pool_alive():
+        while True:
+            await asyncio.sleep(app.pool_keepalive.interval)
+            await app.pool_keepalive.check_async(app.db_engine)
+
+    @app.before_serving
+    async def open_database():
+        url = app.config['ASYNC_DATABASE_URL'] or async_database_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        if app.config['DB_POOL_PROFILE'] == 'pgbouncer':
+            # Prepared-statement settings depend on the async driver
+            options = engine_options(app.config, url)
+        options = dict(options)
+        if options.get('poolclass') is TimedQueuePool:
+            options['poolclass'] = TimedAsyncQueuePool
+        app.db_engine = create_async_engine(url, **options)
+        # Commits invalidate the shared auth cache without an app context
+        # (see security.session_auth_cache)
+        app.db_session = async_sessionmaker(app.db_engine, expire_on_commit=False,
+                                            info={'auth_cache': core.auth_cache})
+        app.blocking = ThreadPoolExecutor(
+            max_workers=app.config['ASYNC_BLOCKING_THREADS'], thread_name_prefix='blocking'
+        )
+        if app.pool_keepalive is not None:
+            app.pool_keepalive_task = asyncio.create_task(keep_pool_alive())
+        print(f"✅ Async database engine ready ({app.db_engine.url.drivername})", file=sys.stderr)
+
+    @app.before_serving
+    async def start_warmup():
+        # Each serving process starts loading the model right away instead
+        # of on its first request
+        core.warmup.ensure_started()
+
+    @app.after_serving
+    async def close_database():
+        if app.pool_keepalive is not None:
+            app.pool_keepalive_task.cancel()
+        await app.db_engine.dispose()
+        app.blocking.shutdown(wait=False)
+
+    # ===== METRICS =====
+    # Same registry as the Flask app; the async engine's pool is reported
+    # as async_db_pool_*
+    metrics = core.metrics
+    if metrics.enabled:
+        metrics.add_gauges(lambda: pool_gauges(app.db_engine.sync_engine, 'async_db_pool'))
+
+        @app.before_request
+        async def start_request_timer():
+            g.metrics_started = metrics.start_request(request.endpoint)
+
+        @app.after_request
+        async def record_request(response):
+            started = g.pop('metrics_started', None)
+            if started is not None:
+                rule = request.url_rule
+                metrics.finish_request(started, rule.rule if rule else 'unmatched',
+                                       request.method, response.status_code)
+            return response
+
+        @app.route('/metrics')
+        async def metrics_endpoint():
+            with core.app_context():
+                body = metrics.render()
+            return Response(body, mimetype='text/plain; version=0.0.4')
+
+    @app.before_request
+    async def watch_model():
+        if core.warmup.ensure_started():
+            core.model_registry.ensure_watching()
+        core.partition_maintainer.ensure_running()
+        if core.inference_pool is not None:
+            core.inference_pool.ensure_started()
+
+    # ===== HEALTH CHECK ENDPOINTS =====
+    @app.route('/')
+    async def health_check():
+        return jsonify({
+            'status': 'healthy',
+            'message': 'Flask API is running',
+            'model_loaded': core.pipeline is not None
+        }), 200
+
+    @app.route('/health')
+    async def health():
+        try:
+            async with app.db_engine.connect() as conn:
+                await conn.execute(text('SELECT 1'))
+            db_status = 'connected'
+        except Exception as e:
+            db_status = f'error: {str(e)}'
+
+        return jsonify(dict(component_status(core), status='ok', database=db_status,
+                            database_pool=database_pool_status(app, app.db_engine.sync_engine))), 200
+
+    # ===== REGISTER BLUEPRINTS =====
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(predict_bp, url_prefix='/api')
+    app.register_blueprint(user_bp, url_prefix='/user')
+
+    return app
+
+
+def run_blocking(fn, *args):
+    """Run CPU-bound or blocking work on the app's thread pool."""
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(current_app.blocking, partial(fn, *args))
+
+
+# ===== AUTH =====
+
+async def _load_user(user_id):
+    cache = current_app.flask_app.auth_cache
+    user = cache.get_user(user_id) if cache is not None else None
+    if user is None:
+        async with current_app.db_session() as session:
+            row = await session.get(User, user_id)
+        if row is None:
+            return None
+        user = UserSnapshot(row)
+        if cache is not None:
+            cache.put_user(user)
+    return user
+
+
+def token_required(f):
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        if request.method == 'OPTIONS':
+            return jsonify({'status': 'ok'}), 200
+
+        token = bearer_token(request.headers)
+        if not token:
+            current_app.logger.warning("No token provided in request")
+            return jsonify({'msg':'token missing'}), 401
+
+        metrics = current_app.flask_app.metrics
+        try:
+            with metrics.stage('jwt_decode'):
+                user_id = verify_token(token, current_app.config['JWT_SECRET'],
+                                       current_app.flask_app.auth_cache)
+            if user_id is None:
+                current_app.logger.error("Token missing 'sub' claim")
+                return jsonify({'msg':'invalid token structure'}), 401
+
+            with metrics.stage('user_lookup'):
+                user = await _load_user(user_id)
+            if user is None:
+                current_app.logger.error(f"User with id {user_id} not found")
+                return jsonify({'msg':'user not found'}), 401
+
+            current_app.logger.info(f"User {user.username} authenticated successfully")
+
+        except jwt.ExpiredSignatureError:
+            current_app.logger.warning("Token has expired")
+            return jsonify({'msg':'token expired'}), 401
+        except jwt.InvalidTokenError as e:
+            current_app.logger.error(f"Invalid token: {str(e)}")
+            return jsonify({'msg':'token invalid', 'err': str(e)}), 401
+        except Exception as e:
+            current_app.logger.error(f"Token verification failed: {str(e)}")
+            return jsonify({'msg':'token verification failed', 'err': str(e)}), 401
+
+        return await f(user, *args, **kwargs)
+
+    return decorated
+
+
+def admitted(lane):
+    """Async counterpart of admission.admitted."""
+    def decorator(f):
+        @wraps(f)
+        async def decorated(*args, **kwargs):
+            control = current_app.flask_app.admission
+            if control is None or request.method == 'OPTIONS':
+                return await f(*args, **kwargs)
+
+            user = args[0] if args else None
+            try:
+                with current_app.flask_app.metrics.stage('admission'):
+                    slot = await control.enter_async(lane, request.headers,
+                                                     user.id if user is not None else None)
+            except AdmissionRejected as e:
+                return jsonify({'msg': str(e)}), e.status, e.headers()
+
+            started = time.perf_counter()
+            try:
+                return await f(*args, **kwargs)
+            finally:
+                slot.release(time.perf_counter() - started)
+
+        return decorated
+    return decorator
+
+
+async def hashed(future):
+    """Await a PasswordHasher future without holding a thread."""
+    hasher = current_app.flask_app.password_hasher
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), hasher.timeout)
+    except asyncio.TimeoutError:
+        raise hasher.timed_out(future)
+
+
+def _busy(e):
+    response = jsonify({'msg': 'too many logins in progress, retry later', 'err': str(e)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
+auth_bp = Blueprint('auth', __name__)
+
+
+@auth_bp.route('/register', methods=['POST'])
+@admitted('auth')
+async def register():
+    data = await request.get_json()
+    error = registration_error(data)
+    if error:
+        return jsonify(error), 400
+
+    hasher = current_app.flask_app.password_hasher
+    async with current_app.db_session() as session:
+        if await session.scalar(select(User).filter_by(username=data['username'])):
+            return jsonify({'msg':'user exists'}), 400
+
+        try:
+            password_hash = await hashed(hasher.submit_hash(data['password']))
+        except HashingBusy as e:
+            return _busy(e)
+
+        session.add(new_user(data, password_hash))
+        await session.commit()
+
+    return jsonify({'msg':'created'}), 201
+
+
+@auth_bp.route('/login', methods=['POST'])
+@admitted('auth')
+async def login():
+    data = await request.get_json()
+    hasher = current_app.flask_app.password_hasher
+    async with current_app.db_session() as session:
+        user = await session.scalar(select(User).filter_by(username=data.get('username')))
+
+        try:
+            if not user or not await hashed(hasher.submit_verify(user.password_hash, data.get('password'))):
+                return jsonify({'msg':'invalid credentials'}), 401
+        except HashingBusy as e:
+            return _busy(e)
+
+        if hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = await hashed(hasher.submit_hash(data['password']))
+                await session.commit()
+                hasher.record_rehash()
+            except Exception as e:
+                await session.rollback()
+                current_app.logger.warning(f"Password rehash for user {user.id} skipped: {e}")
+
+    return jsonify(issue_token(user, current_app.config['JWT_SECRET'])), 200
+
+
+# ===== PREDICT =====
+
+async def save_predictions(records):
+    """Async counterpart of persistence.save_predictions; never raises."""
+    now = datetime.now(timezone.utc)
+    for record in records:
+        record.setdefault('created_at', now)
+
+    core = current_app.flask_app
+    try:
+        if core.prediction_writer is not None:
+            await run_blocking(_submit_records, core, records)
+            return
+        async with current_app.db_session() as session:
+            await session.run_sync(write_predictions, records)
+            await session.commit()
+    except Exception as e:
+        current_app.logger.error("failed to save %d prediction(s): %s", len(records), e)
+
+
+def _submit_records(core, records):
+    # A full queue makes the writer insert inline, which needs the Flask app
+    with core.app_context():
+        core.prediction_writer.submit(records)
+
+
+def _overloaded(e):
+    response = jsonify({'msg': 'prediction capacity exhausted, retry later', 'err': str(e)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
+predict_bp = Blueprint('predict', __name__)
+
+
+@predict_bp.route('/predict', methods=['POST'])
+@token_required
+@admitted('predict')
+async def predict(user):
+    core = current_app.flask_app
+    metrics = core.metrics
+    payload = await request.get_json(silent=True)
+    with metrics.stage('validation'):
+        row, X, error, status = parse_row(payload)
+    if error:
+        return jsonify(error), status
+
+    explain = wants_explanation(payload, request.args)
+    if explain and not core.config['PREDICT_EXPLAIN_ENABLED']:
+        return jsonify({'msg': 'explanations are disabled on this server'}), 400
+
+    model = core.model_registry.current
+    if model is None and await run_blocking(core.warmup.wait, core.config['MODEL_WARMUP_WAIT']):
+        model = core.model_registry.current
+    if model is None:
+        body, status, headers = model_unavailable(core)
+        return jsonify(body), status, headers
+
+    try:
+        with metrics.stage('inference'):
+            output = await run_blocking(predict_row, core, model, X)
+    except (PoolSaturated, PoolTimeout) as e:
+        return _overloaded(e)
+    except Exception as e:
+        return jsonify({'msg': 'prediction failed', 'err': str(e)}), 500
+
+    record = {
+        'user_id': user.id,
+        'input_json': row,
+        'output_json': output,
+        'model_version': model.version
+    }
+    if explain:
+        try:
+            with metrics.stage('explanation'):
+                record['explanation'] = await run_blocking(explain_row, core, model, X)
+        except ExplanationUnavailable as e:
+            return jsonify({'msg': str(e)}), 501
+        except Exception as e:
+            return jsonify({'msg': 'explanation failed', 'err': str(e)}), 500
+        output = dict(output, explanation=record['explanation'])
+
+    with metrics.stage('db_commit'):
+        await save_predictions([record])
+
+    return jsonify(output), 200
+
+
+@predict_bp.route('/predict/batch', methods=['POST'])
+@token_required
+@admitted('predict')
+async def predict_batch(user):
+    core = current_app.flask_app
+    metrics = core.metrics
+    payload = await request.get_json(silent=True)
+    with metrics.stage('validation'):
+        batch, error, status = parse_batch(payload, current_app.config['PREDICT_BATCH_MAX_ROWS'])
+    if error:
+        return jsonify(error), status
+    total, rows, values, indices, errors = batch
+
+    model = core.model_registry.current
+    if model is None and await run_blocking(core.warmup.wait, core.config['MODEL_WARMUP_WAIT']):
+        model = core.model_registry.current
+    if model is None:
+        body, status, headers = model_unavailable(core)
+        return jsonify(body), status, headers
+
+    results = []
+    if values:
+        try:
+            # One pass over the forest for the whole matrix
+            with metrics.stage('inference'):
+                pred, proba = await run_blocking(score_rows, core, model, feature_matrix(values))
+        except (PoolSaturated, PoolTimeout) as e:
+            return _overloaded(e)
+        except Exception as e:
+            return jsonify({'msg': 'prediction failed', 'err': str(e)}), 500
+
+        results, records = batch_results(user.id, model, rows, indices, pred, proba)
+        with metrics.stage('db_commit'):
+            await save_predictions(records)
+
+    return jsonify(batch_body(total, results, errors)), 200
+
+
+# ===== USER =====
+
+user_bp = Blueprint('user', __name__)
+
+
+def not_modified(etag):
+    """Async-app counterpart of user.not_modified."""
+    if request.if_none_match.contains_weak(etag):
+        return cache_validators(current_app.response_class('', status=304), etag)
+    return None
+
+
+@user_bp.route('/profile', methods=['GET', 'OPTIONS'])
+@token_required
+async def profile(user):
+    etag = response_etag('profile', user.id, profile_version(user))
+    return not_modified(etag) or cache_validators(jsonify(profile_data(user)), etag)
+
+
+@user_bp.route('/dashboard', methods=['GET'])
+@token_required
+async def dashboard(user):
+    async with current_app.db_session() as session:
+        etag = response_etag('dashboard', user.id, await session.run_sync(data_version, user))
+        response = not_modified(etag)
+        if response is not None:
+            return response
+        data = await session.run_sync(dashboard_data, user.id)
+    return cache_validators(jsonify(data), etag)
+
+
+@user_bp.route('/history', methods=['GET', 'OPTIONS'])
+@token_required
+async def history(user):
+    async with current_app.db_session() as session:
+        etag = response_etag('history', user.id, await session.run_sync(data_version, user), request.args)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+        body, status = await session.run_sync(history_page, user.id, request.args)
+    if status != 200:
+        return jsonify(body), status
+    return cache_validators(jsonify(body), etag)
+
+
+@user_bp.route('/history/export', methods=['GET', 'OPTIONS'])
+@token_required
+async def export_history(user):
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'msg': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+    chunk_size = current_app.config['EXPORT_CHUNK_SIZE']
+    sessions = current_app.db_session
+    header, encode = export_encoder(fmt)
+
+    async def generate():
+        if header:
+            yield header.encode()
+        async with sessions() as session:
+            result = await session.stream(
+                prediction_rows(user.id).execution_options(yield_per=chunk_size)
+            )
+            async for block in result.partitions(chunk_size):
+                yield encode(block).encode()
+
+    response = Response(
+        generate(),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename=predictions-{user.id}.{fmt}',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    # Exports can outlast Quart's default response timeout
+    response.timeout = None
+    return response
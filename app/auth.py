@@ -1,53 +1,96 @@
 from flask import Blueprint, request, jsonify, current_app
 from .models import User
 from . import db
+from .admission import admitted
+from .hashing import HashingBusy
 import jwt
 import datetime
 
 bp = Blueprint('auth', __name__)
 
-@bp.route('/register', methods=['POST'])
-def register():
-    data = request.json
-    if not data.get('username') or not data.get('password') or not data.get('full_name') or not data.get('date_of_birth') or not data.get('blood_type') or not data.get('gender'):
-        return jsonify({'msg':'all data must be filled in'}), 400
-    
-    if User.query.filter_by(username=data['username']).first():
-        return jsonify({'msg':'user exists'}), 400
-    
+REGISTER_FIELDS = ('username', 'password', 'full_name', 'date_of_birth', 'blood_type', 'gender')
+
+def registration_error(data):
+    if not data or not all(data.get(field) for field in REGISTER_FIELDS):
+        return {'msg':'all data must be filled in'}
+    return None
+
+def new_user(data, password_hash):
+    """Build (not add) a User from registration data and a hashed password."""
     user = User(username=data['username'])
-    user.set_password(data['password'])
+    user.password_hash = password_hash
     user.full_name = data['full_name']
     user.date_of_birth = datetime.datetime.strptime(data['date_of_birth'], '%Y-%m-%d').date()
     user.blood_type = data['blood_type']
     user.gender = data['gender']
-    
-    db.session.add(user)
-    db.session.commit()
-    
-    return jsonify({'msg':'created'}), 201
+    return user
 
-@bp.route('/login', methods=['POST'])
-def login():
-    data = request.json
-    user = User.query.filter_by(username=data.get('username')).first()
-    
-    if not user or not user.check_password(data.get('password')):
-        return jsonify({'msg':'invalid credentials'}), 401
-    
+def busy(e):
+    response = jsonify({'msg': 'too many logins in progress, retry later', 'err': str(e)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def issue_token(user, secret):
     payload = {
         'sub': str(user.id),
         'iat': datetime.datetime.now(datetime.timezone.utc),
         'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=12)
     }
     
-    token = jwt.encode(payload, current_app.config['JWT_SECRET'], algorithm='HS256')
+    token = jwt.encode(payload, secret, algorithm='HS256')
     
     if isinstance(token, bytes):
         token = token.decode('utf-8')
     
-    return jsonify({
+    return {
         'access_token': token,
         'token_type': 'Bearer',
         'expires_in': 43200  
-    }), 200
\ No newline at end of file
+    }
+
+@bp.route('/register', methods=['POST'])
+@admitted('auth')
+def register():
+    data = request.json
+    error = registration_error(data)
+    if error:
+        return jsonify(error), 400
+    
+    if User.query.filter_by(username=data['username']).first():
+        return jsonify({'msg':'user exists'}), 400
+    
+    try:
+        password_hash = current_app.password_hasher.hash(data['password'])
+    except HashingBusy as e:
+        return busy(e)
+    
+    db.session.add(new_user(data, password_hash))
+    db.session.commit()
+    
+    return jsonify({'msg':'created'}), 201
+
+@bp.route('/login', methods=['POST'])
+@admitted('auth')
+def login():
+    data = request.json
+    user = User.query.filter_by(username=data.get('username')).first()
+    hasher = current_app.password_hasher
+    
+    try:
+        if not user or not hasher.verify(user.password_hash, data.get('password')):
+            return jsonify({'msg':'invalid credentials'}), 401
+    except HashingBusy as e:
+        return busy(e)
+    
+    if hasher.needs_rehash(user.password_hash):
+        # Upgrade to the configured hash parameters while the plain
+        # password is at hand; a failure here never fails the login
+        try:
+            user.password_hash = hasher.hash(data['password'])
+            db.session.commit()
+            hasher.record_rehash()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"Password rehash for user {user.id} skipped: {e}")
+    
+    return jsonify(issue_token(user, current_app.config['JWT_SECRET'])), 200
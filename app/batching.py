@@ -0,0 +1,200 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from .executor import PoolSaturated, PoolTimeout
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one scoring call.
+
+    Request threads hand their feature row to `submit` and block; a
+    dispatcher thread takes the first waiting row and, if more are likely
+    to arrive soon, holds the batch open for at most `max_wait` seconds
+    (measured from the first row's arrival) or until `max_rows` rows are
+    collected, then scores them with one vectorized call and hands each
+    caller its own row of the result.
+
+    The window adapts to load: it is only held open while the smoothed
+    gap between arrivals is shorter than `max_wait`, i.e. while waiting
+    is expected to pick up at least one more row. At low traffic every
+    request is dispatched immediately and pays no added delay.
+
+    Rows are only batched with rows pinned to the same model version.
+    Non-finite rows are refused by `submit`; if a batch still fails to
+    score, its rows are retried one by one so only the bad row fails.
+    `score(model, X)` does the scoring; it defaults to `model.score(X)`
+    and can route batches to an inference pool instead.
+    """
+
+    def __init__(self, max_wait=0.002, max_rows=64, window=4096, score=None):
+        self.max_wait = max_wait
+        self.max_rows = max_rows
+        self._score = score or (lambda model, X: model.score(X))
+
+        self._queue = None
+        self._carry = deque()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+        self._last_arrival = None
+        self._gap_ewma = None
+
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._batch_hist = [0] * (len(BATCH_BUCKETS) + 1)
+        self.batches = 0
+        self.rows = 0
+        self.waited_batches = 0
+        self.split_batches = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._carry.clear()
+                self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+            self._thread.start()
+
+    def submit(self, model, row, timeout=None):
+        """Score one feature row with `model`.
+
+        Returns (labels, probabilities) for that single row, shaped like
+        `model.score` on a one-row matrix.
+        """
+        row = np.asarray(row, dtype=np.float64)
+        if not np.isfinite(row).all():
+            raise ValueError('Input X contains NaN or infinity.')
+        self._ensure_started()
+
+        now = time.monotonic()
+        with self._stats_lock:
+            if self._last_arrival is not None:
+                gap = now - self._last_arrival
+                self._gap_ewma = gap if self._gap_ewma is None else 0.8 * self._gap_ewma + 0.2 * gap
+            self._last_arrival = now
+
+        future = Future()
+        self._queue.put((model, row, future, now))
+        result = future.result(timeout)
+
+        with self._stats_lock:
+            self._latencies.append(time.monotonic() - now)
+        return result
+
+    def current_window(self):
+        """Seconds the next batch may be held open, given recent arrivals."""
+        gap = self._gap_ewma
+        if gap is None or gap >= self.max_wait:
+            return 0.0
+        return self.max_wait
+
+    def _next_item(self, timeout=None):
+        if self._carry:
+            return self._carry.popleft()
+        return self._queue.get(timeout=timeout)
+
+    def _run(self):
+        while True:
+            first = self._next_item()
+            model = first[0]
+            batch = [first]
+            carried = []
+
+            window = self.current_window()
+            deadline = first[3] + window
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self._next_item(timeout=remaining)
+                    elif self._carry:
+                        item = self._carry.popleft()
+                    else:
+                        # Past the window: take only what is already queued
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item[0] is model:
+                    batch.append(item)
+                else:
+                    carried.append(item)
+            self._carry.extend(carried)
+
+            self._dispatch(model, batch, waited=window > 0)
+
+    def _dispatch(self, model, batch, waited):
+        split = False
+        try:
+            labels, proba = self._score(model, np.vstack([item[1] for item in batch]))
+        except (PoolSaturated, PoolTimeout) as e:
+            # Out of capacity, not a bad row: retrying would only add load
+            for item in batch:
+                item[2].set_exception(e)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][2].set_exception(e)
+            else:
+                # Keep one caller's bad row from failing the rows batched with it
+                split = True
+                for item in batch:
+                    self._dispatch_one(model, item)
+        else:
+            for i, item in enumerate(batch):
+                item[2].set_result((labels[i:i + 1], proba[i:i + 1] if proba is not None else None))
+
+        size = len(batch)
+        bucket = next((i for i, bound in enumerate(BATCH_BUCKETS) if size <= bound), len(BATCH_BUCKETS))
+        with self._stats_lock:
+            self.batches += 1
+            self.rows += size
+            self.waited_batches += waited
+            self.split_batches += split
+            self._batch_hist[bucket] += 1
+
+    def _dispatch_one(self, model, item):
+        try:
+            item[2].set_result(self._score(model, item[1][None, :]))
+        except Exception as e:
+            item[2].set_exception(e)
+
+    def stats(self):
+        with self._stats_lock:
+            latencies = np.fromiter(self._latencies, dtype=np.float64)
+            hist = list(self._batch_hist)
+            batches, rows, waited = self.batches, self.rows, self.waited_batches
+            split = self.split_batches
+            gap = self._gap_ewma
+
+        labels = [f'<={bound}' for bound in BATCH_BUCKETS] + [f'>{BATCH_BUCKETS[-1]}']
+        return {
+            'max_wait_ms': self.max_wait * 1000,
+            'max_rows': self.max_rows,
+            'window_ms': round(self.current_window() * 1000, 3),
+            'arrival_gap_ms': round(gap * 1000, 3) if gap is not None else None,
+            'batches': batches,
+            'rows': rows,
+            'mean_batch_size': round(rows / batches, 2) if batches else None,
+            'waited_batches': waited,
+            'split_batches': split,
+            'batch_size_histogram': dict(zip(labels, hist)),
+            'latency_ms': {
+                'samples': len(latencies),
+                'p50': round(float(np.percentile(latencies, 50)) * 1000, 3) if len(latencies) else None,
+                'p99': round(float(np.percentile(latencies, 99)) * 1000, 3) if len(latencies) else None,
+            },
+        }
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .utils import file_stat
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry bookkeeping cost (OrderedDict slot, tuple, key bytes)
+ENTRY_OVERHEAD = 200
+
+
+class PredictionCache:
+    """Bounded LRU/TTL cache of prediction outputs keyed on feature vectors.
+
+    Keys are the canonical float64 bytes of the REQUIRED_COLS vector,
+    namespaced by the fingerprint of the loaded model, so a different
+    model can never be answered from another model's entries. Entries are
+    evicted least-recently-used first when either the entry count or the
+    estimated memory cap is exceeded, and lazily once their TTL runs out.
+
+    When a Redis URL is given the cache becomes two-level: misses in the
+    local LRU fall through to Redis, which is shared by all gunicorn
+    workers. Redis is optional; without the `redis` package the cache
+    stays process-local. `namespace` prefixes the Redis keys, so several
+    caches can share one Redis.
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600, max_bytes=16 * 1024 * 1024,
+                 redis_url=None, check_interval=5.0, namespace='pred'):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.fingerprint = None
+        self._model_path = None
+        self._model_stat = None
+        self._next_check = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.shared_hits = 0
+        self.shared_errors = 0
+
+        self._redis = None
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.05)
+            except ImportError:
+                logger.warning("PREDICT_CACHE_REDIS_URL is set but redis is not installed; "
+                               "prediction cache stays process-local")
+
+    def bind(self, fingerprint, model_path=None):
+        """Attach the cache to a loaded model, dropping entries of any other."""
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                self._clear()
+            self.fingerprint = fingerprint
+            self._model_path = model_path
+            self._model_stat = file_stat(model_path) if model_path is not None else None
+            self._next_check = time.monotonic() + self.check_interval
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._bytes = 0
+
+    def _check_model_file(self, now):
+        # Called with the lock held. A changed model file means a reload is
+        # coming, so entries for the current fingerprint are dropped early.
+        if self._model_path is None or now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        stat = file_stat(self._model_path)
+        if stat != self._model_stat:
+            logger.info("model file %s changed, invalidating prediction cache", self._model_path)
+            self._model_stat = stat
+            self._clear()
+
+    @staticmethod
+    def canonical(values):
+        """Canonical bytes for a feature vector (-0.0 folds into 0.0)."""
+        import numpy as np
+        return (np.asarray(values, dtype=np.float64).ravel() + 0.0).tobytes()
+
+    def _shared_key(self, key):
+        return f'{self.namespace}:{self.fingerprint}:{hashlib.blake2b(key, digest_size=16).hexdigest()}'
+
+    def get(self, values, fingerprint=None):
+        """Return the cached output for a feature vector, or None.
+
+        Passing the fingerprint of the model the caller is using makes
+        the lookup miss if the cache has since been bound to another one.
+        """
+        if self.fingerprint is None or fingerprint not in (None, self.fingerprint):
+            return None
+
+        key = self.canonical(values)
+        now = time.monotonic()
+        with self._lock:
+            self._check_model_file(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, output, _ = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(output)
+                self._evict(key)
+
+        if self._redis is not None:
+            try:
+                raw = self._redis.get(self._shared_key(key))
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning("shared prediction cache read failed: %s", e)
+                raw = None
+            if raw is not None:
+                output = json.loads(raw)
+                self._store(key, output, now, len(raw))
+                with self._lock:
+                    self.hits += 1
+                    self.shared_hits += 1
+                return dict(output)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, values, output, fingerprint=None):
+        if self.fingerprint is None or fingerprint not in (None, self.fingerprint):
+            return
+
+        key = self.canonical(values)
+        raw = json.dumps(output)
+        self._store(key, output, time.monotonic(), len(raw))
+
+        if self._redis is not None:
+            try:
+                self._redis.set(self._shared_key(key), raw, ex=self.ttl)
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning("shared prediction cache write failed: %s", e)
+
+    def _store(self, key, output, now, payload_size):
+        size = ENTRY_OVERHEAD + len(key) + payload_size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (now + self.ttl, output, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._evict(oldest)
+                self.evictions += 1
+
+    def _evict(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'fingerprint': self.fingerprint,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'shared': self._redis is not None,
+                'shared_hits': self.shared_hits,
+                'shared_errors': self.shared_errors,
+            }
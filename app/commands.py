@@ -0,0 +1,229 @@
+import json
+import os
+import shutil
+import sys
+
+import click
+from flask import current_app
+
+from .export import EXPORT_FORMATS, iter_export, iter_predictions
+from .partitions import apply_retention, ensure_partitions
+from .persistence import compact_predictions
+from .provision import provision_users, read_users
+from .utils import file_fingerprint
+from .warmup import profile_startup
+
+
+def register_commands(app):
+    app.cli.add_command(export_predictions)
+    app.cli.add_command(model_cli)
+    app.cli.add_command(provision_users_command)
+    app.cli.add_command(compact_predictions_command)
+    app.cli.add_command(create_partitions_command)
+    app.cli.add_command(retain_predictions_command)
+    app.cli.add_command(profile_startup_command)
+
+
+@click.command('export-predictions')
+@click.option('--format', 'fmt', type=click.Choice(sorted(EXPORT_FORMATS)), default='ndjson',
+              show_default=True, help='Output encoding.')
+@click.option('--user-id', type=int, default=None, help='Only export this user (default: all users).')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='File to write (default: stdout).')
+def export_predictions(fmt, user_id, output):
+    """Stream prediction history as NDJSON or CSV."""
+    chunk_size = current_app.config['EXPORT_CHUNK_SIZE']
+    rows = iter_predictions(user_id=user_id, chunk_size=chunk_size)
+
+    out = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+    try:
+        for chunk in iter_export(rows, fmt, chunk_size=chunk_size):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
+
+
+@click.group('model')
+def model_cli():
+    """Inspect and deploy model versions."""
+
+
+@model_cli.command('list')
+def list_models():
+    """Show the model files in app/ml with their content-hash versions."""
+    current_app.warmup.run()
+    registry = current_app.model_registry
+    current = registry.current.version if registry.current is not None else None
+    ml_dir = os.path.join(current_app.root_path, 'ml')
+    paths = {os.path.join(ml_dir, name) for name in os.listdir(ml_dir) if name.endswith('.joblib')}
+    paths.add(registry.path)
+    for path in sorted(paths):
+        if not os.path.exists(path):
+            continue
+        version = file_fingerprint(path)
+        marker = '*' if version == current else ' '
+        served = ' (served path)' if os.path.abspath(path) == os.path.abspath(registry.path) else ''
+        click.echo(f'{marker} {version}  {path}{served}')
+
+
+@model_cli.command('activate')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+def activate_model(source):
+    """Verify SOURCE and atomically install it as the served model.
+
+    Running workers notice the new file within MODEL_POLL_INTERVAL
+    seconds and swap it in after warming and verifying it themselves.
+    """
+    current_app.warmup.run()
+    registry = current_app.model_registry
+    target = registry.path
+    if os.path.abspath(source) == os.path.abspath(target):
+        raise click.ClickException('SOURCE is already the served model file')
+
+    # reload() also answers None for an unchanged file, so catch that first
+    current = registry.current
+    if current is not None and file_fingerprint(source) == current.version:
+        click.echo(f'{source} is already active as model {current.version}')
+        return
+
+    # Check the candidate the same way the workers will before deploying it
+    candidate = registry.reload(source)
+    if candidate is None:
+        raise click.ClickException(f'{source} was rejected: {registry.last_error}')
+
+    tmp = f'{target}.tmp-{os.getpid()}'
+    shutil.copyfile(source, tmp)
+    os.replace(tmp, target)
+    click.echo(json.dumps(candidate.describe()))
+
+
+@click.command('provision-users')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='Input encoding (default: from the file extension).')
+@click.option('--processes', type=int, default=None,
+              help='Password hashing processes (default: CPU count).')
+@click.option('--batch-size', type=int, default=1000, show_default=True,
+              help='Users looked up, hashed and inserted per transaction.')
+def provision_users_command(source, fmt, processes, batch_size):
+    """Create users in bulk from a CSV or NDJSON file ('-' for stdin).
+
+    Rows carry the /auth/register fields. Existing usernames are skipped;
+    a JSON report of created and skipped rows is printed at the end.
+    """
+    if fmt is None:
+        fmt = 'csv' if source.name.endswith('.csv') else 'ndjson'
+
+    def on_error(line, error):
+        click.echo(f'line {line}: {error}', err=True)
+
+    report = provision_users(
+        read_users(source, fmt),
+        method=current_app.config['PASSWORD_HASH_METHOD'],
+        processes=processes,
+        batch_size=batch_size,
+        on_error=on_error
+    )
+    click.echo(json.dumps(report))
+
+
+@click.command('compact-predictions')
+@click.option('--batch-size', type=int, default=1000, show_default=True,
+              help='Rows converted per transaction.')
+def compact_predictions_command(batch_size):
+    """Move JSON-stored prediction history into the typed columns.
+
+    Safe to run while the API is serving and to interrupt and re-run.
+    On Postgres the freed space is reused by new rows; VACUUM FULL (or
+    pg_repack) is needed to give it back to the filesystem.
+    """
+    def on_batch(scanned, compacted):
+        click.echo(f'{scanned} rows scanned, {compacted} compacted', err=True)
+
+    scanned, compacted = compact_predictions(batch_size=batch_size, on_batch=on_batch)
+    click.echo(json.dumps({'scanned': scanned, 'compacted': compacted}))
+
+
+@click.command('create-partitions')
+@click.option('--months-ahead', type=int, default=None,
+              help='Months past the current one to create (default: PREDICTION_PARTITION_MONTHS_AHEAD).')
+@click.option('--from', 'start', type=click.DateTime(formats=['%Y-%m']), default=None,
+              help='First month to create, YYYY-MM (default: the current month).')
+def create_partitions_command(months_ahead, start):
+    """Create missing monthly partitions of the prediction table.
+
+    Workers already do this in the background; use --from before loading
+    history older than the existing partitions. A no-op unless
+    `prediction` is a partitioned Postgres table.
+    """
+    if months_ahead is None:
+        months_ahead = current_app.config['PREDICTION_PARTITION_MONTHS_AHEAD']
+    created = ensure_partitions(months_ahead, start=start.date() if start else None)
+    click.echo(json.dumps({'created': created}))
+
+
+@click.command('retain-predictions')
+@click.option('--keep-months', type=int, default=None,
+              help='Months kept, counting the current one (default: PREDICTION_RETENTION_MONTHS).')
+@click.option('--detach-only', is_flag=True,
+              help='Detach old partitions but keep them as standalone tables.')
+def retain_predictions_command(keep_months, detach_only):
+    """Roll old predictions into daily aggregates and remove them.
+
+    Each month older than --keep-months is summarized into
+    prediction_daily, subtracted from the per-user summaries and then
+    detached (and dropped) as a partition, or deleted on an unpartitioned
+    table, in one transaction per month. Meant to run from cron.
+    """
+    if keep_months is None:
+        keep_months = current_app.config['PREDICTION_RETENTION_MONTHS']
+    if keep_months < 1:
+        raise click.BadParameter('must be at least 1', param_hint='--keep-months')
+
+    def on_month(month, rows):
+        click.echo(f'{month:%Y-%m}: {rows} rows retired', err=True)
+
+    report = apply_retention(keep_months, drop=not detach_only, on_month=on_month)
+    click.echo(json.dumps(report))
+
+
+@click.command('profile-startup')
+@click.option('--top', type=int, default=15, show_default=True,
+              help='Packages listed by import time.')
+@click.option('--json', 'as_json', is_flag=True, help='Print the full report as JSON.')
+def profile_startup_command(top, as_json):
+    """Break down a worker's cold start: imports, app setup and warmup.
+
+    Starts a fresh interpreter under `-X importtime` that builds the app
+    with the current configuration, answers one request, waits for the
+    model warmup and scores one row, then reports where the time went.
+    """
+    report = profile_startup(os.path.dirname(current_app.root_path))
+    if as_json:
+        click.echo(json.dumps(report))
+        return
+
+    def seconds(value):
+        return f'{value:8.3f}s' if value is not None else '       -'
+
+    warmup = report['warmup']
+    click.echo(f"Startup with MODEL_WARMUP={warmup['mode']}")
+    click.echo(f"  import app        {seconds(report['import_app'])}")
+    click.echo(f"  create_app        {seconds(report['create_app'])}")
+    click.echo(f"  first request     {seconds(report['first_request'])}")
+    click.echo(f"  warmup wait       {seconds(report['warmup_wait'])}")
+    click.echo(f"  ready after       {seconds(report['ready_after'])}")
+    click.echo(f"  first prediction  {seconds(report['first_prediction'])}")
+    click.echo(f"Warmup ({warmup['state']}, {seconds(warmup['seconds']).strip()})")
+    for name, phase in warmup['phases'].items():
+        imported = ', '.join(phase['imported'])
+        click.echo(f"  {name:<17} {seconds(phase['seconds'])}  {imported}".rstrip())
+    if warmup['error']:
+        click.echo(f"  error: {warmup['error']}")
+
+    imports = report['imports']
+    click.echo(f"Imports ({imports['modules']} modules, {imports['seconds']:.3f}s self time)")
+    for name, value in list(imports['packages'].items())[:top]:
+        share = value / imports['seconds'] * 100 if imports['seconds'] else 0
+        click.echo(f"  {name:<17} {seconds(value)}  {share:4.1f}%")
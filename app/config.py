@@ -29,4 +29,146 @@ class Config:
         'max_overflow': 20
     }
     
-    JWT_SECRET = os.getenv('JWT_SECRET', 'another-change-me')
\ No newline at end of file
+    # Connection pooling profile (see app/dbpool.py): 'static' uses the
+    # options above in every process; 'budget' and 'background' split
+    # DB_CONNECTION_BUDGET (minus DB_CONNECTION_RESERVE for migrations,
+    # cron and psql) across DB_POOL_WORKERS processes, 'background' pinging
+    # idle connections every DB_POOL_PING_INTERVAL seconds instead of on
+    # each checkout; 'pgbouncer' leaves pooling to a transaction-mode
+    # pgbouncer (e.g. Supabase's pooler on port 6543)
+    DB_POOL_PROFILE = os.getenv('DB_POOL_PROFILE', 'static')
+    DB_CONNECTION_BUDGET = int(os.getenv('DB_CONNECTION_BUDGET', 60))
+    DB_CONNECTION_RESERVE = int(os.getenv('DB_CONNECTION_RESERVE', 5))
+    DB_POOL_WORKERS = int(os.getenv('DB_POOL_WORKERS', os.getenv('WEB_CONCURRENCY', 1)))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PING_INTERVAL = int(os.getenv('DB_POOL_PING_INTERVAL', 30))
+    
+    JWT_SECRET = os.getenv('JWT_SECRET', 'another-change-me')
+    
+    # 'orjson' encodes responses and parses request bodies with orjson
+    # (same bytes as the stdlib; falls back to it when orjson is missing),
+    # 'stdlib' keeps Flask's default provider
+    JSON_ENGINE = os.getenv('JSON_ENGINE', 'orjson')
+    
+    # Model file served by the API (default: app/ml/rf_model.joblib). It is
+    # polled every MODEL_POLL_INTERVAL seconds (0 disables) and replacing it
+    # hot-swaps the model in every worker
+    MODEL_PATH = os.getenv('MODEL_PATH')
+    MODEL_POLL_INTERVAL = float(os.getenv('MODEL_POLL_INTERVAL', 10))
+    
+    # 'native' scores with the flattened forest in app/forest.py,
+    # 'sklearn' always goes through pipeline.predict_proba
+    MODEL_ENGINE = os.getenv('MODEL_ENGINE', 'native')
+    
+    # 'pickle' unpickles the model in every process; 'mmap' memory-maps a
+    # flattened engine artifact shared by all workers on the host
+    MODEL_LOAD_MODE = os.getenv('MODEL_LOAD_MODE', 'pickle')
+    MODEL_ARTIFACT_DIR = os.getenv('MODEL_ARTIFACT_DIR')
+    
+    # 'background' imports the ML stack and loads the model on a warmup
+    # thread in each worker, which serves auth, /user and /health in the
+    # meantime (/health shows the readiness); predictions wait up to
+    # MODEL_WARMUP_WAIT seconds for it before a 503. 'eager' loads it all
+    # in create_app: with gunicorn's preload_app, once in the master, and
+    # the workers share that copy. Background warmup with MODEL_LOAD_MODE
+    # 'pickle' costs a private model copy per worker, so it is only the
+    # default with 'mmap', where the workers map one shared artifact
+    MODEL_WARMUP = os.getenv('MODEL_WARMUP', 'background' if MODEL_LOAD_MODE == 'mmap' else 'eager')
+    MODEL_WARMUP_WAIT = float(os.getenv('MODEL_WARMUP_WAIT', 10))
+    
+    # Opt-in coalescing of concurrent /api/predict calls into one scoring
+    # call; only useful with threaded workers (gunicorn --threads N). Rows
+    # wait at most MAX_WAIT_MS, and only while traffic is dense enough
+    PREDICT_MICROBATCH_ENABLED = os.getenv('PREDICT_MICROBATCH_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    PREDICT_MICROBATCH_MAX_WAIT_MS = float(os.getenv('PREDICT_MICROBATCH_MAX_WAIT_MS', 2))
+    PREDICT_MICROBATCH_MAX_ROWS = int(os.getenv('PREDICT_MICROBATCH_MAX_ROWS', 64))
+    
+    # 'inline' scores on the request thread; 'process' hands rows to a pool
+    # of preloaded model processes so forest evaluation does not hold the
+    # worker's GIL. Size processes to roughly cores / gunicorn workers.
+    PREDICT_EXECUTOR = os.getenv('PREDICT_EXECUTOR', 'inline')
+    PREDICT_POOL_PROCESSES = int(os.getenv('PREDICT_POOL_PROCESSES', 2))
+    PREDICT_POOL_MAX_QUEUE = int(os.getenv('PREDICT_POOL_MAX_QUEUE', 8))
+    PREDICT_POOL_TIMEOUT = float(os.getenv('PREDICT_POOL_TIMEOUT', 5))
+    PREDICT_POOL_QUEUE_TIMEOUT = float(os.getenv('PREDICT_POOL_QUEUE_TIMEOUT', 1))
+    PREDICT_POOL_HEALTH_INTERVAL = float(os.getenv('PREDICT_POOL_HEALTH_INTERVAL', 10))
+    
+    # Async serving mode (asgi.py): the async driver URL defaults to
+    # DATABASE_URL with asyncpg/aiosqlite swapped in; CPU-bound work runs
+    # on ASYNC_BLOCKING_THREADS threads off the event loop
+    ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL')
+    ASYNC_BLOCKING_THREADS = int(os.getenv('ASYNC_BLOCKING_THREADS', 8))
+    
+    # Password hashing for /auth runs on PASSWORD_HASH_WORKERS threads per
+    # worker process with at most PASSWORD_HASH_MAX_QUEUE waiting; each
+    # scrypt hash takes ~32 MB while it runs. Logins rehash passwords that
+    # were stored with a different PASSWORD_HASH_METHOD
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_QUEUE = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', 64))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+    
+    # Upper bound on rows accepted by /api/predict/batch
+    PREDICT_BATCH_MAX_ROWS = int(os.getenv('PREDICT_BATCH_MAX_ROWS', 5000))
+    
+    # In-process cache of outputs for repeated feature vectors; set a Redis
+    # URL to share entries across gunicorn workers (needs `redis` installed)
+    PREDICT_CACHE_ENABLED = os.getenv('PREDICT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    PREDICT_CACHE_MAX_ENTRIES = int(os.getenv('PREDICT_CACHE_MAX_ENTRIES', 10000))
+    PREDICT_CACHE_TTL = int(os.getenv('PREDICT_CACHE_TTL', 3600))
+    PREDICT_CACHE_MAX_BYTES = int(os.getenv('PREDICT_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    PREDICT_CACHE_REDIS_URL = os.getenv('PREDICT_CACHE_REDIS_URL')
+    
+    # `explain` on /api/predict: per-feature contributions to the
+    # probability, from decision paths of the native engine. Cached like
+    # predictions (same TTL and Redis) in a cache of their own
+    PREDICT_EXPLAIN_ENABLED = os.getenv('PREDICT_EXPLAIN_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    PREDICT_EXPLAIN_CACHE_MAX_ENTRIES = int(os.getenv('PREDICT_EXPLAIN_CACHE_MAX_ENTRIES', 10000))
+    PREDICT_EXPLAIN_CACHE_MAX_BYTES = int(os.getenv('PREDICT_EXPLAIN_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    
+    # 'sync' writes each Prediction on the request thread; 'async' queues
+    # them for a background flusher that bulk-inserts in batches
+    PREDICTION_WRITE_MODE = os.getenv('PREDICTION_WRITE_MODE', 'sync')
+    PREDICTION_WRITE_MAX_QUEUE = int(os.getenv('PREDICTION_WRITE_MAX_QUEUE', 10000))
+    PREDICTION_WRITE_BATCH_SIZE = int(os.getenv('PREDICTION_WRITE_BATCH_SIZE', 500))
+    PREDICTION_WRITE_FLUSH_INTERVAL = float(os.getenv('PREDICTION_WRITE_FLUSH_INTERVAL', 0.5))
+    PREDICTION_WRITE_PUT_TIMEOUT = float(os.getenv('PREDICTION_WRITE_PUT_TIMEOUT', 0.05))
+    
+    # Verified JWTs and user snapshots are reused for this many seconds
+    # (never past the token's own expiry)
+    AUTH_CACHE_ENABLED = os.getenv('AUTH_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 60))
+    AUTH_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_CACHE_MAX_ENTRIES', 10000))
+    
+    # Load shedding for /api/predict* and /auth/* (see app/admission.py).
+    # Each worker runs at most *_MAX_IN_FLIGHT of each at once, with up to
+    # ADMISSION_MAX_QUEUE more waiting ADMISSION_MAX_WAIT seconds for a
+    # slot before a 503. Requests that already waited longer than
+    # ADMISSION_MAX_QUEUE_TIME seconds upstream (X-Request-Start, set by
+    # the Heroku router or nginx; 0 disables) are dropped. Each user gets
+    # RATE_LIMIT_PER_USER predictions per second (0 disables) with bursts
+    # of RATE_LIMIT_BURST before a 429
+    ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    ADMISSION_PREDICT_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_PREDICT_MAX_IN_FLIGHT', 8))
+    ADMISSION_AUTH_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_AUTH_MAX_IN_FLIGHT', 2))
+    ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', 32))
+    ADMISSION_MAX_WAIT = float(os.getenv('ADMISSION_MAX_WAIT', 0.25))
+    ADMISSION_MAX_QUEUE_TIME = float(os.getenv('ADMISSION_MAX_QUEUE_TIME', 0))
+    RATE_LIMIT_PER_USER = float(os.getenv('RATE_LIMIT_PER_USER', 20))
+    RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', 40))
+    
+    # Prometheus text metrics at /metrics: request latency per route, time
+    # per stage of /api/predict, DB pool checkout wait and component stats
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    
+    # On Postgres `prediction` is partitioned by month; a background thread
+    # in each worker keeps partitions created this many months ahead.
+    # `flask retain-predictions` rolls months older than
+    # PREDICTION_RETENTION_MONTHS into daily aggregates and removes them
+    PREDICTION_PARTITION_MONTHS_AHEAD = int(os.getenv('PREDICTION_PARTITION_MONTHS_AHEAD', 3))
+    PREDICTION_PARTITION_CHECK_INTERVAL = int(os.getenv('PREDICTION_PARTITION_CHECK_INTERVAL', 3600))
+    PREDICTION_RETENTION_MONTHS = int(os.getenv('PREDICTION_RETENTION_MONTHS', 12))
+    
+    # Rows fetched per round trip (and per written chunk) by history exports
+    EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 1000))
@@ -0,0 +1,195 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import AsyncExitStack, ExitStack
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+# DB_POOL_PROFILE values:
+#   static      SQLALCHEMY_ENGINE_OPTIONS as configured (10 + 20 overflow
+#               per process, pinged on every checkout)
+#   budget      DB_CONNECTION_BUDGET split across DB_POOL_WORKERS processes,
+#               hard-capped (no overflow), pinged on every checkout
+#   background  budget sizing, but idle connections are pinged by a
+#               background thread every DB_POOL_PING_INTERVAL seconds
+#               instead of on each checkout
+#   pgbouncer   no pooling in the app (NullPool) and no server-side
+#               prepared statements, for a transaction-mode pgbouncer
+POOL_PROFILES = ('static', 'budget', 'background', 'pgbouncer')
+
+
+def pool_budget(config):
+    """Connections each worker process may hold under the budget profiles."""
+    usable = config['DB_CONNECTION_BUDGET'] - config['DB_CONNECTION_RESERVE']
+    return max(1, usable // max(1, config['DB_POOL_WORKERS']))
+
+
+def _prepared_statement_name():
+    # Unique per statement so names never collide on a shared server
+    # connection behind pgbouncer
+    return f'__asyncpg_{uuid.uuid4()}__'
+
+
+def _pgbouncer_connect_args(url):
+    driver = url.get_driver_name()
+    if driver == 'asyncpg':
+        return {
+            'statement_cache_size': 0,
+            'prepared_statement_cache_size': 0,
+            'prepared_statement_name_func': _prepared_statement_name,
+        }
+    if driver == 'psycopg':
+        return {'prepare_threshold': None}
+    # psycopg2 never prepares statements server-side
+    return {}
+
+
+def engine_options(config, database_uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured DB_POOL_PROFILE.
+
+    `database_uri` picks driver-specific connect arguments, so the async
+    app passes its own URL.
+    """
+    profile = config['DB_POOL_PROFILE']
+    if profile not in POOL_PROFILES:
+        raise ValueError(f'DB_POOL_PROFILE must be one of {", ".join(POOL_PROFILES)}, got {profile!r}')
+    if profile == 'static':
+        return dict(config['SQLALCHEMY_ENGINE_OPTIONS'])
+    if profile == 'pgbouncer':
+        options = {'poolclass': NullPool, 'pool_pre_ping': False}
+        connect_args = _pgbouncer_connect_args(make_url(database_uri))
+        if connect_args:
+            options['connect_args'] = connect_args
+        return options
+
+    options = {
+        'pool_size': pool_budget(config),
+        'max_overflow': 0,
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': profile == 'budget',
+    }
+    if profile == 'background':
+        # Reuse the most recent connection first so the idle tail can
+        # age out through pool_recycle
+        options['pool_use_lifo'] = True
+    return options
+
+
+def pool_status(engine):
+    """Live counters of an engine's pool (for /health)."""
+    pool = engine.pool
+    status = {'class': type(pool).__name__}
+    for stat in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, stat, None)
+        if method is not None:
+            status[stat] = method()
+    return status
+
+
+class PoolKeepalive:
+    """Background liveness checks for idle pooled connections.
+
+    Every `interval` seconds each connection idle in the pool is checked
+    out and sent a `SELECT 1`. A dead connection raises a disconnect
+    error, which makes SQLAlchemy invalidate the whole pool, so requests
+    reconnect instead of failing on stale connections, without paying a
+    ping on every checkout. Started lazily per process like the model
+    watcher.
+    """
+
+    def __init__(self, app, interval=30):
+        self.app = app
+        self.interval = interval
+        self.checks = 0
+        self.pinged = 0
+        self.failures = 0
+        self.last_run = None
+        self.last_error = None
+
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_running(self):
+        if self.interval <= 0:
+            return
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='pool-keepalive', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        from . import db
+
+        while True:
+            time.sleep(self.interval)
+            with self.app.app_context():
+                self.check(db.engine)
+
+    def check(self, engine):
+        # Each idle connection is held until all have been pinged (a LIFO
+        # pool would otherwise hand back the same one every time), and a
+        # checkout only happens while one is idle, so the check never opens
+        # new connections or waits on a busy pool
+        pinged, error = 0, None
+        checkedin = getattr(engine.pool, 'checkedin', None)
+        with ExitStack() as held:
+            while checkedin is not None and checkedin() > 0:
+                try:
+                    conn = held.enter_context(engine.connect())
+                    conn.execute(text('SELECT 1'))
+                    conn.rollback()
+                    pinged += 1
+                except Exception as e:
+                    error = str(e)
+                    logger.warning('pool liveness check failed: %s', e)
+                    break
+        self.record(pinged, error)
+
+    async def check_async(self, engine):
+        """`check` for an AsyncEngine, run on the serving event loop."""
+        pinged, error = 0, None
+        pool = engine.sync_engine.pool
+        checkedin = getattr(pool, 'checkedin', None)
+        async with AsyncExitStack() as held:
+            while checkedin is not None and checkedin() > 0:
+                try:
+                    conn = await held.enter_async_context(engine.connect())
+                    await conn.execute(text('SELECT 1'))
+                    await conn.rollback()
+                    pinged += 1
+                except Exception as e:
+                    error = str(e)
+                    logger.warning('pool liveness check failed: %s', e)
+                    break
+        self.record(pinged, error)
+
+    def record(self, pinged, error=None):
+        self.checks += 1
+        self.pinged += pinged
+        self.last_run = datetime.now(timezone.utc).isoformat()
+        if error is not None:
+            self.failures += 1
+            self.last_error = error
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'checks': self.checks,
+            'pinged': self.pinged,
+            'failures': self.failures,
+            'last_run': self.last_run,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,386 @@
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Request: rows, features, then rows*features float64 values.
+# Reply: status, rows, classes, then rows int32 class indices and
+# rows*classes float64 probabilities (or a UTF-8 error when status != 0).
+_REQUEST = struct.Struct('<II')
+_REPLY = struct.Struct('<BII')
+_PING = b'ping'
+
+
+class PoolSaturated(Exception):
+    """Every pool process is busy and the wait queue is full."""
+
+
+class PoolTimeout(Exception):
+    """A pool process did not answer in time and was replaced."""
+
+
+# ===== CHILD PROCESS =====
+
+def _load_child_model(version, path, artifact, use_engine):
+    from joblib import load
+
+    from .forest import ForestEngine
+    from .loader import LazyPipeline
+    from .registry import ModelVersion
+    from .utils import file_fingerprint
+
+    if file_fingerprint(path) != version:
+        raise RuntimeError(f'model file {path} no longer matches version {version}')
+
+    engine = None
+    pipeline = None
+    if use_engine:
+        if artifact and os.path.isdir(artifact):
+            engine = ForestEngine.load(artifact)
+        else:
+            pipeline = load(path)
+            engine = ForestEngine.from_model(pipeline)
+    if pipeline is None:
+        pipeline = LazyPipeline(path) if engine is not None else load(path)
+
+    return ModelVersion(version, path, pipeline, engine, 0.0)
+
+
+def _serve(conn, version, path, artifact, use_engine):
+    """Pool process main loop: load the model once, then score forever."""
+    import numpy as np
+
+    try:
+        model = _load_child_model(version, path, artifact, use_engine)
+        classes = model.engine.classes_ if model.engine is not None else model.pipeline.classes_
+        conn.send_bytes(json.dumps({'ok': True, 'classes': classes.tolist()}).encode())
+    except Exception as e:
+        conn.send_bytes(json.dumps({'ok': False, 'error': str(e)}).encode())
+        return
+
+    while True:
+        try:
+            msg = conn.recv_bytes()
+        except (EOFError, OSError):
+            return
+        if msg == _PING:
+            conn.send_bytes(_PING)
+            continue
+
+        try:
+            n_rows, n_features = _REQUEST.unpack_from(msg)
+            X = np.frombuffer(msg, dtype=np.float64, offset=_REQUEST.size).reshape(n_rows, n_features)
+            labels, proba = model.score(X)
+            index = np.searchsorted(classes, labels).astype(np.int32)
+            n_classes = proba.shape[1] if proba is not None else 0
+            reply = _REPLY.pack(0, n_rows, n_classes) + index.tobytes()
+            if proba is not None:
+                reply += np.ascontiguousarray(proba, dtype=np.float64).tobytes()
+        except Exception as e:
+            reply = _REPLY.pack(1, 0, 0) + str(e).encode()
+        conn.send_bytes(reply)
+
+
+# ===== PARENT SIDE =====
+
+class _PoolProcess:
+    def __init__(self, ctx, version, path, artifact, use_engine):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_serve, args=(child_conn, version, path, artifact, use_engine),
+            name=f'inference-{version}', daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.classes = None
+
+    def wait_ready(self, timeout):
+        if not self.conn.poll(timeout):
+            raise PoolTimeout('pool process did not load the model in time')
+        import numpy as np
+
+        hello = json.loads(self.conn.recv_bytes())
+        if not hello['ok']:
+            raise RuntimeError(hello['error'])
+        self.classes = np.asarray(hello['classes'])
+
+    def call(self, X, timeout):
+        import numpy as np
+
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        self.conn.send_bytes(_REQUEST.pack(*X.shape) + X.tobytes())
+        if not self.conn.poll(timeout):
+            raise PoolTimeout(f'pool process did not answer within {timeout}s')
+        reply = self.conn.recv_bytes()
+
+        status, n_rows, n_classes = _REPLY.unpack_from(reply)
+        if status != 0:
+            raise RuntimeError(reply[_REPLY.size:].decode(errors='replace'))
+        offset = _REPLY.size
+        index = np.frombuffer(reply, dtype=np.int32, count=n_rows, offset=offset)
+        proba = None
+        if n_classes:
+            proba = np.frombuffer(
+                reply, dtype=np.float64, count=n_rows * n_classes, offset=offset + index.nbytes
+            ).reshape(n_rows, n_classes)
+        return self.classes[index], proba
+
+    def ping(self, timeout):
+        try:
+            self.conn.send_bytes(_PING)
+            return self.conn.poll(timeout) and self.conn.recv_bytes() == _PING
+        except (EOFError, OSError):
+            return False
+
+    def kill(self):
+        try:
+            self.conn.close()
+        finally:
+            if self.process.is_alive():
+                self.process.kill()
+            self.process.join(1)
+
+
+class _Generation:
+    """The pool processes serving one model version."""
+
+    def __init__(self, version):
+        self.version = version
+        self.idle = queue.Queue()
+        self.members = []
+        self.closed = False
+
+
+class InferencePool:
+    """Scores predictions in a pool of preloaded model processes.
+
+    Forest evaluation holds the GIL for its whole run, so inline scoring
+    stalls every other thread of a threaded worker. The pool moves it to
+    separate processes, each holding its own copy of the current model
+    (cheap with MODEL_LOAD_MODE=mmap), and passes rows and results as raw
+    float64 bytes over a pipe.
+
+    At most `processes + max_queue` calls are admitted at once; beyond
+    that, or after waiting `queue_timeout` seconds for a free process,
+    PoolSaturated is raised. A process that misses `timeout` or fails a
+    periodic ping is killed and replaced in the background.
+
+    Processes are started lazily in the serving process (never in a
+    preloading gunicorn master). A fresh generation is built for every
+    model version; until it is ready, calls score inline.
+    """
+
+    def __init__(self, app, processes=2, max_queue=4, timeout=5.0, queue_timeout=1.0,
+                 start_timeout=60.0, health_interval=10.0):
+        self.app = app
+        self.processes = processes
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.start_timeout = start_timeout
+        self.health_interval = health_interval
+
+        self._ctx = multiprocessing.get_context('spawn')
+        self._slots = threading.BoundedSemaphore(processes + max_queue)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._generation = None
+        self._building = None
+        self._health = None
+
+        self.calls = 0
+        self.inline_calls = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.failed_builds = 0
+
+        atexit.register(self.close)
+
+    # ===== LIFECYCLE =====
+
+    def ensure_started(self):
+        """Make sure this process has a generation for the current model."""
+        model = self.app.model_registry.current
+        if model is None:
+            return
+        generation = self._generation
+        if self._pid == os.getpid() and (
+                (generation is not None and generation.version == model.version)
+                or self._building == model.version):
+            return
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # Pipes and processes inherited through fork belong to the parent
+                self._pid = os.getpid()
+                self._generation = None
+                self._building = None
+                self._slots = threading.BoundedSemaphore(self.processes + self.max_queue)
+                self._health = threading.Thread(target=self._check_health, name='inference-health',
+                                                daemon=True)
+                self._health.start()
+            if self._building == model.version or (
+                    self._generation is not None and self._generation.version == model.version):
+                return
+            self._building = model.version
+            threading.Thread(target=self._build, args=(model,), name='inference-build',
+                             daemon=True).start()
+
+    def _spawn(self, model):
+        from .loader import artifact_dir
+
+        artifact = os.path.join(artifact_dir(self.app), model.version)
+        return _PoolProcess(self._ctx, model.version, model.path, artifact, model.engine is not None)
+
+    def _build(self, model):
+        generation = _Generation(model.version)
+        members = []
+        try:
+            members = [self._spawn(model) for _ in range(self.processes)]
+            for member in members:
+                member.wait_ready(self.start_timeout)
+        except Exception as e:
+            self.failed_builds += 1
+            logger.error("inference pool for model %s failed to start: %s", model.version, e)
+            for member in members:
+                member.kill()
+            with self._lock:
+                if self._building == model.version:
+                    self._building = None
+            return
+
+        generation.members = members
+        for member in members:
+            generation.idle.put(member)
+
+        with self._lock:
+            old, self._generation = self._generation, generation
+            if self._building == model.version:
+                self._building = None
+        if old is not None:
+            self._retire(old)
+        logger.info("inference pool serving model %s with %d processes", model.version, len(members))
+
+    def _retire(self, generation):
+        # Busy members are killed when they come back to the idle queue
+        generation.closed = True
+        while True:
+            try:
+                generation.idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+    def _replace(self, generation, member, model):
+        member.kill()
+        self.restarts += 1
+
+        def respawn():
+            try:
+                fresh = self._spawn(model)
+                fresh.wait_ready(self.start_timeout)
+            except Exception as e:
+                logger.error("could not replace inference process: %s", e)
+                return
+            generation.members = [m for m in generation.members if m is not member] + [fresh]
+            self._release(generation, fresh)
+
+        threading.Thread(target=respawn, name='inference-respawn', daemon=True).start()
+
+    def _release(self, generation, member):
+        if generation.closed:
+            member.kill()
+        else:
+            generation.idle.put(member)
+
+    def _check_health(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.health_interval)
+            generation = self._generation
+            if generation is None:
+                continue
+            model = self.app.model_registry.current
+            for _ in range(generation.idle.qsize()):
+                try:
+                    member = generation.idle.get_nowait()
+                except queue.Empty:
+                    break
+                if member.process.is_alive() and member.ping(self.timeout):
+                    self._release(generation, member)
+                elif model is not None and model.version == generation.version:
+                    logger.warning("inference process %s failed health check, replacing",
+                                   member.process.pid)
+                    self._replace(generation, member, model)
+                else:
+                    member.kill()
+
+    def close(self):
+        generation = self._generation
+        if generation is not None and self._pid == os.getpid():
+            self._retire(generation)
+            for member in generation.members:
+                member.kill()
+
+    # ===== SCORING =====
+
+    def score(self, model, X):
+        """Score X with `model` in a pool process; returns (labels, probabilities).
+
+        Falls back to inline scoring while no generation for this model
+        version is running in this process.
+        """
+        generation = self._generation
+        if generation is None or generation.version != model.version or self._pid != os.getpid():
+            self.inline_calls += 1
+            return model.score(X)
+
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PoolSaturated('inference queue is full')
+        try:
+            try:
+                member = generation.idle.get(timeout=self.queue_timeout)
+            except queue.Empty:
+                self.rejected += 1
+                raise PoolSaturated('no inference process became free in time')
+
+            self.calls += 1
+            try:
+                result = member.call(X, self.timeout)
+            except (PoolTimeout, EOFError, OSError) as e:
+                if isinstance(e, PoolTimeout):
+                    self.timeouts += 1
+                self._replace(generation, member, model)
+                raise PoolTimeout(str(e)) from e
+            except Exception:
+                self._release(generation, member)
+                raise
+            self._release(generation, member)
+            return result
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        generation = self._generation
+        return {
+            'version': generation.version if generation is not None else None,
+            'building': self._building,
+            'processes': self.processes,
+            'alive': sum(m.process.is_alive() for m in generation.members) if generation else 0,
+            'idle': generation.idle.qsize() if generation is not None else 0,
+            'max_queue': self.max_queue,
+            'calls': self.calls,
+            'inline_calls': self.inline_calls,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'restarts': self.restarts,
+            'failed_builds': self.failed_builds,
+        }
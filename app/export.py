@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+
+from . import db
+from .models import PREDICTION_STORAGE, Prediction, prediction_input, prediction_output
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def serialize_prediction(pred, include_user=False):
+    """JSON-ready dict for a Prediction (or a row with the same columns)."""
+    data = {
+        'id': pred.id,
+        'input_json': prediction_input(pred),
+        'output_json': prediction_output(pred),
+        'created_at': pred.created_at.isoformat()
+    }
+    if pred.explanation is not None:
+        data['explanation'] = pred.explanation
+    if include_user:
+        data['user_id'] = pred.user_id
+        data['model_version'] = pred.model_version
+    return data
+
+
+def prediction_rows(user_id=None):
+    """SELECT of the exported prediction columns, oldest first."""
+    stmt = db.select(
+        Prediction.id,
+        Prediction.user_id,
+        *PREDICTION_STORAGE,
+        Prediction.model_version,
+        Prediction.explanation,
+        Prediction.created_at
+    )
+    if user_id is not None:
+        stmt = stmt.where(Prediction.user_id == user_id)
+    return stmt.order_by(Prediction.created_at, Prediction.id)
+
+
+def iter_predictions(user_id=None, chunk_size=1000):
+    """Yield prediction rows oldest first through a server-side cursor.
+
+    Selects plain columns rather than ORM entities so rows are not kept in
+    the session's identity map; with `yield_per` the driver fetches
+    `chunk_size` rows at a time, keeping memory flat for any history size.
+    """
+    stmt = prediction_rows(user_id)
+    result = db.session.execute(stmt.execution_options(yield_per=chunk_size))
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def export_encoder(fmt):
+    """Return (header, encode) for an export format.
+
+    `encode(rows)` turns a block of rows into one string of NDJSON lines
+    or CSV records; `header` is the text that precedes the first block.
+    """
+    from .predict import REQUIRED_COLS
+
+    buf = io.StringIO()
+
+    if fmt == 'csv':
+        writer = csv.writer(buf)
+        writer.writerow(['id', 'user_id', 'created_at'] + REQUIRED_COLS
+                        + ['prediction', 'probability', 'model_version'])
+
+        def write(row):
+            inputs = prediction_input(row) or {}
+            output = prediction_output(row) or {}
+            labels = output.get('prediction') or [None]
+            probability = output.get('probability')
+            writer.writerow(
+                [row.id, row.user_id, row.created_at.isoformat()]
+                + [inputs.get(c) for c in REQUIRED_COLS]
+                + [labels[0], json.dumps(probability[0]) if probability else '', row.model_version]
+            )
+    else:
+        def write(row):
+            buf.write(json.dumps(serialize_prediction(row, include_user=True), separators=(',', ':')))
+            buf.write('\n')
+
+    header = buf.getvalue()
+
+    def encode(rows):
+        buf.seek(0)
+        buf.truncate()
+        for row in rows:
+            write(row)
+        return buf.getvalue()
+
+    return header, encode
+
+
+def iter_export(rows, fmt, chunk_size=1000):
+    """Encode rows as NDJSON or CSV, yielding text chunks.
+
+    The CSV header goes out before the first row is fetched, and rows are
+    grouped `chunk_size` at a time so the server writes large blocks
+    instead of one small write per row.
+    """
+    header, encode = export_encoder(fmt)
+    if header:
+        yield header
+
+    block = []
+    for row in rows:
+        block.append(row)
+        if len(block) >= chunk_size:
+            yield encode(block)
+            block = []
+
+    if block:
+        yield encode(block)
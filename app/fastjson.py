@@ -0,0 +1,106 @@
+import math
+import sys
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson writes 1e16 and 1e-7 where the stdlib writes 1e+16 and 1e-07,
+# and values in [1e-5, 1e-4) as 0.0000x where the stdlib uses exponents.
+# Output with a digit followed by 'e', or with '0.0000', goes through the
+# stdlib instead; such bytes inside strings only cost the fast path.
+_DIGITS = bytes.maketrans(b'0123456789', b'##########')
+
+
+def default(o):
+    """Fallback encoder shared by both paths: NumPy and ISO dates first.
+
+    NumPy values become the Python values tolist()/item() give, so a
+    float32 is written as its exact float64 value on either path.
+    """
+    if isinstance(o, date):
+        return o.isoformat()
+    # Until something has imported NumPy there are no NumPy values to encode
+    np = sys.modules.get('numpy')
+    if np is not None:
+        if isinstance(o, np.ndarray):
+            return finite(o.tolist())
+        if isinstance(o, np.generic):
+            return finite(o.item())
+    return _default(o)
+
+
+def finite(obj):
+    """`obj` with non-finite floats in dicts, lists and tuples replaced by
+    None, as orjson writes them. Only the stdlib path pays for the walk."""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [finite(value) for value in obj]
+    return obj
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes and decodes with orjson when it can.
+
+    Only responses are encoded with orjson. Their bytes are what the
+    stdlib provider's response() writes (sorted keys, ASCII escapes,
+    compact separators, repr() floats): bodies orjson would render
+    differently, such as non-ASCII text or exponent floats, are re-encoded
+    with the stdlib. Two things differ from Flask's provider, identically
+    on both paths: NumPy arrays and scalars, datetimes and dates are
+    accepted and come out as lists, numbers (float32 at float64 precision)
+    and ISO 8601 strings; non-finite floats, which the stdlib writes as
+    invalid JSON (NaN), come out as null. dumps() is left to the stdlib.
+
+    Request bodies orjson would reject or read differently (NaN literals,
+    integers beyond 64 bits) are parsed by the stdlib, so the accepted
+    input and its values are unchanged.
+    """
+
+    default = staticmethod(default)
+
+    def _fast_dumps(self, obj):
+        """orjson bytes for `obj`, or None when the stdlib must encode it."""
+        if orjson is None:
+            return None
+        # No OPT_SERIALIZE_NUMPY: NumPy goes through default() like on the
+        # stdlib path, which writes float32 values differently
+        option = orjson.OPT_SORT_KEYS if self.sort_keys else 0
+        try:
+            data = orjson.dumps(obj, default=self.default, option=option)
+        except TypeError:
+            # Non-str keys, ints beyond 64 bits and the like
+            return None
+        if self.ensure_ascii and not data.isascii():
+            return None
+        if b'#e' in data.translate(_DIGITS) or b'0.0000' in data:
+            return None
+        return data
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            raw = s.encode() if isinstance(s, str) else bytes(s)
+            # orjson turns integers beyond 64 bits into floats
+            if b'#' * 20 not in raw.translate(_DIGITS):
+                try:
+                    return orjson.loads(raw)
+                except orjson.JSONDecodeError:
+                    pass
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact is False or (self.compact is None and self._app.debug):
+            # Indented debug output stays on the stdlib
+            return super().response(finite(obj))
+        data = self._fast_dumps(obj)
+        if data is None:
+            return super().response(finite(obj))
+        return self._app.response_class(data + b'\n', mimetype=self.mimetype)
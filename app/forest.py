@@ -0,0 +1,308 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+# sklearn and pandas are imported only to build and verify an engine, so a
+# worker mapping a saved artifact starts with NumPy alone
+
+
+class ForestEngine:
+    """Random forest flattened into contiguous arrays for fast scoring.
+
+    Every tree of the forest is laid out back to back in one set of node
+    arrays (feature, threshold, left/right child, class fractions), so a
+    whole batch of rows walks all trees at once with a handful of NumPy
+    gathers per depth level instead of one Cython call per tree.
+
+    The arithmetic mirrors sklearn exactly: the MinMax scaling is applied in
+    float64 in the same order, rows are cast to float32 before comparing
+    against the float64 thresholds, and per-tree probabilities are summed
+    tree by tree before dividing by the number of trees.
+    """
+
+    # Node arrays persisted by save()/load(), in addition to classes_
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+
+    def __init__(self, classes, n_features, feature, threshold, left, right, value,
+                 roots, max_depth, scale=None, min_=None):
+        self.classes_ = classes
+        self.n_features = n_features
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.n_trees = len(roots)
+        self.max_depth = max_depth
+        self.scale_ = scale
+        self.min_ = min_
+        self._deltas = None
+
+    @classmethod
+    def from_model(cls, model):
+        """Build an engine for a supported model, or return None.
+
+        Supported: a bare RandomForestClassifier, or a Pipeline of an
+        optional MinMaxScaler followed by a RandomForestClassifier.
+        """
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import MinMaxScaler
+
+        scaler = None
+        forest = model
+        if isinstance(model, Pipeline):
+            steps = [step for _, step in model.steps if step not in (None, 'passthrough')]
+            if len(steps) == 2 and isinstance(steps[0], MinMaxScaler) and not steps[0].clip:
+                scaler, forest = steps
+            elif len(steps) == 1:
+                forest = steps[0]
+            else:
+                return None
+
+        if not isinstance(forest, RandomForestClassifier) or forest.n_outputs_ != 1:
+            return None
+
+        return cls._flatten(forest, scaler)
+
+    @classmethod
+    def _flatten(cls, forest, scaler=None):
+        n_classes = len(forest.classes_)
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for est in forest.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            left = tree.children_left.astype(np.intp)
+            right = tree.children_right.astype(np.intp)
+            leaf = left == -1
+
+            # Leaves point at themselves so finished rows stay put while
+            # the rest of the batch keeps descending
+            own = np.arange(n, dtype=np.intp)
+            left = np.where(leaf, own, left) + offset
+            right = np.where(leaf, own, right) + offset
+
+            feature = np.where(leaf, 0, tree.feature).astype(np.intp)
+
+            features.append(feature)
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(left)
+            rights.append(right)
+            values.append(tree.value[:, 0, :n_classes].astype(np.float64))
+            roots.append(offset)
+
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            classes=forest.classes_,
+            n_features=forest.n_features_in_,
+            feature=np.ascontiguousarray(np.concatenate(features)),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            left=np.ascontiguousarray(np.concatenate(lefts)),
+            right=np.ascontiguousarray(np.concatenate(rights)),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            scale=np.ascontiguousarray(scaler.scale_, dtype=np.float64) if scaler is not None else None,
+            min_=np.ascontiguousarray(scaler.min_, dtype=np.float64) if scaler is not None else None
+        )
+
+    def save(self, path):
+        """Write the engine as a directory of .npy files plus meta.json.
+
+        The directory is assembled under a temporary name and renamed into
+        place, so concurrent workers never see a half-written artifact.
+        """
+        tmp = f'{path}.tmp-{os.getpid()}'
+        os.makedirs(tmp, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(tmp, f'{name}.npy'), getattr(self, name))
+        np.save(os.path.join(tmp, 'classes.npy'), self.classes_)
+        meta = {
+            'n_features': int(self.n_features),
+            'max_depth': int(self.max_depth),
+            'scale': self.scale_.tolist() if self.scale_ is not None else None,
+            'min': self.min_.tolist() if self.min_ is not None else None,
+        }
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Another process got there first; its artifact is identical
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load a saved engine; with mmap_mode='r' the node arrays are
+        memory-mapped read-only and shared through the OS page cache by
+        every process that maps the same artifact."""
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in cls.ARRAYS
+        }
+        return cls(
+            classes=np.load(os.path.join(path, 'classes.npy')),
+            n_features=meta['n_features'],
+            max_depth=meta['max_depth'],
+            scale=np.asarray(meta['scale'], dtype=np.float64) if meta['scale'] is not None else None,
+            min_=np.asarray(meta['min'], dtype=np.float64) if meta['min'] is not None else None,
+            **arrays
+        )
+
+    def _prepare(self, X):
+        X = np.array(X, dtype=np.float64, copy=True, ndmin=2)
+        if X.shape[1] != self.n_features:
+            raise ValueError(
+                f'X has {X.shape[1]} features, but the model expects {self.n_features}'
+            )
+        if not np.isfinite(X).all():
+            raise ValueError('Input X contains NaN or infinity.')
+
+        if self.scale_ is not None:
+            X *= self.scale_
+            X += self.min_
+
+        # Trees compare float32 inputs against float64 thresholds
+        return X.astype(np.float32).astype(np.float64)
+
+    def apply(self, X):
+        """Return the global leaf index reached by every row in every tree,
+        shape (n_trees, n_rows)."""
+        X = self._prepare(X)
+        n_rows = X.shape[0]
+        rows = np.arange(n_rows)
+
+        node = np.repeat(self.roots[:, None], n_rows, axis=1)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        return node
+
+    def prepare_explanations(self):
+        """Build the per-node tables `explain` walks; idempotent.
+
+        deltas[k, 2 * node + went_left] is the change in the fraction of
+        class k from the node to the child taken (zero at leaves, which
+        point at themselves). Private to the process, unlike the mapped
+        arrays.
+        """
+        if self._deltas is None:
+            value = np.asarray(self.value)
+            deltas = np.empty((value.shape[1], len(value), 2), dtype=np.float64)
+            deltas[:, :, 0] = (value[self.right] - value).T
+            deltas[:, :, 1] = (value[self.left] - value).T
+            self._deltas = deltas.reshape(value.shape[1], -1)
+        return self._deltas
+
+    def explain(self, X, class_index=None):
+        """Per-feature contributions to the class probabilities.
+
+        Decomposes each row's decision paths (Saabas): every split moves
+        the tree's class fractions by the child's minus the parent's, and
+        that change is credited to the split feature. Returns (bias,
+        contributions) with shapes (n_classes,) and (n_rows, n_features,
+        n_classes), or () and (n_rows, n_features) for one `class_index`;
+        bias + contributions.sum(axis=1) equals predict_proba up to
+        rounding. `class_index` may also hold one index per row, giving
+        (n_rows,) and (n_rows, n_features) for each row's own class. The
+        walk is the same batched descent as `apply`.
+        """
+        deltas = self.prepare_explanations()
+        X = self._prepare(X)
+        n_rows = X.shape[0]
+        rows = np.arange(n_rows)
+
+        # (row, feature) slot and delta-table column of every step, summed
+        # with one bincount per class after the descent
+        slots = np.empty((self.max_depth, self.n_trees, n_rows), dtype=np.intp)
+        steps = np.empty((self.max_depth, self.n_trees, n_rows), dtype=np.intp)
+        row_offset = rows * self.n_features
+
+        node = np.repeat(self.roots[:, None], n_rows, axis=1)
+        for depth in range(self.max_depth):
+            feature = self.feature[node]
+            go_left = X[rows, feature] <= self.threshold[node]
+            slots[depth] = row_offset + feature
+            steps[depth] = 2 * node + go_left
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        slots = slots.ravel()
+        steps = steps.ravel()
+        size = n_rows * self.n_features
+        per_row = class_index is not None and np.ndim(class_index) == 1
+        if class_index is None or per_row:
+            classes = range(len(self.classes_))
+        else:
+            classes = [class_index]
+        contributions = np.stack([
+            np.bincount(slots, weights=deltas[k].take(steps), minlength=size) for k in classes
+        ], axis=-1)
+        contributions /= self.n_trees
+
+        bias = np.asarray(self.value)[self.roots].mean(axis=0)
+        contributions = contributions.reshape(n_rows, self.n_features, len(classes))
+        if per_row:
+            class_index = np.asarray(class_index, dtype=np.intp)
+            return bias[class_index], contributions[rows, :, class_index]
+        if class_index is not None:
+            return bias[class_index], contributions[:, :, 0]
+        return bias, contributions
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        out = np.zeros((leaves.shape[1], len(self.classes_)), dtype=np.float64)
+        for tree_leaves in leaves:
+            out += self.value[tree_leaves]
+        out /= self.n_trees
+        return out
+
+    def predict(self, X):
+        """Return (labels, probabilities) from a single pass over the trees."""
+        proba = self.predict_proba(X)
+        return self.classes_.take(np.argmax(proba, axis=1), axis=0), proba
+
+    def verify(self, model, n_rows=1024, seed=0):
+        """Check the engine against the model it was built from.
+
+        Scores a deterministic batch of synthetic rows both ways and
+        returns True only if labels and probabilities match bit for bit.
+        """
+        import pandas as pd
+
+        rng = np.random.default_rng(seed)
+        if self.scale_ is not None:
+            low = -self.min_ / self.scale_
+            high = (1 - self.min_) / self.scale_
+        else:
+            low = np.zeros(self.n_features)
+            high = np.full(self.n_features, 100.0)
+
+        X = rng.uniform(low, high, size=(n_rows, self.n_features))
+        # Half the rows get whole numbers, like the categorical inputs the
+        # API receives, so exact-threshold comparisons are exercised too
+        X[: n_rows // 2] = np.round(X[: n_rows // 2])
+
+        feature_names = getattr(model, 'feature_names_in_', None)
+        if feature_names is not None:
+            X_model = pd.DataFrame(X, columns=feature_names)
+        else:
+            X_model = X
+
+        expected_proba = model.predict_proba(X_model)
+        expected_pred = model.predict(X_model)
+        pred, proba = self.predict(X)
+
+        return bool(
+            np.array_equal(proba, expected_proba) and np.array_equal(pred, expected_pred)
+        )
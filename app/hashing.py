@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from .utils import percentile
+
+
+class HashingBusy(Exception):
+    """The hashing pool is saturated; the caller should retry later."""
+
+
+class PasswordHasher:
+    """Runs password hashing and verification on a small bounded pool.
+
+    werkzeug's KDFs (scrypt by default) release the GIL, so `workers`
+    threads hash in parallel while request threads only wait. At most
+    `workers + max_queue` operations are admitted at once; beyond that,
+    or when an operation isn't finished within `timeout` seconds,
+    HashingBusy is raised instead of piling more work on the CPU. This
+    keeps login storms from taking every core away from predictions (and
+    bounds scrypt's 32 MB per concurrent hash).
+
+    `needs_rehash` tells whether a stored hash was made with different
+    parameters than `method`, so logins can upgrade hashes in place.
+    """
+
+    def __init__(self, method='scrypt', workers=2, max_queue=64, timeout=10.0, window=4096):
+        self.method = method
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        self._executor = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._method_prefix = None
+
+        self._stats_lock = threading.Lock()
+        self._queue_times = deque(maxlen=window)
+        self._hash_times = deque(maxlen=window)
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.rehashed = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # Executor threads don't survive a fork
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='password-hash')
+                self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+                self._pid = os.getpid()
+
+    def _submit(self, fn, *args):
+        self._ensure_started()
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self.rejected += 1
+            raise HashingBusy('password hashing queue is full')
+        with self._stats_lock:
+            self.in_flight += 1
+        future = self._executor.submit(self._run, time.perf_counter(), fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._stats_lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _run(self, queued_at, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._stats_lock:
+                self._queue_times.append(started - queued_at)
+                self._hash_times.append(finished - started)
+                self.completed += 1
+
+    def submit_hash(self, password):
+        """Start hashing `password`; returns a concurrent.futures.Future."""
+        return self._submit(generate_password_hash, password, self.method)
+
+    def submit_verify(self, pwhash, password):
+        return self._submit(check_password_hash, pwhash, password)
+
+    def wait(self, future):
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            raise self.timed_out(future)
+
+    def timed_out(self, future):
+        """Give up on `future`; returns the HashingBusy to raise."""
+        future.cancel()
+        with self._stats_lock:
+            self.timeouts += 1
+        return HashingBusy(f'password hashing took longer than {self.timeout}s')
+
+    def hash(self, password):
+        return self.wait(self.submit_hash(password))
+
+    def verify(self, pwhash, password):
+        return self.wait(self.submit_verify(pwhash, password))
+
+    def record_rehash(self):
+        with self._stats_lock:
+            self.rehashed += 1
+
+    def needs_rehash(self, pwhash):
+        """True if `pwhash` was not made with the configured method and parameters."""
+        if self._method_prefix is None:
+            # werkzeug fills in default parameters ('scrypt' becomes
+            # 'scrypt:32768:8:1'), so ask it for the exact prefix once
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._method_prefix
+
+    def stats(self):
+        with self._stats_lock:
+            queue_times = sorted(self._queue_times)
+            hash_times = sorted(self._hash_times)
+            in_flight, completed, rejected, timeouts, rehashed = (
+                self.in_flight, self.completed, self.rejected, self.timeouts, self.rehashed
+            )
+
+        def percentiles(samples):
+            if not len(samples):
+                return {'samples': 0, 'p50': None, 'p99': None}
+            return {
+                'samples': len(samples),
+                'p50': round(percentile(samples, 50) * 1000, 3),
+                'p99': round(percentile(samples, 99) * 1000, 3),
+            }
+
+        return {
+            'method': self.method,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'in_flight': in_flight,
+            'completed': completed,
+            'rejected': rejected,
+            'timeouts': timeouts,
+            'rehashed': rehashed,
+            'queue_ms': percentiles(queue_times),
+            'hash_ms': percentiles(hash_times),
+        }
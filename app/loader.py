@@ -0,0 +1,110 @@
+import os
+import sys
+import threading
+
+from .utils import file_fingerprint
+
+
+def load(path):
+    # joblib, and sklearn through the pickle, only come in with the first
+    # model that actually has to be unpickled
+    from joblib import load
+    return load(path)
+
+
+class LazyPipeline:
+    """Stands in for the sklearn pipeline until something actually needs it.
+
+    With a memory-mapped engine artifact the pipeline is only a fallback,
+    so workers skip unpickling it unless the native engine is unavailable.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._pipeline = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._pipeline is None:
+            with self._lock:
+                if self._pipeline is None:
+                    self._pipeline = load(self._path)
+        return getattr(self._pipeline, name)
+
+    def __repr__(self):
+        state = 'loaded' if self._pipeline is not None else 'not loaded'
+        return f'<LazyPipeline {self._path} ({state})>'
+
+
+def build_engine(app, pipeline):
+    """Flatten the loaded forest for native scoring, or return None.
+
+    The engine is only used when it reproduces the sklearn pipeline
+    exactly on a verification batch; otherwise predictions keep going
+    through sklearn.
+    """
+    if app.config['MODEL_ENGINE'] != 'native':
+        return None
+
+    from .forest import ForestEngine
+
+    try:
+        engine = ForestEngine.from_model(pipeline)
+        if engine is None:
+            print("⚠️  Model type not supported by native engine, using sklearn", file=sys.stderr)
+            return None
+        if not engine.verify(pipeline):
+            print("⚠️  Native engine does not match sklearn output, using sklearn", file=sys.stderr)
+            return None
+    except Exception as e:
+        print(f"❌ Error building native engine: {e}", file=sys.stderr)
+        return None
+
+    print(f"✅ Native engine ready ({engine.n_trees} trees, {len(engine.feature)} nodes)", file=sys.stderr)
+    return engine
+
+
+def artifact_dir(app):
+    return app.config['MODEL_ARTIFACT_DIR'] or os.path.join(app.instance_path, 'model-artifacts')
+
+
+def load_model(app, path):
+    """Load the model at `path`; returns (pipeline, engine, fingerprint).
+
+    MODEL_LOAD_MODE='pickle' unpickles the pipeline and flattens it in this
+    process. 'mmap' keeps the flattened engine as .npy files keyed by the
+    model's content hash: the first process builds and verifies it, every
+    later one memory-maps it read-only, so all workers on the host share
+    one copy through the page cache and start without unpickling the
+    forest.
+    """
+    fingerprint = file_fingerprint(path)
+
+    if app.config['MODEL_LOAD_MODE'] != 'mmap' or app.config['MODEL_ENGINE'] != 'native':
+        pipeline = load(path)
+        print(f"✅ Pipeline loaded successfully from {path}", file=sys.stderr)
+        return pipeline, build_engine(app, pipeline), fingerprint
+
+    from .forest import ForestEngine
+
+    artifact = os.path.join(artifact_dir(app), fingerprint)
+    if os.path.isdir(artifact):
+        try:
+            engine = ForestEngine.load(artifact)
+            print(f"✅ Native engine mapped from {artifact}", file=sys.stderr)
+            return LazyPipeline(path), engine, fingerprint
+        except Exception as e:
+            print(f"⚠️  Could not map engine artifact {artifact}, rebuilding: {e}", file=sys.stderr)
+
+    pipeline = load(path)
+    print(f"✅ Pipeline loaded successfully from {path}", file=sys.stderr)
+    engine = build_engine(app, pipeline)
+    if engine is not None:
+        try:
+            os.makedirs(artifact_dir(app), exist_ok=True)
+            engine.save(artifact)
+            engine = ForestEngine.load(artifact)
+        except OSError as e:
+            print(f"⚠️  Could not write engine artifact {artifact}: {e}", file=sys.stderr)
+
+    return pipeline, engine, fingerprint
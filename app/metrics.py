@@ -0,0 +1,241 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Seconds; covers a cached prediction (~100us) up to a slow export
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Endpoint of the request being handled, for stage timings
+_endpoint = ContextVar('metrics_endpoint', default='')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            snapshot = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = _labels(self.labelnames, labels, f'le="{_number(bound)}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            plain = _labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{plain} {_number(total)}')
+            lines.append(f'{self.name}_count{plain} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(values.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}')
+        return lines
+
+
+class Gauges:
+    """Gauges read at scrape time from `collect()`, which yields
+    (name, help, labelnames, [(labels, value), ...]) tuples."""
+
+    def __init__(self, collect):
+        self.collect = collect
+
+    def render(self):
+        lines = []
+        for name, help, labelnames, samples in self.collect():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in samples:
+                lines.append(f'{name}{_labels(labelnames, labels)} {_number(value)}')
+        return lines
+
+
+# Process-wide, since the engine's pool is
+POOL_CHECKOUT_SECONDS = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled DB connection.'
+)
+
+
+class _TimedCheckout:
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    """QueuePool that records how long each checkout waited."""
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    """The same for asyncio engines (aio.py)."""
+
+
+def timed_pool_options(database_uri, options):
+    """Engine options using TimedQueuePool wherever SQLAlchemy would pick a QueuePool."""
+    url = make_url(database_uri)
+    if 'poolclass' in options or 'pool' in options:
+        return options
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+    return dict(options, poolclass=TimedQueuePool)
+
+
+class _Stage:
+    __slots__ = ('histogram', 'name', 'started')
+
+    def __init__(self, histogram, name):
+        self.histogram = histogram
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, _endpoint.get(), self.name)
+
+
+class Metrics:
+    """In-process metrics rendered in the Prometheus text format.
+
+    Recording is a bisect and an increment under a lock, so it stays in
+    the low microseconds per observation. Every gunicorn worker keeps its
+    own series; a scrape of /metrics answers for the worker that served
+    it. A disabled instance hands out no-op stage timers.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.request_seconds = Histogram(
+            'http_request_duration_seconds', 'Request latency by route.', ('route', 'method')
+        )
+        self.requests = Counter(
+            'http_requests_total', 'Requests by route and status.', ('route', 'method', 'status')
+        )
+        self.stage_seconds = Histogram(
+            'app_stage_duration_seconds',
+            'Time spent in each stage of a request (jwt_decode, user_lookup, validation, '
+            'inference, db_commit).',
+            ('endpoint', 'stage')
+        )
+        self._collectors = [self.request_seconds, self.requests, self.stage_seconds,
+                            POOL_CHECKOUT_SECONDS]
+
+    def add_gauges(self, collect):
+        self._collectors.append(Gauges(collect))
+
+    def stage(self, name):
+        """Context manager timing one stage of the current request."""
+        if not self.enabled:
+            return nullcontext()
+        return _Stage(self.stage_seconds, name)
+
+    def start_request(self, endpoint):
+        _endpoint.set(endpoint or '')
+        return time.perf_counter()
+
+    def finish_request(self, started, route, method, status):
+        self.request_seconds.observe(time.perf_counter() - started, route, method)
+        self.requests.inc(route, method, str(status))
+
+    def render(self):
+        lines = []
+        for collector in self._collectors:
+            lines.extend(collector.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _metric_name(*parts):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', '_'.join(parts)).strip('_')
+
+
+def component_gauges(status):
+    """Flatten the numeric leaves of /health component stats into gauges."""
+    def walk(prefix, value):
+        if isinstance(value, bool):
+            yield prefix, int(value)
+        elif isinstance(value, (int, float)):
+            yield prefix, value
+        elif isinstance(value, dict):
+            for key, child in value.items():
+                yield from walk(prefix + (str(key),), child)
+
+    for name, value in sorted(walk(('app',), status)):
+        yield _metric_name(*name), 'Component stat (see /health).', (), [((), value)]
+
+
+def pool_gauges(engine, prefix='db_pool'):
+    pool = engine.pool
+    for stat, help in (('checkedout', 'Connections currently checked out.'),
+                       ('checkedin', 'Idle connections in the pool.'),
+                       ('size', 'Configured pool size.'),
+                       ('overflow', 'Connections opened beyond the pool size.')):
+        method = getattr(pool, stat, None)
+        if method is not None:
+            yield f'{prefix}_{stat}', help, (), [((), method())]
+
+
+def model_gauges(registry):
+    current = registry.current
+    if current is not None:
+        yield ('model_load_seconds', 'Time taken to load the active model.', ('version',),
+               [((current.version,), current.load_seconds)])
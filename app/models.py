@@ -1,5 +1,9 @@
 from . import db
 from datetime import datetime, timezone
+import math
+from functools import lru_cache
+from operator import attrgetter
+from sqlalchemy import event
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class User(db.Model):
@@ -13,6 +17,9 @@ class User(db.Model):
     gender = db.Column(db.String(10), nullable=True)
     password_hash = db.Column(db.Text(), nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    # Bumped on every update of the row; with PredictionSummary.version it
+    # versions the user's API responses (ETags)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationship
     predictions = db.relationship('Prediction', backref='user', lazy='dynamic')
@@ -26,14 +33,211 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+@event.listens_for(User, 'before_update')
+def _bump_user_version(mapper, connection, target):
+    # before_update also fires for rows without net changes; skip those
+    if db.object_session(target).is_modified(target, include_collections=False):
+        target.version = (target.version or 0) + 1
+
+# Request feature names (predict.REQUIRED_COLS order) and the Prediction
+# columns that store them
+FEATURE_COLUMNS = (
+    ('age', 'age'),
+    ('sex', 'sex'),
+    ('chest pain type', 'chest_pain_type'),
+    ('resting bp s', 'resting_bp_s'),
+    ('cholesterol', 'cholesterol'),
+    ('fasting blood sugar', 'fasting_blood_sugar'),
+    ('resting ecg', 'resting_ecg'),
+    ('max heart rate', 'max_heart_rate'),
+    ('exercise angina', 'exercise_angina'),
+    ('oldpeak', 'oldpeak'),
+    ('ST slope', 'st_slope'),
+)
+_FEATURE_NAMES = frozenset(name for name, _ in FEATURE_COLUMNS)
+
 class Prediction(db.Model):
     __tablename__ = 'prediction'  # Explicit table name
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=True, index=True)
-    input_json = db.Column(db.JSON, nullable=False)
-    output_json = db.Column(db.JSON, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=True)
+    
+    # Inputs and outputs are stored in typed columns when that is lossless
+    # (see compact_values); anything else keeps its JSON in the blob columns.
+    # Read them through input_json / output_json, which handle both forms.
+    input_blob = db.Column('input_json', db.JSON(none_as_null=True), nullable=True)
+    output_blob = db.Column('output_json', db.JSON(none_as_null=True), nullable=True)
+    
+    age = db.Column(db.Float, nullable=True)
+    sex = db.Column(db.Float, nullable=True)
+    chest_pain_type = db.Column(db.Float, nullable=True)
+    resting_bp_s = db.Column(db.Float, nullable=True)
+    cholesterol = db.Column(db.Float, nullable=True)
+    fasting_blood_sugar = db.Column(db.Float, nullable=True)
+    resting_ecg = db.Column(db.Float, nullable=True)
+    max_heart_rate = db.Column(db.Float, nullable=True)
+    exercise_angina = db.Column(db.Float, nullable=True)
+    oldpeak = db.Column(db.Float, nullable=True)
+    st_slope = db.Column(db.Float, nullable=True)
+    # Bit i set: feature i was sent as a JSON integer
+    input_ints = db.Column(db.SmallInteger, nullable=True)
+    
+    label = db.Column(db.SmallInteger, nullable=True)
+    probability_0 = db.Column(db.Float, nullable=True)
+    probability_1 = db.Column(db.Float, nullable=True)
+    
+    # Content hash of the model file that produced this prediction
+    model_version = db.Column(db.String(16), nullable=True)
+    # Per-feature contributions, when the prediction was made in explain
+    # mode (predict.explain_row)
+    explanation = db.Column(db.JSON(none_as_null=True), nullable=True)
+    # On Postgres the table is partitioned by month of created_at and its
+    # primary key is (id, created_at) (see app/partitions.py); ids still
+    # come from one sequence, so the ORM keeps using id alone
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     
+    @property
+    def input_json(self):
+        return prediction_input(self)
+    
+    @property
+    def output_json(self):
+        return prediction_output(self)
+    
+    def __repr__(self):
+        return f'<Prediction {self.id} by User {self.user_id}>'
+
+# Serves keyset pagination of a user's history, newest first; its leading
+# user_id column also covers plain user_id lookups
+db.Index('ix_prediction_user_created_id', Prediction.user_id, Prediction.created_at.desc(), Prediction.id)
+
+# Everything prediction_input / prediction_output read, for plain-column selects
+PREDICTION_STORAGE = (
+    Prediction.input_blob, Prediction.output_blob, Prediction.input_ints,
+    *(getattr(Prediction, column) for _, column in FEATURE_COLUMNS),
+    Prediction.label, Prediction.probability_0, Prediction.probability_1
+)
+
+def _exact_number(value):
+    # True if a float column gives `value` back unchanged: ints a double
+    # holds exactly and finite floats (SQLite would turn -0.0 into 0.0)
+    if type(value) is int:
+        return -2 ** 53 <= value <= 2 ** 53
+    if type(value) is float:
+        return math.isfinite(value) and (value != 0 or math.copysign(1, value) > 0)
+    return False
+
+def _typed_input(inputs):
+    # Key order isn't kept: inputs read back in FEATURE_COLUMNS order
+    if not isinstance(inputs, dict) or inputs.keys() != _FEATURE_NAMES:
+        return None
+    values = {'input_ints': 0}
+    for i, (name, column) in enumerate(FEATURE_COLUMNS):
+        value = inputs[name]
+        if not _exact_number(value):
+            return None
+        values[column] = value
+        if type(value) is int:
+            values['input_ints'] |= 1 << i
+    return values
+
+def _typed_output(output):
+    # The shape predict_row / batch_results produce for a binary model
+    if not isinstance(output, dict) or list(output) != ['prediction', 'probability']:
+        return None
+    labels, probability = output['prediction'], output['probability']
+    if not (isinstance(labels, list) and len(labels) == 1 and type(labels[0]) is int
+            and -32768 <= labels[0] <= 32767):
+        return None
+    if not (isinstance(probability, list) and len(probability) == 1
+            and isinstance(probability[0], list) and len(probability[0]) == 2
+            and all(type(p) is float and _exact_number(p) for p in probability[0])):
+        return None
+    return {'label': labels[0], 'probability_0': probability[0][0],
+            'probability_1': probability[0][1]}
+
+_FEATURE_ORDER = tuple(name for name, _ in FEATURE_COLUMNS)
+_feature_values = attrgetter(*(column for _, column in FEATURE_COLUMNS))
+
+@lru_cache(maxsize=None)
+def _int_positions(ints):
+    # At most 2 ** 11 distinct masks
+    return tuple(i for i in range(len(FEATURE_COLUMNS)) if ints >> i & 1)
+
+_EMPTY_INPUT = dict({column: None for _, column in FEATURE_COLUMNS}, input_ints=None)
+_EMPTY_OUTPUT = {'label': None, 'probability_0': None, 'probability_1': None}
+
+def compact_values(record):
+    """Prediction column values for a record with input_json / output_json.
+
+    Every storage column is present in the result, so a list of them can
+    go to one executemany.
+    """
+    values = {key: value for key, value in record.items()
+              if key not in ('input_json', 'output_json')}
+    inputs, output = record.get('input_json'), record.get('output_json')
+    
+    typed = _typed_input(inputs)
+    values.update(typed or _EMPTY_INPUT)
+    values['input_blob'] = None if typed else inputs
+    
+    typed = _typed_output(output)
+    values.update(typed or _EMPTY_OUTPUT)
+    values['output_blob'] = None if typed else output
+    return values
+
+def prediction_input(pred):
+    """Input dict of a Prediction or a row selecting PREDICTION_STORAGE."""
+    if pred.input_blob is not None:
+        return pred.input_blob
+    if pred.input_ints is None:
+        return None
+    values = list(_feature_values(pred))
+    for i in _int_positions(pred.input_ints):
+        values[i] = int(values[i])
+    return dict(zip(_FEATURE_ORDER, values))
+
+def prediction_output(pred):
+    if pred.output_blob is not None:
+        return pred.output_blob
+    if pred.label is None:
+        return None
+    return {'prediction': [pred.label], 'probability': [[pred.probability_0, pred.probability_1]]}
+
+class PredictionSummary(db.Model):
+    __tablename__ = 'prediction_summary'
+    
+    # One row per user, maintained in the same transaction as every
+    # Prediction insert (see app/persistence.py) so the dashboard is a
+    # primary-key lookup no matter how long the history is
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    positive_count = db.Column(db.Integer, nullable=False, default=0)
+    negative_count = db.Column(db.Integer, nullable=False, default=0)
+    # Plain id rather than a foreign key, so summary upserts never take
+    # locks on prediction rows
+    latest_prediction_id = db.Column(db.Integer, nullable=True)
+    last_seen_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    # Bumped by every write that changes the user's predictions
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    def __repr__(self):
+        return f'<PredictionSummary user {self.user_id}: {self.total_count}>'
+
+class PredictionDaily(db.Model):
+    __tablename__ = 'prediction_daily'
+    
+    # Per-user daily aggregates of predictions removed by the retention job
+    # (`flask retain-predictions`). user_id is a plain column (0 for
+    # predictions without a user) so rollups outlive the rows and users
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    positive_count = db.Column(db.Integer, nullable=False, default=0)
+    negative_count = db.Column(db.Integer, nullable=False, default=0)
+    # Sum and count of the positive-class probability, for averages
+    probability_sum = db.Column(db.Float, nullable=False, default=0)
+    probability_count = db.Column(db.Integer, nullable=False, default=0)
+    
     def __repr__(self):
-        return f'<Prediction {self.id} by User {self.user_id}>'
\ No newline at end of file
+        return f'<PredictionDaily {self.day} user {self.user_id}: {self.total_count}>'
@@ -0,0 +1,295 @@
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timezone
+
+from . import db
+from .models import Prediction
+
+logger = logging.getLogger(__name__)
+
+# On Postgres `prediction` is range-partitioned by created_at into one
+# table per UTC month, named prediction_pYYYY_MM (migration e4b7c2a9f015).
+# Other databases keep a plain table; retention deletes rows there instead
+# of detaching partitions.
+PARTITION_NAME = re.compile(r'^prediction_p(\d{4})_(\d{2})$')
+
+# pg_advisory_xact_lock key serializing partition DDL across workers
+_LOCK_KEY = 0x70726564
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'prediction_p{month.year:04d}_{month.month:02d}'
+
+
+def _bound(month):
+    return f"'{month:%Y-%m-%d} 00:00:00+00'"
+
+
+def is_partitioned(session):
+    if session.get_bind().dialect.name != 'postgresql':
+        return False
+    return bool(session.scalar(db.text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('prediction')"
+    )))
+
+
+def partition_months(session):
+    """Months that currently have an attached partition, oldest first."""
+    names = session.scalars(db.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'prediction'::regclass"
+    ))
+    months = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def ensure_partitions(months_ahead=3, start=None):
+    """Create the monthly partitions from `start` (default: this month)
+    through `months_ahead` months from now; returns the names created.
+
+    A no-op unless `prediction` is a partitioned Postgres table.
+    """
+    session = db.session
+    if not is_partitioned(session):
+        return []
+
+    today = datetime.now(timezone.utc).date()
+    month = month_start(start or today)
+    last = add_months(month_start(today), months_ahead)
+    created = []
+    try:
+        session.execute(db.text('SELECT pg_advisory_xact_lock(:key)'), {'key': _LOCK_KEY})
+        existing = set(partition_months(session))
+        while month <= last:
+            if month not in existing:
+                following = add_months(month, 1)
+                session.execute(db.text(
+                    f'CREATE TABLE {partition_name(month)} PARTITION OF prediction '
+                    f'FOR VALUES FROM ({_bound(month)}) TO ({_bound(following)})'
+                ))
+                created.append(partition_name(month))
+            month = add_months(month, 1)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return created
+
+
+# ===== RETENTION =====
+
+_ROLLUP = {
+    'postgresql': dict(
+        day="(created_at AT TIME ZONE 'UTC')::date",
+        label="COALESCE(label::text, output_json->'prediction'->>0)",
+        positive="'1'", negative="'0'",
+        probability="COALESCE(probability_1, (output_json->'probability'->0->>1)::float8)",
+    ),
+    'sqlite': dict(
+        day='date(created_at)',
+        label="COALESCE(label, json_extract(output_json, '$.prediction[0]'))",
+        positive='1', negative='0',
+        probability="COALESCE(probability_1, json_extract(output_json, '$.probability[0][1]'))",
+    ),
+}
+
+
+def retire_month(session, month, partitioned, drop=True):
+    """Roll one month of predictions into prediction_daily and remove it.
+
+    Runs in a single transaction: the daily rollups, the per-user summary
+    counts and the removal (DETACH/DROP of the month's partition, or a
+    range DELETE) commit together. Returns the number of rows retired.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect not in _ROLLUP:
+        raise RuntimeError(f'retention is not supported on {dialect}')
+    sql = _ROLLUP[dialect]
+
+    following = add_months(month, 1)
+    if partitioned:
+        source, params = partition_name(month), {}
+    else:
+        source = 'prediction WHERE created_at >= :start AND created_at < :end'
+        params = {'start': _stored(session, month), 'end': _stored(session, following)}
+    where = 'WHERE' if partitioned else 'AND'
+
+    try:
+        if partitioned:
+            session.execute(db.text('SELECT pg_advisory_xact_lock(:key)'), {'key': _LOCK_KEY})
+
+        session.execute(db.text(f"""
+            INSERT INTO prediction_daily
+                (day, user_id, total_count, positive_count, negative_count,
+                 probability_sum, probability_count)
+            SELECT {sql['day']}, COALESCE(user_id, 0), COUNT(*),
+                   SUM(CASE WHEN {sql['label']} = {sql['positive']} THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN {sql['label']} = {sql['negative']} THEN 1 ELSE 0 END),
+                   COALESCE(SUM({sql['probability']}), 0),
+                   COUNT({sql['probability']})
+              FROM {source} {where} created_at IS NOT NULL
+             GROUP BY 1, 2
+            ON CONFLICT (day, user_id) DO UPDATE SET
+                total_count = prediction_daily.total_count + excluded.total_count,
+                positive_count = prediction_daily.positive_count + excluded.positive_count,
+                negative_count = prediction_daily.negative_count + excluded.negative_count,
+                probability_sum = prediction_daily.probability_sum + excluded.probability_sum,
+                probability_count = prediction_daily.probability_count + excluded.probability_count
+        """), params)
+
+        # prediction_summary counts what is still in `prediction`, so the
+        # history's total_items keeps matching the pages it can serve
+        counts = session.execute(db.text(f"""
+            SELECT user_id, COUNT(*),
+                   SUM(CASE WHEN {sql['label']} = {sql['positive']} THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN {sql['label']} = {sql['negative']} THEN 1 ELSE 0 END)
+              FROM {source} {where} user_id IS NOT NULL
+             GROUP BY user_id
+             ORDER BY user_id
+        """), params).all()
+        if counts:
+            session.execute(db.text("""
+                UPDATE prediction_summary
+                   SET total_count = total_count - :total,
+                       positive_count = positive_count - :positive,
+                       negative_count = negative_count - :negative,
+                       version = version + 1
+                 WHERE user_id = :user_id
+            """), [{'user_id': user_id, 'total': total, 'positive': positive or 0,
+                    'negative': negative or 0} for user_id, total, positive, negative in counts])
+            session.execute(db.text("""
+                UPDATE prediction_summary
+                   SET latest_prediction_id = NULL, last_seen_at = NULL
+                 WHERE last_seen_at < :end
+            """), {'end': _stored(session, following)})
+
+        if partitioned:
+            retired = session.scalar(db.text(f'SELECT COUNT(*) FROM {source}'))
+            session.execute(db.text(f'ALTER TABLE prediction DETACH PARTITION {source}'))
+            if drop:
+                session.execute(db.text(f'DROP TABLE {source}'))
+        else:
+            retired = session.execute(db.text(f'DELETE FROM {source}'), params).rowcount
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return retired
+
+
+def _stored(session, month):
+    # A UTC midnight bound in the form the driver compares created_at with
+    value = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    if session.get_bind().dialect.name == 'sqlite':
+        # SQLite stores DateTime as naive ISO text
+        return value.replace(tzinfo=None).strftime('%Y-%m-%d %H:%M:%S.%f')
+    return value
+
+
+def months_to_retire(session, keep_months, partitioned):
+    """Months entirely older than the last `keep_months` months (counting
+    the current one), oldest first."""
+    cutoff = add_months(month_start(datetime.now(timezone.utc).date()), -(keep_months - 1))
+    if partitioned:
+        return [month for month in partition_months(session) if month < cutoff]
+
+    oldest = session.scalar(db.select(db.func.min(Prediction.created_at)))
+    if oldest is None:
+        return []
+    months, month = [], month_start(oldest)
+    while month < cutoff:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def apply_retention(keep_months, drop=True, on_month=None):
+    """Retire every month older than `keep_months`; returns a report."""
+    if keep_months < 1:
+        raise ValueError('keep_months must be at least 1')
+    session = db.session
+    partitioned = is_partitioned(session)
+    report = {'partitioned': partitioned, 'months': [], 'rows': 0}
+    for month in months_to_retire(session, keep_months, partitioned):
+        rows = retire_month(session, month, partitioned, drop=drop)
+        report['months'].append(f'{month:%Y-%m}')
+        report['rows'] += rows
+        if on_month is not None:
+            on_month(month, rows)
+    return report
+
+
+class PartitionMaintainer:
+    """Background thread keeping future monthly partitions created.
+
+    Every `interval` seconds it makes sure partitions exist through
+    `months_ahead` months from now; concurrent workers serialize on an
+    advisory lock. Started lazily per process, like the model watcher,
+    and only when `prediction` is actually partitioned.
+    """
+
+    def __init__(self, app, months_ahead=3, interval=3600):
+        self.app = app
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self.last_run = None
+        self.last_error = None
+        self.created = []
+
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._enabled = None
+
+    def ensure_running(self):
+        if self.interval <= 0 or self._enabled is False:
+            return
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='partition-maintainer', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    if self._enabled is None:
+                        self._enabled = is_partitioned(db.session)
+                        if not self._enabled:
+                            return
+                    self.created.extend(ensure_partitions(self.months_ahead))
+                    self.last_run = datetime.now(timezone.utc).isoformat()
+                    self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception('partition maintenance failed')
+            time.sleep(self.interval)
+
+    def stats(self):
+        return {
+            'partitioned': self._enabled,
+            'months_ahead': self.months_ahead,
+            'last_run': self.last_run,
+            'created': list(self.created[-12:]),
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,367 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app
+
+from . import db
+from .models import Prediction, PredictionSummary, compact_values
+
+logger = logging.getLogger(__name__)
+
+
+def save_predictions(records):
+    """Persist prediction records (dicts of Prediction column values).
+
+    In the default 'sync' mode the rows are inserted and committed on the
+    calling thread. In 'async' mode they are handed to the app's
+    PredictionWriter and the call returns without waiting for the DB.
+    Errors are logged, never raised, so a failed write does not fail the
+    prediction response.
+    """
+    now = datetime.now(timezone.utc)
+    for record in records:
+        record.setdefault('created_at', now)
+
+    writer = getattr(current_app, 'prediction_writer', None)
+    if writer is not None:
+        writer.submit(records)
+        return
+
+    try:
+        insert_predictions(records)
+    except Exception as e:
+        current_app.logger.error("failed to save %d prediction(s): %s", len(records), e)
+
+
+def insert_predictions(records):
+    """Insert and commit records in one statement; rolls back and re-raises."""
+    try:
+        write_predictions(db.session, records)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def write_predictions(session, records):
+    """Insert records through `session` without committing.
+
+    The per-user PredictionSummary rows are upserted in the same
+    transaction, so the summary never disagrees with the history. Takes
+    the session explicitly so the async app can run it via
+    `AsyncSession.run_sync`.
+    """
+    values = [compact_values(record) for record in records]
+    for row in values:
+        # Only explain-mode records carry one; executemany needs every key
+        row.setdefault('explanation', None)
+    inserted = session.execute(
+        db.insert(Prediction).returning(
+            Prediction.id, Prediction.user_id, Prediction.created_at
+        ),
+        values
+    ).all()
+    _update_summaries(session, records, inserted)
+
+
+def compact_predictions(batch_size=1000, on_batch=None):
+    """Move predictions still stored as JSON into the typed columns.
+
+    Walks the table in primary-key order, `batch_size` rows per
+    transaction, so it can run next to live traffic and be stopped and
+    restarted at any point. Rows whose JSON can't be stored losslessly
+    keep it. Returns (scanned, compacted).
+    """
+    scanned = compacted = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(Prediction.id, Prediction.input_blob, Prediction.output_blob)
+            .where(Prediction.id > last_id,
+                   db.or_(Prediction.input_blob.is_not(None), Prediction.output_blob.is_not(None)))
+            .order_by(Prediction.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        updates = []
+        for pred_id, inputs, output in rows:
+            values = compact_values({'input_json': inputs, 'output_json': output})
+            # Rows that must keep a blob show up on every run; only rewrite
+            # them when a side actually moves to the typed columns
+            if (inputs is not None and values['input_blob'] is None
+                    or output is not None and values['output_blob'] is None):
+                updates.append(dict(values, id=pred_id))
+        if updates:
+            try:
+                db.session.execute(db.update(Prediction), updates)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+        scanned += len(rows)
+        compacted += len(updates)
+        last_id = rows[-1].id
+        if on_batch is not None:
+            on_batch(scanned, compacted)
+    return scanned, compacted
+
+
+def _prediction_label(output):
+    try:
+        return output['prediction'][0]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def _update_summaries(session, records, inserted):
+    summaries = {}
+    for record in records:
+        user_id = record.get('user_id')
+        if user_id is None:
+            continue
+        summary = summaries.setdefault(user_id, {
+            'user_id': user_id,
+            'total_count': 0,
+            'positive_count': 0,
+            'negative_count': 0,
+            'latest_prediction_id': None,
+            'last_seen_at': None,
+            'version': 1
+        })
+        label = _prediction_label(record.get('output_json'))
+        summary['total_count'] += 1
+        summary['positive_count'] += label == 1
+        summary['negative_count'] += label == 0
+
+    for pred_id, user_id, created_at in inserted:
+        summary = summaries.get(user_id)
+        if summary is None:
+            continue
+        latest = (summary['last_seen_at'], summary['latest_prediction_id'])
+        if summary['last_seen_at'] is None or (created_at, pred_id) > latest:
+            summary['last_seen_at'] = created_at
+            summary['latest_prediction_id'] = pred_id
+
+    if not summaries:
+        return
+
+    # Upsert in user order so concurrent multi-user batches lock rows in
+    # the same order and can't deadlock
+    values = [summaries[user_id] for user_id in sorted(summaries)]
+
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        _update_summaries_portable(session, values)
+        return
+
+    table = PredictionSummary.__table__
+    stmt = insert(table).values(values)
+    excluded = stmt.excluded
+    is_newer = db.or_(
+        table.c.last_seen_at.is_(None),
+        excluded.last_seen_at >= table.c.last_seen_at
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={
+            'total_count': table.c.total_count + excluded.total_count,
+            'positive_count': table.c.positive_count + excluded.positive_count,
+            'negative_count': table.c.negative_count + excluded.negative_count,
+            'version': table.c.version + 1,
+            'latest_prediction_id': db.case(
+                (is_newer, excluded.latest_prediction_id),
+                else_=table.c.latest_prediction_id
+            ),
+            'last_seen_at': db.case(
+                (is_newer, excluded.last_seen_at),
+                else_=table.c.last_seen_at
+            )
+        }
+    )
+    session.execute(stmt)
+
+
+def _update_summaries_portable(session, values):
+    # Fallback for databases without INSERT ... ON CONFLICT
+    for value in values:
+        summary = session.get(PredictionSummary, value['user_id'], with_for_update=True)
+        if summary is None:
+            session.add(PredictionSummary(**value))
+            continue
+        summary.total_count += value['total_count']
+        summary.positive_count += value['positive_count']
+        summary.negative_count += value['negative_count']
+        summary.version += 1
+        if summary.last_seen_at is None or value['last_seen_at'] >= summary.last_seen_at:
+            summary.latest_prediction_id = value['latest_prediction_id']
+            summary.last_seen_at = value['last_seen_at']
+    session.flush()
+
+
+class PredictionWriter:
+    """Write-behind queue that bulk-inserts Prediction records.
+
+    Requests put records on a bounded in-process queue and return; a
+    background thread drains it and inserts a batch whenever `batch_size`
+    records are waiting or `flush_interval` seconds have passed since the
+    first one arrived.
+
+    When the queue is full the producer blocks for up to `put_timeout`
+    seconds and then writes its records synchronously, so memory stays
+    bounded and nothing is dropped under sustained overload. A failed
+    batch is retried row by row; rows that still fail are logged in full.
+    The queue is drained at interpreter exit (gunicorn worker shutdown).
+
+    The flusher thread is started lazily in the process that first submits,
+    which keeps the writer safe to create before gunicorn forks workers.
+    """
+
+    def __init__(self, app, max_queue=10000, batch_size=500, flush_interval=0.5,
+                 put_timeout=0.05):
+        self.app = app
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+
+        self.submitted = 0
+        self.flushed = 0
+        self.batches = 0
+        self.sync_fallbacks = 0
+        self.retried_rows = 0
+        self.dropped = 0
+        self.last_error = None
+
+        atexit.register(self.close)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Fresh queue after a fork; the parent's one is not ours
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='prediction-writer', daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, records):
+        self._ensure_started()
+        for i, record in enumerate(records):
+            try:
+                self._queue.put(record, timeout=self.put_timeout)
+            except queue.Full:
+                # Backpressure: the flusher can't keep up, write inline
+                self.sync_fallbacks += 1
+                self._write(list(records[i:]))
+                return
+            self.submitted += 1
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._collect()
+            if batch:
+                with self.app.app_context():
+                    self._write(batch)
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            insert_predictions(batch)
+            self.flushed += len(batch)
+            self.batches += 1
+            return
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error("prediction batch insert of %d rows failed, retrying row by row: %s",
+                         len(batch), e)
+
+        for record in batch:
+            try:
+                insert_predictions([record])
+                self.flushed += 1
+                self.retried_rows += 1
+            except Exception as e:
+                self.dropped += 1
+                self.last_error = str(e)
+                logger.error("dropped prediction record %r: %s", record, e)
+
+    def flush(self):
+        """Write everything currently queued on the calling thread."""
+        if self._queue is None or self._pid != os.getpid():
+            return
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write_in_context(batch)
+                batch = []
+        if batch:
+            self._write_in_context(batch)
+
+    def _write_in_context(self, batch):
+        with self.app.app_context():
+            self._write(batch)
+
+    def close(self, timeout=5.0):
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        return {
+            'mode': 'async',
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'max_queue': self.max_queue,
+            'submitted': self.submitted,
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'sync_fallbacks': self.sync_fallbacks,
+            'retried_rows': self.retried_rows,
+            'dropped': self.dropped,
+            'last_error': self.last_error,
+        }
@@ -1,11 +1,11 @@
 from flask import Blueprint, request, jsonify, current_app
-from . import db
-from .models import Prediction, User
-import jwt
-from functools import wraps
-import numpy as np
-import pandas as pd
+from .admission import admitted
+from .executor import PoolSaturated, PoolTimeout
+from .persistence import save_predictions
+from .registry import ExplanationUnavailable
+from .security import token_required
 import datetime
+import math
 
 bp = Blueprint('predict', __name__)
 
@@ -15,124 +15,303 @@ REQUIRED_COLS = [
     "exercise angina","oldpeak","ST slope"
 ]
 
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
-        
-        # Ambil token dari header
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if auth_header.startswith('Bearer '):
-                token = auth_header.replace('Bearer ', '')
-            else:
-                token = auth_header
-        
-        # Debug: log token status
-        if not token:
-            current_app.logger.warning("No token provided in request")
-            return jsonify({'msg':'token missing'}), 401
-        
-        try:
-            # Decode token dengan timezone-aware datetime
-            data = jwt.decode(
-                token, 
-                current_app.config['JWT_SECRET'], 
-                algorithms=['HS256'],
-                options={"verify_exp": True} 
-            )
-            
-            # Cek apakah 'sub' ada dalam payload
-            if 'sub' not in data:
-                current_app.logger.error("Token missing 'sub' claim")
-                return jsonify({'msg':'invalid token structure'}), 401
-            
-            user_id = int(data['sub'])
-            
-            user = User.query.get(user_id)
-            if user is None:
-                current_app.logger.error(f"User with id {data['sub']} not found")
-                return jsonify({'msg':'user not found'}), 401
-            
-            current_app.logger.info(f"User {user.username} authenticated successfully")
-            
-        except jwt.ExpiredSignatureError:
-            current_app.logger.warning("Token has expired")
-            return jsonify({'msg':'token expired'}), 401
-        except jwt.InvalidTokenError as e:
-            current_app.logger.error(f"Invalid token: {str(e)}")
-            return jsonify({'msg':'token invalid', 'err': str(e)}), 401
-        except Exception as e:
-            current_app.logger.error(f"Token verification failed: {str(e)}")
-            return jsonify({'msg':'token verification failed', 'err': str(e)}), 401
-        
-        return f(user, *args, **kwargs)
-    
-    return decorated
+def _coerce_row(item, kind):
+    """Turn one `features` list or `row` dict into a row dict.
 
-@bp.route('/predict', methods=['POST'])
-@token_required
-def predict(user):
-    payload = request.get_json(silent=True)
+    Returns (row, error) where error is a dict with the same messages the
+    single-row endpoint answers with.
+    """
+    if kind == 'features':
+        if not isinstance(item, list):
+            return None, {'msg': 'features must be a list'}
+        if len(item) != len(REQUIRED_COLS):
+            return None, {'msg': f'features must have length {len(REQUIRED_COLS)}'}
+        row = dict(zip(REQUIRED_COLS, item))
+    else:
+        if not isinstance(item, dict):
+            return None, {'msg': 'row must be an object/dict'}
+        row = item
+
+    missing = [c for c in REQUIRED_COLS if c not in row]
+    if missing:
+        return None, {'msg': 'missing columns', 'missing': missing}
+
+    return row, None
+
+def feature_values(row):
+    """The row's features as floats, in REQUIRED_COLS order.
+
+    Raises ValueError for values float() accepts but the model cannot
+    score ("nan", "inf", 1e999) and for integers too large for a float.
+    """
+    try:
+        values = [float(row[c]) for c in REQUIRED_COLS]
+    except OverflowError as e:
+        raise ValueError(str(e)) from e
+    bad = [c for c, v in zip(REQUIRED_COLS, values) if not math.isfinite(v)]
+    if bad:
+        raise ValueError(f'non-finite values for {", ".join(bad)}')
+    return values
+
+def feature_matrix(values):
+    """float64 matrix of feature rows.
+
+    NumPy is imported here, not at module level, so workers serving only
+    auth and /user routes never load it (see app/warmup.py).
+    """
+    import numpy as np
+    return np.asarray(values, dtype=np.float64)
+
+def score_rows(app, model, X):
+    """Score X with the pinned model, through the inference pool if enabled."""
+    pool = app.inference_pool
+    if pool is not None:
+        return pool.score(model, X)
+    return model.score(X)
+
+def model_unavailable(app):
+    """(body, status, headers) for a request that found no model to pin."""
+    if not app.warmup.done:
+        return {'msg': 'model is warming up, retry shortly'}, 503, {'Retry-After': '1'}
+    return {'msg': 'pipeline not loaded on server'}, 500, {}
+
+def _overloaded(e):
+    response = jsonify({'msg': 'prediction capacity exhausted, retry later', 'err': str(e)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def parse_row(payload):
+    """Validate a /predict payload; returns (row, X, error, status)."""
     if not payload:
-        return jsonify({'msg': 'invalid json'}), 400
+        return None, None, {'msg': 'invalid json'}, 400
 
     if 'features' in payload:
-        features = payload['features']
-        if not isinstance(features, list):
-            return jsonify({'msg': 'features must be a list'}), 400
-        if len(features) != len(REQUIRED_COLS):
-            return jsonify({'msg': f'features must have length {len(REQUIRED_COLS)}'}), 400
-        row = dict(zip(REQUIRED_COLS, features))
-
+        row, error = _coerce_row(payload['features'], 'features')
     elif 'row' in payload:
-        row = payload['row']
-        if not isinstance(row, dict):
-            return jsonify({'msg': 'row must be an object/dict'}), 400
+        row, error = _coerce_row(payload['row'], 'row')
     else:
-        return jsonify({'msg': 'provide features (list) or row (dict)'}), 400
+        return None, None, {'msg': 'provide features (list) or row (dict)'}, 400
 
-    missing = [c for c in REQUIRED_COLS if c not in row]
-    if missing:
-        return jsonify({'msg': 'missing columns', 'missing': missing}), 400
+    if error:
+        return None, None, error, 400
 
     try:
-        X = pd.DataFrame(
-            [[float(row[c]) for c in REQUIRED_COLS]],
-            columns=REQUIRED_COLS
-        )
+        X = feature_matrix([feature_values(row)])
     except Exception as e:
-        return jsonify({'msg': 'invalid feature values', 'err': str(e)}), 400
+        return None, None, {'msg': 'invalid feature values', 'err': str(e)}, 400
 
-    pipeline = getattr(current_app, "pipeline", None)
-    if pipeline is None:
-        return jsonify({'msg': 'pipeline not loaded on server'}), 500
+    return row, X, None, None
 
-    try:
-        pred = pipeline.predict(X)
+def predict_row(app, model, X):
+    """Output dict for a one-row X, from the prediction cache or the model.
+
+    Blocking (scoring, micro-batch wait, pool round trip); the async app
+    calls it from a worker thread.
+    """
+    # A cache hit skips the forest but the history row is still written
+    cache = app.prediction_cache if app.config['PREDICT_CACHE_ENABLED'] else None
+    output = cache.get(X[0], model.version) if cache is not None else None
+    if output is not None:
+        return output
+
+    batcher = app.micro_batcher
+    if batcher is not None:
+        pred, proba = batcher.submit(model, X[0])
+    else:
+        pred, proba = score_rows(app, model, X)
+
+    output = {
+        'prediction': pred.tolist(),
+        'probability': proba.tolist() if proba is not None else None
+    }
+
+    if cache is not None:
+        cache.set(X[0], output, model.version)
+    return output
+
+def wants_explanation(payload, args):
+    """True if a /predict request asks for explain mode, with
+    `?explain=true` or `"explain": true` in the body."""
+    flag = args.get('explain')
+    if flag is not None:
+        return flag.lower() in ('1', 'true', 'yes')
+    return isinstance(payload, dict) and payload.get('explain') is True
+
+def explain_row(app, model, X):
+    """Explanation dict for a one-row X, from the explanation cache or the model.
+
+    `class` is the predicted label, and `bias` plus the per-feature
+    `contributions` add up to its probability, so for a prediction of 0
+    they explain probability[0][0]. Raises ExplanationUnavailable without
+    the native engine.
+    """
+    cache = app.explanation_cache if app.config['PREDICT_CACHE_ENABLED'] else None
+    explanation = cache.get(X[0], model.version) if cache is not None else None
+    if explanation is not None:
+        return explanation
+
+    labels, bias, contributions = model.explain(X)
+    explanation = {
+        'class': labels[0].item(),
+        'bias': float(bias[0]),
+        'contributions': dict(zip(REQUIRED_COLS, contributions[0].tolist()))
+    }
 
-        prob = None
-        if hasattr(pipeline, "predict_proba"):
-            prob = pipeline.predict_proba(X).tolist()
+    if cache is not None:
+        cache.set(X[0], explanation, model.version)
+    return explanation
 
+def parse_batch(payload, max_rows):
+    """Validate a /predict/batch payload.
+
+    Returns (batch, error, status); batch is (total, rows, values,
+    indices, errors). Bad rows are reported in `errors`, not fatal.
+    """
+    if not payload:
+        return None, {'msg': 'invalid json'}, 400
+
+    if 'features' in payload:
+        items, kind = payload['features'], 'features'
+    elif 'rows' in payload:
+        items, kind = payload['rows'], 'row'
+    else:
+        return None, {'msg': 'provide features (list of lists) or rows (list of dicts)'}, 400
+
+    if not isinstance(items, list) or not items:
+        return None, {'msg': 'batch must be a non-empty list'}, 400
+
+    if len(items) > max_rows:
+        return None, {'msg': f'batch too large, max {max_rows} rows'}, 413
+
+    rows, values, indices, errors = [], [], [], []
+    for i, item in enumerate(items):
+        row, error = _coerce_row(item, kind)
+        if error is None:
+            try:
+                values.append(feature_values(row))
+            except (TypeError, ValueError) as e:
+                error = {'msg': 'invalid feature values', 'err': str(e)}
+        if error:
+            errors.append(dict(error, index=i))
+            continue
+        rows.append(row)
+        indices.append(i)
+
+    return (len(items), rows, values, indices, errors), None, None
+
+def batch_results(user_id, model, rows, indices, pred, proba):
+    """Per-row results and the Prediction records to save for them."""
+    prob = proba.tolist() if proba is not None else [None] * len(rows)
+    results, records = [], []
+    for i, row, label, p in zip(indices, rows, pred.tolist(), prob):
         output = {
-            'prediction': pred.tolist(),
-            'probability': prob
+            'prediction': [label],
+            'probability': [p] if p is not None else None
         }
+        results.append(dict(output, index=i))
+        records.append({
+            'user_id': user_id,
+            'input_json': row,
+            'output_json': output,
+            'model_version': model.version
+        })
+    return results, records
 
-    except Exception as e:
-        return jsonify({'msg': 'prediction failed', 'err': str(e)}), 500
+def batch_body(total, results, errors):
+    return {
+        'total': total,
+        'succeeded': len(results),
+        'failed': len(errors),
+        'results': results,
+        'errors': errors
+    }
+
+@bp.route('/predict', methods=['POST'])
+@token_required
+@admitted('predict')
+def predict(user):
+    metrics = current_app.metrics
+    payload = request.get_json(silent=True)
+    with metrics.stage('validation'):
+        row, X, error, status = parse_row(payload)
+    if error:
+        return jsonify(error), status
+
+    explain = wants_explanation(payload, request.args)
+    if explain and not current_app.config['PREDICT_EXPLAIN_ENABLED']:
+        return jsonify({'msg': 'explanations are disabled on this server'}), 400
+
+    # Pin one model version for the whole request; a hot swap only
+    # affects requests that start after it
+    model = current_app.model_registry.current
+    if model is None and current_app.warmup.wait(current_app.config['MODEL_WARMUP_WAIT']):
+        model = current_app.model_registry.current
+    if model is None:
+        body, status, headers = model_unavailable(current_app)
+        return jsonify(body), status, headers
 
     try:
-        rec = Prediction(
-            user_id=user.id,
-            input_json=row,
-            output_json=output
-        )
-        db.session.add(rec)
-        db.session.commit()
+        with metrics.stage('inference'):
+            output = predict_row(current_app, model, X)
+    except (PoolSaturated, PoolTimeout) as e:
+        return _overloaded(e)
     except Exception as e:
-        db.session.rollback()
-        current_app.logger.error("failed to save prediction: %s", e)
+        return jsonify({'msg': 'prediction failed', 'err': str(e)}), 500
+
+    record = {
+        'user_id': user.id,
+        'input_json': row,
+        'output_json': output,
+        'model_version': model.version
+    }
+    if explain:
+        try:
+            with metrics.stage('explanation'):
+                record['explanation'] = explain_row(current_app, model, X)
+        except ExplanationUnavailable as e:
+            return jsonify({'msg': str(e)}), 501
+        except Exception as e:
+            return jsonify({'msg': 'explanation failed', 'err': str(e)}), 500
+        output = dict(output, explanation=record['explanation'])
+
+    with metrics.stage('db_commit'):
+        save_predictions([record])
 
     return jsonify(output), 200
+
+
+@bp.route('/predict/batch', methods=['POST'])
+@token_required
+@admitted('predict')
+def predict_batch(user):
+    metrics = current_app.metrics
+    with metrics.stage('validation'):
+        batch, error, status = parse_batch(request.get_json(silent=True),
+                                           current_app.config['PREDICT_BATCH_MAX_ROWS'])
+    if error:
+        return jsonify(error), status
+    total, rows, values, indices, errors = batch
+
+    model = current_app.model_registry.current
+    if model is None and current_app.warmup.wait(current_app.config['MODEL_WARMUP_WAIT']):
+        model = current_app.model_registry.current
+    if model is None:
+        body, status, headers = model_unavailable(current_app)
+        return jsonify(body), status, headers
+
+    results = []
+    if values:
+        try:
+            # One pass over the forest for the whole matrix
+            with metrics.stage('inference'):
+                pred, proba = score_rows(current_app, model, feature_matrix(values))
+        except (PoolSaturated, PoolTimeout) as e:
+            return _overloaded(e)
+        except Exception as e:
+            return jsonify({'msg': 'prediction failed', 'err': str(e)}), 500
+
+        results, records = batch_results(user.id, model, rows, indices, pred, proba)
+        with metrics.stage('db_commit'):
+            save_predictions(records)
+
+    return jsonify(batch_body(total, results, errors)), 200
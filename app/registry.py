@@ -0,0 +1,284 @@
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from .loader import load_model
+from .utils import file_fingerprint, file_stat
+
+logger = logging.getLogger(__name__)
+
+
+class ExplanationUnavailable(Exception):
+    """The loaded model can't decompose its predictions."""
+
+
+class ModelVersion:
+    """One loaded model, identified by the content hash of its file."""
+
+    __slots__ = ('version', 'path', 'pipeline', 'engine', 'loaded_at', 'load_seconds')
+
+    def __init__(self, version, path, pipeline, engine, load_seconds):
+        self.version = version
+        self.path = path
+        self.pipeline = pipeline
+        self.engine = engine
+        self.loaded_at = datetime.now(timezone.utc)
+        self.load_seconds = load_seconds
+
+    def score(self, X):
+        """Score a float matrix of feature rows.
+
+        Returns (labels, probabilities); probabilities is None when the
+        model has no predict_proba. Each row goes through the forest once.
+        """
+        if self.engine is not None:
+            return self.engine.predict(X)
+
+        import numpy as np
+        import pandas as pd
+
+        pipeline = self.pipeline
+        columns = getattr(pipeline, 'feature_names_in_', None)
+        if columns is not None:
+            X = pd.DataFrame(X, columns=columns)
+        if hasattr(pipeline, 'predict_proba'):
+            # The label is the argmax of the probabilities, same as
+            # RandomForest.predict, so there is no need to walk the trees twice
+            proba = pipeline.predict_proba(X)
+            return pipeline.classes_[np.argmax(proba, axis=1)], proba
+
+        return pipeline.predict(X), None
+
+    def explain(self, X):
+        """Per-feature contributions to each row's predicted class.
+
+        Returns (labels, bias, contributions) shaped (n_rows,), (n_rows,)
+        and (n_rows, n_features): row i's bias and contributions add up to
+        the probability of labels[i], the label `score` gives it. Needs
+        the native engine.
+        """
+        if self.engine is None:
+            raise ExplanationUnavailable('explanations need the native forest engine')
+        import numpy as np
+
+        # The predicted class comes from the same probabilities `score`
+        # takes the argmax of, so an explanation never disagrees with
+        # the label served next to it, even on a near tie
+        labels, proba = self.engine.predict(X)
+        bias, contributions = self.engine.explain(X, class_index=np.argmax(proba, axis=1))
+        return labels, bias, contributions
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'path': self.path,
+            'engine': 'native' if self.engine is not None else 'sklearn',
+            'loaded_at': self.loaded_at.isoformat(),
+            'load_seconds': round(self.load_seconds, 3),
+        }
+
+
+class ModelRegistry:
+    """Tracks model versions by content hash and hot-swaps the active one.
+
+    `current` is the only shared state; it is replaced with a single
+    attribute assignment, so a request that picked up a version keeps
+    using it to the end while new requests see the new one. Nothing is
+    ever unloaded under an in-flight request.
+
+    A watcher thread polls the model file; when its content hash changes
+    the new version is loaded, warmed and verified on that background
+    thread and only then swapped in, so serving never goes cold. Deploy a
+    model by atomically replacing the file (see `flask model activate`).
+    """
+
+    def __init__(self, app, path, poll_interval=10.0):
+        self.app = app
+        self.path = path
+        self.poll_interval = poll_interval
+
+        self.current = None
+        self.history = []
+        self.last_error = None
+
+        self._swap_lock = threading.Lock()
+        self._watcher = None
+        self._watcher_pid = None
+        self._file_stat = None
+
+    # ===== LOADING =====
+
+    def load_initial(self):
+        """Load the configured model synchronously at startup."""
+        if not os.path.exists(self.path):
+            print(f"⚠️  Pipeline file not found at {self.path}", file=sys.stderr)
+            return None
+        try:
+            version = self._load(self.path)
+        except Exception as e:
+            print(f"❌ Error loading pipeline: {e}", file=sys.stderr)
+            self.last_error = str(e)
+            return None
+        self._swap(version)
+        return version
+
+    def _load(self, path):
+        self._file_stat = file_stat(path)
+        started = time.perf_counter()
+        pipeline, engine, fingerprint = load_model(self.app, path)
+        if engine is not None and self.app.config['PREDICT_EXPLAIN_ENABLED']:
+            engine.prepare_explanations()
+        return ModelVersion(fingerprint, path, pipeline, engine, time.perf_counter() - started)
+
+    def reload(self, path=None):
+        """Load, warm and verify the model at `path`, then swap it in.
+
+        Returns the new ModelVersion, or None when the file is unchanged
+        or the candidate was rejected. Safe to call from any thread.
+        """
+        path = path or self.path
+        current = self.current
+        try:
+            if current is not None and file_fingerprint(path) == current.version:
+                self._file_stat = file_stat(path)
+                return None
+            candidate = self._load(path)
+        except Exception as e:
+            self._reject(path, None, f'load failed: {e}')
+            return None
+
+        try:
+            problem = self._verify(candidate, current)
+        except Exception as e:
+            problem = f'verification raised {e}'
+        if problem:
+            self._reject(path, candidate.version, problem)
+            return None
+
+        self._swap(candidate)
+        logger.info("model %s swapped in (was %s)", candidate.version,
+                    current.version if current is not None else None)
+        return candidate
+
+    def _verify(self, candidate, current, n_rows=256):
+        """Warm the candidate on a sample batch and sanity-check it.
+
+        Returns a description of the problem, or None if the candidate can
+        serve. Scoring the batch also pages in the model's memory and
+        runs any lazy initialisation before real traffic arrives.
+        """
+        import numpy as np
+
+        if candidate.engine is not None:
+            for name in candidate.engine.ARRAYS:
+                np.add.reduce(getattr(candidate.engine, name), axis=None)
+
+        X = _sample_rows(candidate, n_rows)
+        labels, proba = candidate.score(X)
+        if len(labels) != n_rows:
+            return f'expected {n_rows} labels, got {len(labels)}'
+        if proba is not None:
+            if not np.isfinite(proba).all():
+                return 'non-finite probabilities'
+            if not np.allclose(proba.sum(axis=1), 1.0):
+                return 'probabilities do not sum to 1'
+
+        if current is not None:
+            old_classes = _classes(current)
+            new_classes = _classes(candidate)
+            if old_classes is not None and new_classes is not None \
+                    and not np.array_equal(old_classes, new_classes):
+                return f'classes changed from {old_classes.tolist()} to {new_classes.tolist()}'
+        return None
+
+    def warm_current(self):
+        """Warm and check the serving version like a candidate before a swap.
+
+        For a version loaded by `load_initial`, which swaps in directly.
+        Returns the problem found, if any; the version keeps serving.
+        """
+        current = self.current
+        return self._verify(current, None) if current is not None else None
+
+    def _swap(self, version):
+        with self._swap_lock:
+            self.current = version
+            self.history.append(dict(version.describe(), status='active'))
+            del self.history[:-20]
+            # Kept for code that reads the model straight off the app
+            self.app.pipeline = version.pipeline
+            self.app.engine = version.engine
+            self.app.model_fingerprint = version.version
+            self.app.prediction_cache.bind(version.version, version.path)
+            self.app.explanation_cache.bind(version.version, version.path)
+
+    def _reject(self, path, version, reason):
+        self.last_error = reason
+        self.history.append({'version': version, 'path': path, 'status': 'rejected',
+                             'reason': reason,
+                             'loaded_at': datetime.now(timezone.utc).isoformat()})
+        del self.history[:-20]
+        logger.error("model candidate %s from %s rejected: %s", version, path, reason)
+
+    # ===== WATCHING =====
+
+    def ensure_watching(self):
+        """Start the file watcher in this process if it isn't running.
+
+        Called per request; started lazily so a gunicorn master that
+        preloads the app never owns the thread.
+        """
+        if self.poll_interval <= 0:
+            return
+        if self._watcher_pid == os.getpid() and self._watcher.is_alive():
+            return
+        with self._swap_lock:
+            if self._watcher_pid == os.getpid() and self._watcher.is_alive():
+                return
+            self._watcher = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+            self._watcher_pid = os.getpid()
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            stat = file_stat(self.path)
+            if stat is None or stat == self._file_stat:
+                continue
+            try:
+                with self.app.app_context():
+                    self.reload()
+            except Exception:
+                logger.exception("model reload failed")
+
+    def status(self):
+        current = self.current
+        return {
+            'current': current.describe() if current is not None else None,
+            'path': self.path,
+            'history': list(self.history),
+            'last_error': self.last_error,
+        }
+
+
+def _classes(version):
+    if version.engine is not None:
+        return version.engine.classes_
+    return getattr(version.pipeline, 'classes_', None)
+
+
+def _sample_rows(version, n_rows, seed=0):
+    import numpy as np
+
+    engine = version.engine
+    if engine is not None and engine.scale_ is not None:
+        low = -engine.min_ / engine.scale_
+        high = (1 - engine.min_) / engine.scale_
+    else:
+        n_features = engine.n_features if engine is not None else version.pipeline.n_features_in_
+        low, high = np.zeros(n_features), np.full(n_features, 100.0)
+    rng = np.random.default_rng(seed)
+    return np.round(rng.uniform(low, high, size=(n_rows, len(low))), 1)
@@ -0,0 +1,265 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import jwt
+from flask import current_app, has_app_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import Prediction, User
+
+
+class UserSnapshot:
+    """Read-only copy of the User columns that authenticated views use.
+
+    Cached snapshots let a request authenticate without a DB round trip.
+    `predictions` mirrors the User relationship so views can keep calling
+    `user.predictions.count()` and friends.
+    """
+
+    __slots__ = ('id', 'username', 'full_name', 'date_of_birth', 'blood_type',
+                 'gender', 'created_at', 'version')
+
+    def __init__(self, user):
+        for name in self.__slots__:
+            setattr(self, name, getattr(user, name))
+
+    @property
+    def predictions(self):
+        return Prediction.query.filter_by(user_id=self.id)
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.username}>'
+
+
+class AuthCache:
+    """Short-lived cache of verified JWTs and user snapshots.
+
+    A verified token maps to its user id until the earlier of `ttl`
+    seconds or the token's own `exp`, so a cached token never outlives its
+    signature. User snapshots are kept for `ttl` seconds and dropped as
+    soon as a commit changes or deletes that user in this process; other
+    workers see the change once their entry expires.
+    """
+
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._tokens = OrderedDict()
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.token_hits = 0
+        self.token_misses = 0
+        self.user_hits = 0
+        self.user_misses = 0
+        self.invalidations = 0
+
+    def _get(self, entries, key):
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del entries[key]
+            return None
+        entries.move_to_end(key)
+        return value
+
+    def _put(self, entries, key, value, expires_at):
+        entries[key] = (expires_at, value)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def get_token(self, token):
+        with self._lock:
+            user_id = self._get(self._tokens, token)
+            if user_id is None:
+                self.token_misses += 1
+            else:
+                self.token_hits += 1
+            return user_id
+
+    def put_token(self, token, user_id, exp=None):
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        with self._lock:
+            self._put(self._tokens, token, user_id, expires_at)
+
+    def get_user(self, user_id):
+        with self._lock:
+            user = self._get(self._users, user_id)
+            if user is None:
+                self.user_misses += 1
+            else:
+                self.user_hits += 1
+            return user
+
+    def put_user(self, user):
+        with self._lock:
+            self._put(self._users, user.id, user, time.time() + self.ttl)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            if self._users.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+            self._users.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ttl': self.ttl,
+                'tokens': len(self._tokens),
+                'users': len(self._users),
+                'token_hits': self.token_hits,
+                'token_misses': self.token_misses,
+                'user_hits': self.user_hits,
+                'user_misses': self.user_misses,
+                'invalidations': self.invalidations,
+            }
+
+
+# ===== CACHE INVALIDATION =====
+# Users touched by a flush are invalidated once the transaction commits,
+# so a concurrent request can't re-cache the pre-commit row.
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = {obj.id for obj in list(session.dirty) + list(session.deleted)
+               if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault('auth_invalidate', set()).update(changed)
+
+
+def session_auth_cache(session):
+    """The AuthCache a session's commits must invalidate, if any.
+
+    Sessions made outside a Flask app context, like the async app's,
+    carry it in `session.info['auth_cache']`; Flask-SQLAlchemy's session
+    is only used inside one and finds it on current_app.
+    """
+    if 'auth_cache' in session.info:
+        return session.info['auth_cache']
+    return getattr(current_app, 'auth_cache', None) if has_app_context() else None
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    changed = session.info.pop('auth_invalidate', None)
+    if not changed:
+        return
+    cache = session_auth_cache(session)
+    if cache is not None:
+        for user_id in changed:
+            cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('auth_invalidate', None)
+
+
+def _load_user(user_id):
+    cache = current_app.auth_cache
+    user = cache.get_user(user_id) if cache is not None else None
+    if user is None:
+        row = db.session.get(User, user_id)
+        if row is None:
+            return None
+        user = UserSnapshot(row)
+        if cache is not None:
+            cache.put_user(user)
+    return user
+
+
+def bearer_token(headers):
+    """The token from an Authorization header, with or without 'Bearer '."""
+    auth_header = headers.get('Authorization')
+    if not auth_header:
+        return None
+    if auth_header.startswith('Bearer '):
+        return auth_header.replace('Bearer ', '')
+    return auth_header
+
+
+def verify_token(token, secret, cache=None):
+    """Return the user id a token was issued for.
+
+    Returns None when the signature is fine but the 'sub' claim is
+    missing; raises jwt.InvalidTokenError (or ExpiredSignatureError) for
+    a bad token. Verified tokens are remembered in `cache`.
+    """
+    user_id = cache.get_token(token) if cache is not None else None
+    if user_id is not None:
+        return user_id
+
+    # Decode token dengan timezone-aware datetime
+    data = jwt.decode(
+        token,
+        secret,
+        algorithms=['HS256'],
+        options={"verify_exp": True}
+    )
+
+    # Cek apakah 'sub' ada dalam payload
+    if 'sub' not in data:
+        return None
+
+    user_id = int(data['sub'])
+    if cache is not None:
+        cache.put_token(token, user_id, data.get('exp'))
+    return user_id
+
+
+def token_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if request.method == 'OPTIONS':
+            return jsonify({'status': 'ok'}), 200
+
+        # Ambil token dari header
+        token = bearer_token(request.headers)
+
+        # Debug: log token status
+        if not token:
+            current_app.logger.warning("No token provided in request")
+            return jsonify({'msg':'token missing'}), 401
+
+        metrics = current_app.metrics
+        try:
+            with metrics.stage('jwt_decode'):
+                user_id = verify_token(token, current_app.config['JWT_SECRET'], current_app.auth_cache)
+            if user_id is None:
+                current_app.logger.error("Token missing 'sub' claim")
+                return jsonify({'msg':'invalid token structure'}), 401
+
+            with metrics.stage('user_lookup'):
+                user = _load_user(user_id)
+            if user is None:
+                current_app.logger.error(f"User with id {user_id} not found")
+                return jsonify({'msg':'user not found'}), 401
+
+            current_app.logger.info(f"User {user.username} authenticated successfully")
+
+        except jwt.ExpiredSignatureError:
+            current_app.logger.warning("Token has expired")
+            return jsonify({'msg':'token expired'}), 401
+        except jwt.InvalidTokenError as e:
+            current_app.logger.error(f"Invalid token: {str(e)}")
+            return jsonify({'msg':'token invalid', 'err': str(e)}), 401
+        except Exception as e:
+            current_app.logger.error(f"Token verification failed: {str(e)}")
+            return jsonify({'msg':'token verification failed', 'err': str(e)}), 401
+
+        return f(user, *args, **kwargs)
+
+    return decorated
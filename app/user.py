@@ -1,9 +1,13 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from . import db
-from .models import User, Prediction
-import jwt
-from functools import wraps
-from datetime import date
+from .models import Prediction, PredictionSummary
+from .export import EXPORT_FORMATS, iter_export, iter_predictions, serialize_prediction
+from .security import token_required
+from datetime import date, datetime
+from urllib.parse import urlencode
+import base64
+import hashlib
+import json
 
 bp = Blueprint('user', __name__)
 
@@ -11,69 +15,9 @@ def calculate_age(born):
     today = date.today()
     return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
 
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
-        
-        if request.method == 'OPTIONS':
-            return jsonify({'status': 'ok'}), 200
-
-        # Ambil token dari header
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if auth_header.startswith('Bearer '):
-                token = auth_header.replace('Bearer ', '')
-            else:
-                token = auth_header
-        
-        # Debug: log token status
-        if not token:
-            current_app.logger.warning("No token provided in request")
-            return jsonify({'msg':'token missing'}), 401
-        
-        try:
-            # Decode token dengan timezone-aware datetime
-            data = jwt.decode(
-                token, 
-                current_app.config['JWT_SECRET'], 
-                algorithms=['HS256'],
-                options={"verify_exp": True} 
-            )
-            
-            # Cek apakah 'sub' ada dalam payload
-            if 'sub' not in data:
-                current_app.logger.error("Token missing 'sub' claim")
-                return jsonify({'msg':'invalid token structure'}), 401
-            
-            user_id = int(data['sub'])
-            
-            user = User.query.get(user_id)
-            if user is None:
-                current_app.logger.error(f"User with id {data['sub']} not found")
-                return jsonify({'msg':'user not found'}), 401
-            
-            current_app.logger.info(f"User {user.username} authenticated successfully")
-            
-        except jwt.ExpiredSignatureError:
-            current_app.logger.warning("Token has expired")
-            return jsonify({'msg':'token expired'}), 401
-        except jwt.InvalidTokenError as e:
-            current_app.logger.error(f"Invalid token: {str(e)}")
-            return jsonify({'msg':'token invalid', 'err': str(e)}), 401
-        except Exception as e:
-            current_app.logger.error(f"Token verification failed: {str(e)}")
-            return jsonify({'msg':'token verification failed', 'err': str(e)}), 401
-        
-        return f(user, *args, **kwargs)
-    
-    return decorated
-
-@bp.route('/profile', methods=['GET', 'OPTIONS'])
-@token_required
-def profile(user):
+def profile_data(user):
     age = calculate_age(user.date_of_birth) if user.date_of_birth else None
-    user_data = {
+    return {
         'id': user.id,
         'username': user.username,
         'full_name': user.full_name,
@@ -83,27 +27,167 @@ def profile(user):
         'gender': user.gender,
         'created_at': user.created_at.isoformat()
     }
-    return jsonify(user_data)
 
-@bp.route('/dashboard', methods=['GET'])
-@token_required
-def dashboard(user):
-    total_predictions = user.predictions.count()
-    latest_prediction = user.predictions.order_by(db.desc('created_at')).first()
+def dashboard_data(session, user_id):
+    # One primary-key lookup on the summary row, joined to the latest
+    # prediction by its id; matching created_at too lets a partitioned
+    # table probe only the partition that holds it
+    row = session.execute(
+        db.select(PredictionSummary, Prediction)
+        .outerjoin(Prediction, db.and_(
+            Prediction.id == PredictionSummary.latest_prediction_id,
+            Prediction.created_at == PredictionSummary.last_seen_at
+        ))
+        .where(PredictionSummary.user_id == user_id)
+    ).first()
+    summary, latest_prediction = row if row is not None else (None, None)
+    total_predictions = summary.total_count if summary is not None else 0
     
-    latest_prediction_data = {
-        'id': latest_prediction.id,
-        'input_json': latest_prediction.input_json,
-        'output_json': latest_prediction.output_json,
-        'created_at': latest_prediction.created_at.isoformat()
-    } if latest_prediction else None
+    latest_prediction_data = serialize_prediction(latest_prediction) if latest_prediction else None
     
-    dashboard_data = {
+    return {
         'total_predictions': total_predictions,
         'latest_prediction': latest_prediction_data
     }
-    
-    return jsonify(dashboard_data)
+
+def data_version(session, user):
+    """Version of everything the user's dashboard and history are built from.
+
+    Read before the payload, so a concurrent write can only leave the
+    payload newer than its ETag (one extra 200 later), never older.
+    """
+    predictions = session.scalar(
+        db.select(PredictionSummary.version).where(PredictionSummary.user_id == user.id)
+    )
+    return f'{user.version}.{predictions or 0}'
+
+def profile_version(user):
+    # The profile's age changes with the date, not only with the row
+    return f'{user.version}.{date.today().isoformat()}'
+
+def response_etag(kind, user_id, version, args=None):
+    """Strong ETag for one user's view of a resource at `version`."""
+    raw = f'{kind}:{user_id}:{version}'
+    if args:
+        raw += '?' + urlencode(sorted(args.items(multi=True)))
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+def cache_validators(response, etag):
+    # Clients may keep the body but must revalidate it on every use
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified(etag):
+    """A 304 if the request's If-None-Match already has `etag`, else None."""
+    if request.if_none_match.contains_weak(etag):
+        return cache_validators(current_app.response_class(status=304), etag)
+    return None
+
+@bp.route('/profile', methods=['GET', 'OPTIONS'])
+@token_required
+def profile(user):
+    etag = response_etag('profile', user.id, profile_version(user))
+    return not_modified(etag) or cache_validators(jsonify(profile_data(user)), etag)
+
+@bp.route('/dashboard', methods=['GET'])
+@token_required
+def dashboard(user):
+    # One primary-key read decides a 304 before any prediction query
+    etag = response_etag('dashboard', user.id, data_version(db.session, user))
+    return not_modified(etag) or cache_validators(jsonify(dashboard_data(db.session, user.id)), etag)
+
+def _encode_cursor(direction, pred):
+    raw = json.dumps([direction, pred.created_at.isoformat(), pred.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    """Return (direction, created_at, id) or None for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, created_at, pred_id = json.loads(raw)
+        if direction not in ('next', 'prev'):
+            return None
+        return direction, datetime.fromisoformat(created_at), int(pred_id)
+    except (ValueError, TypeError):
+        return None
+
+def history_page(session, user_id, args):
+    """Build the /user/history response from the query args.
+
+    Returns (body, status). Runs its queries through `session` so the
+    async app can share it via `AsyncSession.run_sync`.
+    """
+    per_page = max(args.get('per_page', 10, type=int), 1)
+    cursor = args.get('cursor')
+    include_total = args.get('include_total', 'true').lower() in ('1', 'true', 'yes')
+
+    newest_first = (db.desc(Prediction.created_at), db.desc(Prediction.id))
+    query = db.select(Prediction).where(Prediction.user_id == user_id)
+
+    response = {'status': 'success'}
+
+    if 'page' in args and not cursor:
+        # Legacy page numbers still work, but deep pages pay for the OFFSET;
+        # next_cursor lets clients switch to keyset paging
+        page = max(args.get('page', 1, type=int), 1)
+        items = session.scalars(
+            query.order_by(*newest_first).offset((page - 1) * per_page).limit(per_page + 1)
+        ).all()
+        has_older = len(items) > per_page
+        items = items[:per_page]
+        response['current_page'] = page
+        next_cursor = _encode_cursor('next', items[-1]) if items and has_older else None
+        prev_cursor = _encode_cursor('prev', items[0]) if items and page > 1 else None
+    else:
+        # Keyset paging on (created_at, id) over ix_prediction_user_created_id:
+        # every page is an index range scan of per_page + 1 rows
+        direction, key = 'next', None
+        if cursor:
+            decoded = _decode_cursor(cursor)
+            if decoded is None:
+                return {'msg': 'invalid cursor'}, 400
+            direction, created_at, pred_id = decoded
+            key = (created_at, pred_id)
+        else:
+            # The first page, in the shape page-number clients expect
+            response['current_page'] = 1
+
+        # The extra created_at bound is implied by the tuple comparison but,
+        # unlike it, lets Postgres prune partitions outside the page's range
+        position = db.tuple_(Prediction.created_at, Prediction.id)
+        if direction == 'next':
+            if key is not None:
+                query = query.where(position < key, Prediction.created_at <= key[0])
+            items = session.scalars(query.order_by(*newest_first).limit(per_page + 1)).all()
+        else:
+            query = query.where(position > key, Prediction.created_at >= key[0])
+            items = session.scalars(
+                query.order_by(Prediction.created_at, Prediction.id).limit(per_page + 1)
+            ).all()
+
+        has_more = len(items) > per_page
+        items = list(items[:per_page])
+        if direction == 'prev':
+            items.reverse()
+
+        has_older = has_more if direction == 'next' else True
+        has_newer = key is not None if direction == 'next' else has_more
+        next_cursor = _encode_cursor('next', items[-1]) if items and has_older else None
+        prev_cursor = _encode_cursor('prev', items[0]) if items and has_newer else None
+
+    if include_total:
+        # Total comes from the maintained summary row, not COUNT(*)
+        summary = session.get(PredictionSummary, user_id)
+        total = summary.total_count if summary is not None else 0
+        response['total_items'] = total
+        response['total_pages'] = (total + per_page - 1) // per_page
+
+    response['next_cursor'] = next_cursor
+    response['prev_cursor'] = prev_cursor
+    response['history'] = [serialize_prediction(pred) for pred in items]
+
+    return response, 200
 
 @bp.route('/history', methods=['GET', 'OPTIONS'])
 @token_required
@@ -111,26 +195,31 @@ def history(user):
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'}), 200
 
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    etag = response_etag('history', user.id, data_version(db.session, user), request.args)
+    response = not_modified(etag)
+    if response is not None:
+        return response
 
-    pagination = user.predictions.order_by(db.desc(Prediction.created_at)).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    body, status = history_page(db.session, user.id, request.args)
+    if status != 200:
+        return jsonify(body), status
+    return cache_validators(jsonify(body), etag)
+
+@bp.route('/history/export', methods=['GET', 'OPTIONS'])
+@token_required
+def export_history(user):
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'msg': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
 
-    history_data = []
-    for pred in pagination.items:
-        history_data.append({
-            'id': pred.id,
-            'input_json': pred.input_json,
-            'output_json': pred.output_json,
-            'created_at': pred.created_at.isoformat()
-        })
-
-    return jsonify({
-        'status': 'success',
-        'current_page': page,
-        'total_pages': pagination.pages,
-        'total_items': pagination.total,
-        'history': history_data
-    }), 200
\ No newline at end of file
+    chunk_size = current_app.config['EXPORT_CHUNK_SIZE']
+    rows = iter_predictions(user_id=user.id, chunk_size=chunk_size)
+
+    return Response(
+        stream_with_context(iter_export(rows, fmt, chunk_size=chunk_size)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename=predictions-{user.id}.{fmt}',
+            'X-Accel-Buffering': 'no'
+        }
+    )
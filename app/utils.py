@@ -0,0 +1,35 @@
+import hashlib
+import os
+
+
+def file_fingerprint(path, chunk_size=1024 * 1024):
+    """Short content hash of a file, used to version loaded models."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def file_stat(path):
+    """(mtime, size, inode) of a file, or None if it doesn't exist.
+
+    Cheap change detection for files that get replaced atomically.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def percentile(samples, q):
+    """q-th percentile of a sorted, non-empty sequence.
+
+    Interpolates linearly like numpy.percentile, for stats that shouldn't
+    pull NumPy into a worker that hasn't needed it yet.
+    """
+    position = (len(samples) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(samples) - 1)
+    return samples[lower] + (samples[upper] - samples[lower]) * (position - lower)
@@ -0,0 +1,225 @@
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Packages too slow to import on the request path. Nothing imported by
+# create_app pulls them in; each warmup phase reports which it loaded
+HEAVY_PACKAGES = ('numpy', 'pandas', 'scipy', 'sklearn', 'joblib')
+
+
+def heavy_packages_loaded():
+    return [name for name in HEAVY_PACKAGES if name in sys.modules]
+
+
+class Warmup:
+    """Loads the ML stack and the model off the request path.
+
+    `state` goes 'cold' -> 'warming' -> 'ready', or to 'failed' when no
+    model could be loaded (the registry's watcher then picks the file up
+    once it appears, as before). Phases are timed, along with the heavy
+    packages each one imported, for /health and `flask profile-startup`.
+
+    With MODEL_WARMUP='background' the thread is started per process, by
+    gunicorn's post_worker_init hook or else by the first request, so a
+    master that preloads the app never forks in the middle of an import.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.state = 'cold'
+        self.phases = {}
+        self.started_at = None
+        self.seconds = None
+        self.error = None
+
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._finished = threading.Event()
+
+    @property
+    def done(self):
+        return self.state in ('ready', 'failed')
+
+    def ensure_started(self):
+        """Start the warmup thread in this process unless it has run; returns `done`."""
+        if self.done:
+            return True
+        if self._pid == os.getpid():
+            return False
+        with self._lock:
+            if self._pid != os.getpid() and not self.done:
+                self._thread = threading.Thread(target=self.run, name='warmup', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+        return self.done
+
+    def wait(self, timeout=None):
+        """Block until the warmup has finished, at most `timeout` seconds; returns `done`."""
+        if not self.done and self._pid == os.getpid():
+            self._finished.wait(timeout)
+        return self.done
+
+    def run(self):
+        """Warm up in the calling thread; returns True once a model is serving.
+
+        A no-op after a finished warmup. Used directly by 'eager' startup
+        and by CLI commands that need the model.
+        """
+        with self._run_lock:
+            if self.done:
+                return self.state == 'ready'
+            self.state = 'warming'
+            self.phases = {}
+            self.error = None
+            self.started_at = datetime.now(timezone.utc).isoformat()
+            began = time.perf_counter()
+            registry = self.app.model_registry
+            try:
+                with self._phase('imports'):
+                    importlib.import_module('numpy')
+                with self._phase('model'):
+                    registry.load_initial()
+                if registry.current is not None:
+                    # Page the model in and run its lazy setup before traffic
+                    with self._phase('warm'):
+                        problem = registry.warm_current()
+                    if problem:
+                        logger.warning('model %s warmed with a problem: %s',
+                                       registry.current.version, problem)
+            except Exception as e:
+                logger.exception('warmup failed')
+                self.error = str(e)
+
+            self.seconds = round(time.perf_counter() - began, 3)
+            if registry.current is not None:
+                self.state = 'ready'
+            else:
+                self.state = 'failed'
+                self.error = self.error or registry.last_error or 'no model loaded'
+            self._finished.set()
+            if self.state == 'ready':
+                # Requests that came in during the warmup found no model to
+                # start the pool with (absent while create_app runs 'eager')
+                pool = getattr(self.app, 'inference_pool', None)
+                if pool is not None:
+                    pool.ensure_started()
+                print(f"✅ Warmup done in {self.seconds}s", file=sys.stderr)
+            else:
+                print(f"⚠️  Warmup finished without a model: {self.error}", file=sys.stderr)
+            return self.state == 'ready'
+
+    @contextmanager
+    def _phase(self, name):
+        before = heavy_packages_loaded()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = {
+                'seconds': round(time.perf_counter() - started, 3),
+                'imported': [package for package in heavy_packages_loaded() if package not in before],
+            }
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'ready': self.state == 'ready',
+            'mode': self.app.config['MODEL_WARMUP'],
+            'started_at': self.started_at,
+            'seconds': self.seconds,
+            'phases': dict(self.phases),
+            'heavy_packages': heavy_packages_loaded(),
+            'error': self.error,
+        }
+
+
+
+# ===== STARTUP PROFILE =====
+
+# Run by profile_startup in a fresh interpreter: builds the app like a
+# worker does, answers one request, waits for the warmup and scores a row
+_PROFILE_SCRIPT = '''
+import json, time
+began = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+flask_app.test_client().get('/')
+answered = time.perf_counter()
+flask_app.warmup.ensure_started()
+flask_app.warmup.wait()
+warmed = time.perf_counter()
+first_prediction = None
+model = flask_app.model_registry.current
+if model is not None:
+    from app.predict import REQUIRED_COLS, parse_row, predict_row
+    with flask_app.app_context():
+        started = time.perf_counter()
+        _, X, _, _ = parse_row({'features': [0] * len(REQUIRED_COLS)})
+        predict_row(flask_app, model, X)
+        first_prediction = time.perf_counter() - started
+print(%(marker)r + json.dumps({
+    'import_app': imported - began,
+    'create_app': created - imported,
+    'first_request': answered - created,
+    'warmup_wait': warmed - answered,
+    'ready_after': warmed - began,
+    'first_prediction': first_prediction,
+    'warmup': flask_app.warmup.stats(),
+}))
+'''
+
+_MARKER = 'startup-profile: '
+
+
+def profile_startup(root, env=None, timeout=300):
+    """Profile a cold start of the app in a child interpreter.
+
+    Returns a report with the time spent importing `app`, in create_app,
+    on the first (non-prediction) request and waiting for the warmup,
+    the warmup's phases, and `-X importtime` self time summed per
+    top-level package. `root` is the directory holding the `app` package.
+    """
+    import subprocess
+
+    env = dict(os.environ if env is None else env)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROFILE_SCRIPT % {'marker': _MARKER}],
+        cwd=root, env=env, capture_output=True, text=True, timeout=timeout
+    )
+    timings = None
+    for line in result.stdout.splitlines():
+        if line.startswith(_MARKER):
+            timings = json.loads(line[len(_MARKER):])
+    if timings is None:
+        tail = '\n'.join(line for line in result.stderr.splitlines()
+                         if not line.startswith('import time:'))[-2000:]
+        raise RuntimeError(f'profiling run failed (exit {result.returncode}):\n{tail}')
+
+    packages, modules = {}, 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        modules += 1
+    timings['imports'] = {
+        'modules': modules,
+        'seconds': round(sum(packages.values()) / 1e6, 3),
+        'packages': {name: round(us / 1e6, 4)
+                     for name, us in sorted(packages.items(), key=lambda item: -item[1])},
+    }
+    return timings
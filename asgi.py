@@ -0,0 +1,5 @@
+# Asyncio entry point, e.g. `hypercorn asgi:app --workers 2 --bind 0.0.0.0:5000`
+# (needs requirements-async.txt); run.py stays the WSGI entry point
+from app.aio import create_async_app
+
+app = create_async_app()
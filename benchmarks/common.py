@@ -0,0 +1,62 @@
+"""Helpers shared by the benchmark scripts: run metadata, latency summaries
+and JSON output in the shape benchmarks/compare.py reads."""
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def random_features(rng):
+    """One plausible feature row (REQUIRED_COLS order) from a random.Random."""
+    return [rng.randint(28, 77), rng.randint(0, 1), rng.randint(1, 4), rng.randint(90, 200),
+            rng.randint(0, 600), rng.randint(0, 1), rng.randint(0, 2), rng.randint(60, 202),
+            rng.randint(0, 1), round(rng.uniform(-2.6, 6.2), 1), rng.randint(1, 3)]
+
+
+def run_metadata():
+    """Where and on what a result was measured, so runs can be compared."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def latency_summary(seconds, unit='ms'):
+    """p50/p95/p99/mean/max of a list of durations in seconds."""
+    scale = {'ms': 1e3, 'us': 1e6}[unit]
+    samples = np.asarray(seconds, dtype=np.float64) * scale
+    if not len(samples):
+        return {'unit': unit, 'samples': 0, 'p50': None, 'p95': None, 'p99': None,
+                'mean': None, 'max': None}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        'unit': unit,
+        'samples': len(samples),
+        'p50': round(float(p50), 3),
+        'p95': round(float(p95), 3),
+        'p99': round(float(p99), 3),
+        'mean': round(float(samples.mean()), 3),
+        'max': round(float(samples.max()), 3),
+    }
+
+
+def write_report(report, output):
+    """Print `report` as JSON, and also write it to `output` if given."""
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
@@ -0,0 +1,75 @@
+"""Compare two benchmark reports and fail on regressions.
+
+Reads JSON written by load_test.py or inference.py (-o), matches results
+by name and flags any p50/p95/p99 that grew, or throughput that fell, by
+more than --threshold. Exits 1 if anything regressed, so it can gate a
+deploy:
+
+    python benchmarks/compare.py baseline.json candidate.json --threshold 0.15
+"""
+import argparse
+import json
+import sys
+
+LATENCY_KEYS = ('p50', 'p95', 'p99')
+
+
+def compare(base, new, threshold):
+    """Return a list of per-metric dicts for the results both reports share."""
+    rows = []
+    for name in sorted(set(base['results']) & set(new['results'])):
+        old, cur = base['results'][name], new['results'][name]
+        metrics = [(f'latency {key} ({cur["latency"]["unit"]})', old['latency'][key],
+                    cur['latency'][key], 1) for key in LATENCY_KEYS]
+        metrics.append((f'throughput ({cur["throughput_unit"]})', old['throughput'],
+                        cur['throughput'], -1))
+        for metric, before, after, worse in metrics:
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            rows.append({
+                'result': name,
+                'metric': metric,
+                'base': before,
+                'new': after,
+                'change': round(change, 4),
+                'regression': change * worse > threshold,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative change that counts as a regression (default 0.10).')
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if base.get('benchmark') != new.get('benchmark'):
+        raise SystemExit(f'cannot compare a {base.get("benchmark")} report with a {new.get("benchmark")} one')
+
+    rows = compare(base, new, args.threshold)
+    for row in rows:
+        flag = 'REGRESSION' if row['regression'] else ''
+        print(f'{row["result"]:<32} {row["metric"]:<24} {row["base"]:>12} -> {row["new"]:>12} '
+              f'{row["change"]:+8.1%} {flag}', file=sys.stderr)
+
+    regressions = [row for row in rows if row['regression']]
+    print(json.dumps({
+        'base': base.get('meta', {}).get('commit'),
+        'new': new.get('meta', {}).get('commit'),
+        'threshold': args.threshold,
+        'compared': len(rows),
+        'regressions': regressions,
+    }, indent=2))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
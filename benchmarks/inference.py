@@ -0,0 +1,139 @@
+"""Microbenchmark: the inference path alone, without HTTP or the database.
+
+Times ModelVersion.score on the native engine and on the sklearn
+pipeline for several batch sizes, and the single-row request path
+(parse_row + predict_row) with prediction-cache misses and hits. With
+the native engine it also times ModelVersion.explain and the explain-mode
+request path (predict_row + explain_row), and reports their overhead as
+a factor of the plain prediction's p50. Prints per-call latency
+percentiles and rows/s as JSON.
+
+    python benchmarks/inference.py
+    python benchmarks/inference.py --batch-sizes 1 64 --calls 2000 -o inference.json
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from benchmarks.common import latency_summary, random_features, run_metadata, write_report
+
+
+def timed_calls(fn, args_list):
+    """Call fn(*args) for each args; returns the per-call durations."""
+    durations = []
+    for args in args_list:
+        began = time.perf_counter()
+        fn(*args)
+        durations.append(time.perf_counter() - began)
+    return durations
+
+
+def result(durations, rows_per_call):
+    total = sum(durations)
+    return {
+        'calls': len(durations),
+        'rows_per_call': rows_per_call,
+        'throughput': round(len(durations) * rows_per_call / total, 1) if total else None,
+        'throughput_unit': 'rows/s',
+        'latency': latency_summary(durations, 'us'),
+    }
+
+
+def _factor(slow, fast):
+    return round(slow['latency']['p50'] / fast['latency']['p50'], 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--calls', type=int, default=500, help='Timed calls per case.')
+    parser.add_argument('--rows', type=int, default=5000, help='Distinct random feature rows.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', '-o', default=None, help='Also write the JSON report here.')
+    args = parser.parse_args()
+
+    # Nothing here touches the database (the pool options in Config rule
+    # out an in-memory SQLite URL, so point it at a file that stays unused)
+    os.environ.setdefault('DATABASE_URL', f'sqlite:///{tempfile.gettempdir()}/bench-inference.db')
+    from app import create_app
+    from app.predict import explain_row, parse_row, predict_row
+    from app.registry import ModelVersion
+
+    app = create_app()
+    app.warmup.run()
+    model = app.model_registry.current
+    if model is None:
+        raise SystemExit('no model loaded')
+
+    rng = random.Random(args.seed)
+    rows = np.asarray([random_features(rng) for _ in range(args.rows)], dtype=np.float64)
+
+    engines = {'native': model} if model.engine is not None else {}
+    if model.pipeline is not None:
+        engines['sklearn'] = ModelVersion(model.version, model.path, model.pipeline, None, 0.0)
+
+    results = {}
+    overhead = {}
+    for name, version in engines.items():
+        for size in args.batch_sizes:
+            calls = max(1, min(args.calls, args.calls * 10 // size))
+            batches = [(rows[np.asarray([rng.randrange(args.rows) for _ in range(size)])],)
+                       for _ in range(calls)]
+            timed_calls(version.score, batches[:10])
+            results[f'score {name} batch={size}'] = result(timed_calls(version.score, batches), size)
+            if name == 'native':
+                timed_calls(version.explain, batches[:10])
+                results[f'explain {name} batch={size}'] = result(timed_calls(version.explain, batches), size)
+                overhead[f'batch={size}'] = _factor(results[f'explain {name} batch={size}'],
+                                                    results[f'score {name} batch={size}'])
+
+    def request_path(payload):
+        _, X, error, _ = parse_row(payload)
+        return predict_row(app, model, X)
+
+    with app.app_context():
+        cache = app.prediction_cache
+        payloads = [({'features': rows[i % args.rows].tolist()},) for i in range(args.calls)]
+        cache.clear()
+        results['request path cache miss'] = result(timed_calls(request_path, payloads), 1)
+        # Same rows again, now cached
+        results['request path cache hit'] = result(timed_calls(request_path, payloads), 1)
+
+        if model.engine is not None:
+            def explain_path(payload):
+                _, X, error, _ = parse_row(payload)
+                return predict_row(app, model, X), explain_row(app, model, X)
+
+            cache.clear()
+            app.explanation_cache.clear()
+            results['explain path cache miss'] = result(timed_calls(explain_path, payloads), 1)
+            results['explain path cache hit'] = result(timed_calls(explain_path, payloads), 1)
+            overhead['request path cache miss'] = _factor(results['explain path cache miss'],
+                                                          results['request path cache miss'])
+            overhead['request path cache hit'] = _factor(results['explain path cache hit'],
+                                                         results['request path cache hit'])
+
+    write_report({
+        'benchmark': 'inference',
+        'meta': run_metadata(),
+        'config': {
+            'model_version': model.version,
+            'engine': 'native' if model.engine is not None else 'sklearn',
+            'calls': args.calls,
+            'distinct_rows': args.rows,
+        },
+        'results': results,
+        # p50 with explanations / p50 without, per case
+        'explain_overhead': overhead,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
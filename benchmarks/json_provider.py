@@ -0,0 +1,125 @@
+"""Microbenchmark: Flask's stdlib JSON provider vs app.fastjson.
+
+Encodes /user/history response bodies and decodes /api/predict/batch
+request bodies with both providers, checks the bytes are identical and
+prints per-call timings as JSON.
+
+    python benchmarks/json_provider.py                  # synthetic history rows
+    python benchmarks/json_provider.py --from-db        # real pages from DATABASE_URL
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.fastjson import FastJSONProvider, orjson
+from app.predict import REQUIRED_COLS
+from benchmarks.common import random_features
+
+
+def synthetic_history(rows, seed=0):
+    rng = random.Random(seed)
+    started = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    history = []
+    for i in range(rows):
+        features = random_features(rng)
+        positive = rng.randint(0, 200) / 200
+        history.append({
+            'id': rows - i,
+            'input_json': dict(zip(REQUIRED_COLS, features)),
+            'output_json': {'prediction': [int(positive >= 0.5)],
+                            'probability': [[1 - positive, positive]]},
+            'created_at': (started + timedelta(minutes=rows - i)).isoformat()
+        })
+    return history
+
+
+def history_body(history):
+    return {
+        'status': 'success',
+        'total_items': len(history) * 7,
+        'total_pages': 7,
+        'next_cursor': 'WyJuZXh0IiwgIjIwMjUtMDEtMDFUMDA6MDA6MDArMDA6MDAiLCAxXQ',
+        'prev_cursor': None,
+        'history': history
+    }
+
+
+def db_history(rows):
+    from app import create_app, db
+    from app.models import PredictionSummary
+    from app.user import history_page
+
+    app = create_app()
+    with app.app_context():
+        user_id = db.session.scalar(
+            db.select(PredictionSummary.user_id).order_by(PredictionSummary.total_count.desc()).limit(1)
+        )
+        if user_id is None:
+            raise SystemExit('no predictions in the database; run without --from-db')
+        body, _ = history_page(db.session, user_id, _Args(per_page=rows))
+        return body
+
+
+class _Args(dict):
+    # Minimal stand-in for request.args
+    def get(self, key, default=None, type=None):
+        value = dict.get(self, key, default)
+        return type(value) if type is not None and value is not None else value
+
+
+def per_call_us(fn, number):
+    return round(min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--from-db', action='store_true',
+                        help='Use real /user/history pages of the busiest user.')
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    stdlib, fast = DefaultJSONProvider(app), FastJSONProvider(app)
+
+    results = []
+    with app.app_context():
+        for rows in args.rows:
+            body = db_history(rows) if args.from_db else history_body(synthetic_history(rows))
+            old = stdlib.response(body).get_data()
+            new = fast.response(body).get_data()
+            results.append({
+                'case': f'encode /user/history ({len(body["history"])} rows)',
+                'bytes': len(old),
+                'identical': old == new,
+                'stdlib_us': per_call_us(lambda: stdlib.response(body).get_data(), args.number),
+                'fast_us': per_call_us(lambda: fast.response(body).get_data(), args.number),
+            })
+
+            request_body = json.dumps({'rows': [h['input_json'] for h in body['history']]}).encode()
+            results.append({
+                'case': f'decode /api/predict/batch ({len(body["history"])} rows)',
+                'bytes': len(request_body),
+                'identical': stdlib.loads(request_body) == fast.loads(request_body),
+                'stdlib_us': per_call_us(lambda: stdlib.loads(request_body), args.number),
+                'fast_us': per_call_us(lambda: fast.loads(request_body), args.number),
+            })
+
+    for result in results:
+        result['speedup'] = round(result['stdlib_us'] / result['fast_us'], 2)
+    print(json.dumps({'orjson': orjson.__version__ if orjson else None, 'results': results}, indent=2))
+    if not all(result['identical'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+"""Load test: drive the API at a fixed concurrency and report latency.
+
+Seeds users and prediction histories into a scratch database, serves
+create_app() in a child process (werkzeug threaded server, or gunicorn
+with the repo's gunicorn.conf.py) and runs each scenario for --duration
+seconds with --concurrency client threads on keep-alive connections.
+Prints throughput and p50/p95/p99 per scenario as JSON.
+
+    python benchmarks/load_test.py                          # SQLite in a temp dir
+    python benchmarks/load_test.py --database-url postgresql://...  --server gunicorn
+    python benchmarks/load_test.py --scenarios predict --concurrency 32 -o run.json
+    python benchmarks/compare.py baseline.json run.json     # fail on regressions
+
+The client shares the host with the server: at high concurrency make
+sure the client threads are not the bottleneck (compare with fewer of
+them), or point --url at a server running elsewhere.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import ROOT, latency_summary, random_features, run_metadata, write_report
+
+SCENARIOS = ('predict', 'history', 'dashboard', 'login')
+PASSWORD = 'bench-password'
+USERNAME = 'bench_user_{}'
+
+
+# ===== SEEDING =====
+
+def seed(users, history, seed=0):
+    """Create bench users with `history` predictions each; returns tokens.
+
+    Users that already exist (a re-run against the same database) keep
+    their history. Predictions go through write_predictions so the
+    dashboard summaries match what the API would have written.
+    """
+    from app import create_app, db
+    from app.auth import issue_token
+    from app.models import User
+    from app.partitions import ensure_partitions
+    from app.persistence import write_predictions
+
+    rng = random.Random(seed)
+    app = create_app()
+    # The seeded history is stamped with the served model's version
+    app.warmup.run()
+    with app.app_context():
+        db.create_all()
+        names = [USERNAME.format(i) for i in range(users)]
+        existing = set(db.session.scalars(db.select(User.username).where(User.username.in_(names))))
+        new = [name for name in names if name not in existing]
+        if new:
+            # One hash for everyone; hashing each would dominate seeding
+            password_hash = app.password_hasher.hash(PASSWORD)
+            now = datetime.now(timezone.utc)
+            db.session.execute(db.insert(User), [{
+                'username': name, 'full_name': name, 'date_of_birth': datetime(1980, 1, 1).date(),
+                'blood_type': 'O', 'gender': 'F', 'password_hash': password_hash, 'created_at': now
+            } for name in new])
+            db.session.commit()
+
+        accounts = db.session.execute(
+            db.select(User.id, User.username).where(User.username.in_(names))
+        ).all()
+        created = set(new)
+        # A year of back-dated history needs its partitions on Postgres
+        ensure_partitions(app.config['PREDICTION_PARTITION_MONTHS_AHEAD'],
+                          start=(datetime.now(timezone.utc) - timedelta(days=366)).date())
+        _seed_history(db, write_predictions, [user_id for user_id, name in accounts if name in created],
+                      history, rng, app)
+
+        tokens = [(name, issue_token(db.session.get(User, user_id), app.config['JWT_SECRET'])['access_token'])
+                  for user_id, name in accounts]
+    return tokens
+
+
+def _seed_history(db, write_predictions, user_ids, history, rng, app, chunk=5000):
+    from app.predict import REQUIRED_COLS
+
+    version = app.model_registry.current.version if app.model_registry.current else None
+    started = datetime.now(timezone.utc) - timedelta(days=365)
+    step = timedelta(days=365) / max(history, 1)
+    records = []
+    for user_id in user_ids:
+        for i in range(history):
+            positive = rng.randint(0, 200) / 200
+            records.append({
+                'user_id': user_id,
+                'input_json': dict(zip(REQUIRED_COLS, random_features(rng))),
+                'output_json': {'prediction': [int(positive >= 0.5)],
+                                'probability': [[1 - positive, positive]]},
+                'model_version': version,
+                'created_at': started + step * i,
+            })
+            if len(records) >= chunk:
+                write_predictions(db.session, records)
+                db.session.commit()
+                records = []
+    if records:
+        write_predictions(db.session, records)
+        db.session.commit()
+
+
+# ===== SERVER =====
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _serve_werkzeug(port):
+    import logging
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    make_server('127.0.0.1', port, create_app(), threaded=True).serve_forever()
+
+
+def start_server(kind, workers, threads):
+    """Start the API on a free local port; returns (url, stop)."""
+    port = _free_port()
+    if kind == 'gunicorn':
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--workers', str(workers),
+             '--threads', str(threads), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+             'run:app'],
+            cwd=ROOT
+        )
+        stop = process.terminate
+    else:
+        process = multiprocessing.get_context('spawn').Process(
+            target=_serve_werkzeug, args=(port,), daemon=True
+        )
+        process.start()
+        stop = process.terminate
+    url = f'http://127.0.0.1:{port}'
+    wait_ready(url)
+    return url, stop
+
+
+def wait_ready(url, timeout=120):
+    # Workers answer before their model warmup is done; wait for the model
+    # so the first measured predictions don't include it
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, body = Client(url).request('GET', '/')
+            if status == 200 and json.loads(body).get('model_loaded'):
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f'server at {url} did not become ready in {timeout}s')
+
+
+# ===== LOAD =====
+
+class Client:
+    """One keep-alive HTTP connection; reconnects after errors."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        headers = dict(headers or {})
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+        if response.getheader('Connection', '').lower() == 'close':
+            self.connection.close()
+            self.connection = None
+        return response.status, data
+
+
+def make_requests(scenario, tokens, rng, distinct_rows):
+    """Return a callable producing (method, path, body, headers) for one request."""
+    rows = [random_features(rng) for _ in range(distinct_rows)]
+
+    def auth():
+        name, token = rng.choice(tokens)
+        return name, {'Authorization': f'Bearer {token}'}
+
+    if scenario == 'predict':
+        return lambda: ('POST', '/api/predict', {'features': rng.choice(rows)}, auth()[1])
+    if scenario == 'history':
+        return lambda: ('GET', '/user/history?per_page=20', None, auth()[1])
+    if scenario == 'dashboard':
+        return lambda: ('GET', '/user/dashboard', None, auth()[1])
+    if scenario == 'login':
+        return lambda: ('POST', '/auth/login', {'username': auth()[0], 'password': PASSWORD}, None)
+    raise ValueError(scenario)
+
+
+def run_phase(url, next_request, concurrency, duration):
+    """Issue requests from `concurrency` threads for `duration` seconds."""
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    start = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def worker():
+        client = Client(url)
+        mine, codes = [], Counter()
+        start.wait()
+        while time.perf_counter() < deadline[0]:
+            method, path, body, headers = next_request()
+            began = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, body, headers)
+            except (OSError, http.client.HTTPException):
+                status = 'error'
+            mine.append(time.perf_counter() - began)
+            codes[str(status)] += 1
+        with lock:
+            latencies.extend(mine)
+            statuses.update(codes)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    deadline[0] = time.perf_counter() + duration
+    began = time.perf_counter()
+    start.wait()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - began
+
+
+def run_scenario(url, scenario, tokens, args):
+    rng = random.Random(args.seed)
+    next_request = make_requests(scenario, tokens, rng, args.distinct_rows)
+    if args.warmup:
+        run_phase(url, next_request, args.concurrency, args.warmup)
+    latencies, statuses, elapsed = run_phase(url, next_request, args.concurrency, args.duration)
+    ok = sum(count for status, count in statuses.items() if status.startswith('2'))
+    return {
+        'requests': len(latencies),
+        'ok': ok,
+        'statuses': dict(statuses),
+        'seconds': round(elapsed, 3),
+        'throughput': round(ok / elapsed, 2),
+        'throughput_unit': 'req/s',
+        'latency': latency_summary(latencies, 'ms'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10, help='Measured seconds per scenario.')
+    parser.add_argument('--warmup', type=float, default=2, help='Unmeasured seconds per scenario.')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--history', type=int, default=2000, help='Predictions seeded per user.')
+    parser.add_argument('--distinct-rows', type=int, default=1000,
+                        help='Feature rows /api/predict cycles through (fewer = more cache hits).')
+    parser.add_argument('--database-url', default=None,
+                        help='Database to seed and serve from (default: SQLite in a temp dir).')
+    parser.add_argument('--server', choices=('werkzeug', 'gunicorn'), default='werkzeug')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers.')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker.')
+    parser.add_argument('--url', default=None,
+                        help='Drive an already running server instead (it must use the '
+                             'same DATABASE_URL and JWT_SECRET as this process).')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', '-o', default=None, help='Also write the JSON report here.')
+    args = parser.parse_args()
+
+    scratch = None
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    elif not args.url:
+        scratch = tempfile.mkdtemp(prefix='bench-')
+        os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(scratch, "bench.db")}'
+    os.environ.setdefault('JWT_SECRET', 'bench-secret-' + 'x' * 32)
+
+    stop = None
+    try:
+        seeded = time.perf_counter()
+        tokens = seed(args.users, args.history, args.seed)
+        seed_seconds = time.perf_counter() - seeded
+
+        url = args.url
+        if url is None:
+            url, stop = start_server(args.server, args.workers, args.threads)
+
+        results = {}
+        for scenario in args.scenarios:
+            print(f'running {scenario} for {args.duration}s at concurrency {args.concurrency}',
+                  file=sys.stderr)
+            results[scenario] = run_scenario(url, scenario, tokens, args)
+    finally:
+        if stop is not None:
+            stop()
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    from sqlalchemy.engine import make_url
+    write_report({
+        'benchmark': 'load',
+        'meta': run_metadata(),
+        'config': {
+            'server': 'external' if args.url else args.server,
+            'workers': args.workers if args.server == 'gunicorn' else 1,
+            'threads': args.threads if args.server == 'gunicorn' else None,
+            'database': make_url(os.environ['DATABASE_URL']).get_backend_name(),
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'users': args.users,
+            'history_per_user': args.history,
+            'distinct_rows': args.distinct_rows,
+            'seed_seconds': round(seed_seconds, 3),
+        },
+        'results': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+import gc
+
+# Load the app once in the master; workers are forked from it and share
+# its memory copy-on-write. With MODEL_WARMUP=eager (the default with
+# MODEL_LOAD_MODE=pickle) that includes the model, instead of each worker
+# unpickling its own copy. With MODEL_WARMUP=background (the default with
+# MODEL_LOAD_MODE=mmap) every worker loads it on a warmup thread (see
+# post_worker_init) and serves non-prediction routes meanwhile; under
+# 'pickle' that trades a faster start for one model copy per worker.
+preload_app = True
+
+
+def when_ready(server):
+    # Move everything loaded so far into the permanent generation so the
+    # cyclic GC in workers never writes to (and so copies) shared pages
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with workers
+    import run
+    from app import db
+    with run.app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Start loading the model as soon as the worker is up rather than on
+    # its first request; a no-op when the master already loaded it
+    import run
+    run.app.warmup.ensure_started()
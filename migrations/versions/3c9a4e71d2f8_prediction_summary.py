@@ -0,0 +1,57 @@
+"""prediction summary
+
+Revision ID: 3c9a4e71d2f8
+Revises: bf51d21f467b
+Create Date: 2026-10-18 09:12:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9a4e71d2f8'
+down_revision = 'bf51d21f467b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('prediction_summary',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_count', sa.Integer(), nullable=False),
+    sa.Column('positive_count', sa.Integer(), nullable=False),
+    sa.Column('negative_count', sa.Integer(), nullable=False),
+    sa.Column('latest_prediction_id', sa.Integer(), nullable=True),
+    sa.Column('last_seen_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Backfill from the existing history
+    if op.get_bind().dialect.name == 'postgresql':
+        label = "(p.output_json->'prediction'->>0)::int"
+    else:
+        label = "json_extract(p.output_json, '$.prediction[0]')"
+
+    op.execute(f"""
+        INSERT INTO prediction_summary
+            (user_id, total_count, positive_count, negative_count,
+             latest_prediction_id, last_seen_at)
+        SELECT p.user_id,
+               COUNT(*),
+               SUM(CASE WHEN {label} = 1 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN {label} = 0 THEN 1 ELSE 0 END),
+               (SELECT p2.id FROM prediction p2
+                 WHERE p2.user_id = p.user_id
+                 ORDER BY p2.created_at DESC, p2.id DESC
+                 LIMIT 1),
+               MAX(p.created_at)
+          FROM prediction p
+         WHERE p.user_id IS NOT NULL
+         GROUP BY p.user_id
+    """)
+
+
+def downgrade():
+    op.drop_table('prediction_summary')
@@ -0,0 +1,38 @@
+"""history keyset index
+
+Revision ID: 7d1e2b9c5a43
+Revises: 3c9a4e71d2f8
+Create Date: 2026-10-18 11:03:27.552190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d1e2b9c5a43'
+down_revision = '3c9a4e71d2f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = ['user_id', sa.text('created_at DESC'), 'id']
+    if op.get_bind().dialect.name == 'postgresql':
+        # Build without blocking inserts on a large table
+        with op.get_context().autocommit_block():
+            op.create_index('ix_prediction_user_created_id', 'prediction', columns,
+                            unique=False, postgresql_concurrently=True)
+    else:
+        op.create_index('ix_prediction_user_created_id', 'prediction', columns, unique=False)
+
+    # The composite index's leading column makes the single-column one redundant
+    with op.batch_alter_table('prediction', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_prediction_user_id'))
+
+
+def downgrade():
+    with op.batch_alter_table('prediction', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_prediction_user_id'), ['user_id'], unique=False)
+
+    op.drop_index('ix_prediction_user_created_id', table_name='prediction')
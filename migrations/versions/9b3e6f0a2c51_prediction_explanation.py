@@ -0,0 +1,27 @@
+"""prediction explanation
+
+Revision ID: 9b3e6f0a2c51
+Revises: f6a2d8c41b73
+Create Date: 2026-10-18 19:47:12.604381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e6f0a2c51'
+down_revision = 'f6a2d8c41b73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # On Postgres the column is added to every monthly partition with it
+    with op.batch_alter_table('prediction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('explanation', sa.JSON(none_as_null=True), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('prediction', schema=None) as batch_op:
+        batch_op.drop_column('explanation')
@@ -0,0 +1,26 @@
+"""prediction model version
+
+Revision ID: a52f0c8e6b19
+Revises: 7d1e2b9c5a43
+Create Date: 2026-10-18 13:26:05.904115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a52f0c8e6b19'
+down_revision = '7d1e2b9c5a43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('prediction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('model_version', sa.String(length=16), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('prediction', schema=None) as batch_op:
+        batch_op.drop_column('model_version')
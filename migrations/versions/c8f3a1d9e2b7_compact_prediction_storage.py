@@ -0,0 +1,86 @@
+"""compact prediction storage
+
+Revision ID: c8f3a1d9e2b7
+Revises: a52f0c8e6b19
+Create Date: 2026-10-18 17:40:12.406381
+
+Existing rows keep their JSON and stay readable; `flask
+compact-predictions` moves them into the typed columns in batches.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f3a1d9e2b7'
+down_revision = 'a52f0c8e6b19'
+branch_labels = None
+depends_on = None
+
+FEATURE_COLUMNS = (
+    ('age', 'age'),
+    ('sex', 'sex'),
+    ('chest pain type', 'chest_pain_type'),
+    ('resting bp s', 'resting_bp_s'),
+    ('cholesterol', 'cholesterol'),
+    ('fasting blood sugar', 'fasting_blood_sugar'),
+    ('resting ecg', 'resting_ecg'),
+    ('max heart rate', 'max_heart_rate'),
+    ('exercise angina', 'exercise_angina'),
+    ('oldpeak', 'oldpeak'),
+    ('ST slope', 'st_slope'),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('prediction', schema=None) as batch_op:
+        batch_op.alter_column('input_json', existing_type=sa.JSON(), nullable=True)
+        batch_op.alter_column('output_json', existing_type=sa.JSON(), nullable=True)
+        for _, column in FEATURE_COLUMNS:
+            batch_op.add_column(sa.Column(column, sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('input_ints', sa.SmallInteger(), nullable=True))
+        batch_op.add_column(sa.Column('label', sa.SmallInteger(), nullable=True))
+        batch_op.add_column(sa.Column('probability_0', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('probability_1', sa.Float(), nullable=True))
+
+
+def downgrade():
+    # Rebuild the JSON of compacted rows before the typed columns go
+    columns = [column for _, column in FEATURE_COLUMNS]
+    prediction = sa.table(
+        'prediction',
+        sa.column('id', sa.Integer()),
+        sa.column('input_json', sa.JSON()),
+        sa.column('output_json', sa.JSON()),
+        sa.column('input_ints', sa.Integer()),
+        sa.column('label', sa.Integer()),
+        sa.column('probability_0', sa.Float()),
+        sa.column('probability_1', sa.Float()),
+        *(sa.column(column, sa.Float()) for column in columns)
+    )
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(prediction).where(sa.or_(prediction.c.input_json.is_(None),
+                                           prediction.c.output_json.is_(None)))
+    ).mappings().all()
+    for row in rows:
+        values = {}
+        if row['input_json'] is None and row['input_ints'] is not None:
+            values['input_json'] = {
+                name: int(row[column]) if row['input_ints'] >> i & 1 else row[column]
+                for i, (name, column) in enumerate(FEATURE_COLUMNS)
+            }
+        if row['output_json'] is None and row['label'] is not None:
+            values['output_json'] = {
+                'prediction': [row['label']],
+                'probability': [[row['probability_0'], row['probability_1']]]
+            }
+        if values:
+            bind.execute(prediction.update().where(prediction.c.id == row['id']).values(**values))
+
+    with op.batch_alter_table('prediction', schema=None) as batch_op:
+        for column in columns + ['input_ints', 'label', 'probability_0', 'probability_1']:
+            batch_op.drop_column(column)
+        batch_op.alter_column('input_json', existing_type=sa.JSON(), nullable=False)
+        batch_op.alter_column('output_json', existing_type=sa.JSON(), nullable=False)
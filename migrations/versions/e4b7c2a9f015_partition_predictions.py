@@ -0,0 +1,114 @@
+"""partition predictions by month
+
+Revision ID: e4b7c2a9f015
+Revises: c8f3a1d9e2b7
+Create Date: 2026-10-18 18:21:37.118620
+
+On Postgres `prediction` becomes a table range-partitioned by created_at,
+one partition per UTC month (prediction_pYYYY_MM), with primary key
+(id, created_at). Partitions are created from the oldest row through
+three months ahead and the rows are copied over, so run it in a
+maintenance window on large tables. Other databases keep the plain
+table. prediction_daily holds the rollups written by the retention job.
+
+There is deliberately no DEFAULT partition: with one, Postgres can no
+longer scan the partitions in created_at order and stop at the LIMIT,
+which is what keeps recent-history queries on the newest partitions.
+
+"""
+from datetime import date, datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7c2a9f015'
+down_revision = 'c8f3a1d9e2b7'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _bound(month):
+    return f"'{month:%Y-%m-%d} 00:00:00+00'"
+
+
+def upgrade():
+    op.create_table('prediction_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_count', sa.Integer(), nullable=False),
+    sa.Column('positive_count', sa.Integer(), nullable=False),
+    sa.Column('negative_count', sa.Integer(), nullable=False),
+    sa.Column('probability_sum', sa.Float(), nullable=False),
+    sa.Column('probability_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'user_id')
+    )
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.execute('ALTER TABLE prediction RENAME TO prediction_unpartitioned')
+    op.execute('ALTER TABLE prediction_unpartitioned RENAME CONSTRAINT prediction_pkey TO prediction_unpartitioned_pkey')
+    op.execute('ALTER INDEX ix_prediction_user_created_id RENAME TO ix_prediction_unpartitioned_user_created_id')
+    op.execute("UPDATE prediction_unpartitioned SET created_at = now() WHERE created_at IS NULL")
+
+    # Same columns, defaults (the id sequence) and NOT NULLs
+    op.execute('CREATE TABLE prediction (LIKE prediction_unpartitioned INCLUDING DEFAULTS) '
+               'PARTITION BY RANGE (created_at)')
+    op.execute('ALTER TABLE prediction ALTER COLUMN created_at SET NOT NULL')
+    op.execute('ALTER TABLE prediction ADD CONSTRAINT prediction_pkey PRIMARY KEY (id, created_at)')
+    op.execute('ALTER TABLE prediction ADD CONSTRAINT prediction_user_id_fkey FOREIGN KEY (user_id) '
+               'REFERENCES "user" (id) ON DELETE CASCADE')
+    op.execute('CREATE INDEX ix_prediction_user_created_id ON prediction (user_id, created_at DESC, id)')
+
+    oldest = bind.execute(sa.text('SELECT min(created_at) FROM prediction_unpartitioned')).scalar()
+    today = datetime.now(timezone.utc).date()
+    month = date((oldest or today).year, (oldest or today).month, 1)
+    last = _add_months(date(today.year, today.month, 1), MONTHS_AHEAD)
+    while month <= last:
+        following = _add_months(month, 1)
+        op.execute(f'CREATE TABLE prediction_p{month:%Y_%m} PARTITION OF prediction '
+                   f'FOR VALUES FROM ({_bound(month)}) TO ({_bound(following)})')
+        month = following
+
+    op.execute('INSERT INTO prediction SELECT * FROM prediction_unpartitioned')
+
+    # The sequence belongs to the old table's column; move it before the drop
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence('prediction_unpartitioned', 'id')")).scalar()
+    if sequence:
+        op.execute(f'ALTER SEQUENCE {sequence} OWNED BY prediction.id')
+    op.execute('DROP TABLE prediction_unpartitioned')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('ALTER TABLE prediction RENAME TO prediction_partitioned')
+        op.execute('ALTER TABLE prediction_partitioned RENAME CONSTRAINT prediction_pkey TO prediction_partitioned_pkey')
+        op.execute('ALTER TABLE prediction_partitioned RENAME CONSTRAINT prediction_user_id_fkey TO prediction_partitioned_user_id_fkey')
+        op.execute('ALTER INDEX ix_prediction_user_created_id RENAME TO ix_prediction_partitioned_user_created_id')
+
+        op.execute('CREATE TABLE prediction (LIKE prediction_partitioned INCLUDING DEFAULTS)')
+        op.execute('ALTER TABLE prediction ALTER COLUMN created_at DROP NOT NULL')
+        op.execute('ALTER TABLE prediction ADD CONSTRAINT prediction_pkey PRIMARY KEY (id)')
+        op.execute('ALTER TABLE prediction ADD CONSTRAINT prediction_user_id_fkey FOREIGN KEY (user_id) '
+                   'REFERENCES "user" (id) ON DELETE CASCADE')
+        op.execute('INSERT INTO prediction SELECT * FROM prediction_partitioned')
+        op.execute('CREATE INDEX ix_prediction_user_created_id ON prediction (user_id, created_at DESC, id)')
+
+        sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence('prediction_partitioned', 'id')")).scalar()
+        if sequence:
+            op.execute(f'ALTER SEQUENCE {sequence} OWNED BY prediction.id')
+        # Drops the attached partitions with it
+        op.execute('DROP TABLE prediction_partitioned')
+
+    op.drop_table('prediction_daily')
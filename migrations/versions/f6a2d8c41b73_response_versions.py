@@ -0,0 +1,32 @@
+"""response versions
+
+Revision ID: f6a2d8c41b73
+Revises: e4b7c2a9f015
+Create Date: 2026-10-18 19:02:44.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6a2d8c41b73'
+down_revision = 'e4b7c2a9f015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('prediction_summary', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('prediction_summary', schema=None) as batch_op:
+        batch_op.drop_column('version')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('version')
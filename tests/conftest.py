@@ -0,0 +1,28 @@
+import pytest
+
+from app.config import Config
+
+
+@pytest.fixture
+def configure(monkeypatch, tmp_path):
+    """Point Config at a fresh SQLite file in tmp_path before create_app.
+
+    Call it again with another `name` to give the next app its own
+    database. The model loads eagerly and background pollers stay off, so
+    runs are deterministic.
+    """
+    def configure(name='app', **overrides):
+        settings = {
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / name}.db',
+            'SQLALCHEMY_ENGINE_OPTIONS': {},
+            'JWT_SECRET': 'test-secret-' + 'x' * 32,
+            'MODEL_WARMUP': 'eager',
+            'MODEL_POLL_INTERVAL': 0,
+            'PREDICTION_PARTITION_CHECK_INTERVAL': 0,
+        }
+        settings.update(overrides)
+        for key, value in settings.items():
+            monkeypatch.setattr(Config, key, value)
+        return Config
+
+    return configure
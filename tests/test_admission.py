@@ -0,0 +1,125 @@
+import asyncio
+import threading
+
+import pytest
+
+from app import create_app, db
+from app.admission import AdmissionControl, AdmissionRejected, Lane, TokenBuckets, queue_seconds
+from app.auth import issue_token
+from app.models import User
+
+ROW = [54, 1, 2, 150, 195, 0, 0, 122, 0, 0.0, 1]
+
+
+def test_token_bucket_allows_bursts_then_limits():
+    buckets = TokenBuckets(rate=1, burst=2)
+    assert buckets.take('ada') == 0 and buckets.take('ada') == 0
+    assert buckets.take('ada') == pytest.approx(1.0, abs=0.01)
+    # Buckets are per key
+    assert buckets.take('bob') == 0
+    assert buckets.stats() == {'rate': 1, 'burst': 2, 'keys': 2, 'limited': 1}
+
+
+def test_evicted_buckets_come_back_full():
+    buckets = TokenBuckets(rate=0.001, burst=1, max_keys=1)
+    assert buckets.take('ada') == 0 and buckets.take('ada') > 0
+    buckets.take('bob')
+    assert buckets.stats()['keys'] == 1
+    assert buckets.take('ada') == 0
+
+
+def test_full_lane_rejects_at_once():
+    lane = Lane('predict', max_in_flight=1, max_queue=0)
+    lane.acquire()
+    with pytest.raises(AdmissionRejected) as rejected:
+        lane.acquire()
+    assert rejected.value.status == 503
+    assert rejected.value.headers() == {'Retry-After': '1'}
+
+    lane.release(0.01)
+    lane.acquire()
+    stats = lane.stats()
+    assert (stats['in_flight'], stats['admitted'], stats['rejected']) == (1, 2, 1)
+
+
+def test_queued_requests_wait_for_a_slot():
+    lane = Lane('predict', max_in_flight=1, max_queue=1, max_wait=5)
+    lane.acquire()
+    waiter = threading.Thread(target=lane.acquire)
+    waiter.start()
+    while lane.stats()['waiting'] == 0:
+        waiter.join(0.001)
+    lane.release(0.01)
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert (lane.in_flight, lane.admitted, lane.waiting) == (1, 2, 0)
+
+
+def test_queued_requests_time_out():
+    lane = Lane('predict', max_in_flight=1, max_queue=1, max_wait=0.01)
+    lane.acquire()
+    with pytest.raises(AdmissionRejected):
+        lane.acquire()
+    assert (lane.timed_out, lane.rejected, lane.waiting) == (1, 1, 0)
+
+
+def test_async_waiters_are_woken():
+    lane = Lane('predict', max_in_flight=1, max_queue=1, max_wait=5)
+
+    async def scenario():
+        await lane.acquire_async()
+        asyncio.get_running_loop().call_later(0.01, lane.release, 0.01)
+        await lane.acquire_async()
+
+    asyncio.run(scenario())
+    assert (lane.in_flight, lane.admitted, lane.timed_out) == (1, 2, 0)
+
+
+@pytest.mark.parametrize('header, seconds', [
+    ('1000000000000', 999.0),
+    ('t=1000000000.000', 999.0),
+    ('t=1000000000000000', 999.0),
+    ('garbled', None),
+    ('', None),
+])
+def test_queue_seconds(header, seconds):
+    queued = queue_seconds({'X-Request-Start': header}, now=1000000999.0)
+    assert queued == (pytest.approx(seconds) if seconds is not None else None)
+
+
+def test_stale_requests_are_dropped():
+    control = AdmissionControl([Lane('predict', 1)], max_queue_time=5)
+    with pytest.raises(AdmissionRejected):
+        control.enter('predict', {'X-Request-Start': 't=1'})
+    assert control.stale == 1
+    assert control.enter('predict', {}).in_flight == 1
+
+
+@pytest.fixture
+def app(configure):
+    configure(RATE_LIMIT_PER_USER=0.01, RATE_LIMIT_BURST=2)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def test_rate_limited_user_gets_429(app):
+    user = User(username='ada', password_hash='x', full_name='Ada L')
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + issue_token(user, app.config['JWT_SECRET'])['access_token']}
+
+    statuses = [client.post('/api/predict', json={'features': ROW}, headers=headers).status_code
+                for _ in range(2)]
+    assert statuses == [200, 200]
+
+    response = client.post('/api/predict', json={'features': ROW}, headers=headers)
+    assert response.status_code == 429
+    assert 90 <= int(response.headers['Retry-After']) <= 100
+    assert response.get_json() == {'msg': 'rate limit exceeded, retry later'}
+    # The rejected request never took a slot
+    lane = app.admission.stats()['lanes']['predict']
+    assert (lane['admitted'], lane['in_flight']) == (2, 0)
+    assert app.admission.stats()['user_limits']['limited'] == 1
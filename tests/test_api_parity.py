@@ -0,0 +1,192 @@
+"""The Flask app and the asyncio app answer the same requests alike.
+
+One script of requests runs against `create_app()` and
+`create_async_app()`, each on its own SQLite database; status codes,
+content types and bodies must match once timestamps, tokens and cursors
+(which encode timestamps) are masked.
+
+Needs the asyncio stack from requirements-dev.txt; without it the module
+is skipped, with the missing package named in the skip reason.
+"""
+import asyncio
+import csv
+import io
+import json
+import re
+
+import pytest
+
+from app import create_app, db
+
+# Everything app.aio imports; all in requirements-dev.txt
+for module in ('quart', 'quart_cors', 'aiosqlite', 'greenlet'):
+    pytest.importorskip(module, reason=f'{module} missing: pip install -r requirements-dev.txt')
+
+from app.aio import create_async_app  # noqa: E402
+
+ROW = [54, 1, 2, 150, 195, 0, 0, 122, 0, 0.0, 1]
+OTHER = [61, 0, 4, 130, 330, 1, 2, 98, 1, 2.5, 2]
+COLUMNS = ["age", "sex", "chest pain type", "resting bp s", "cholesterol",
+           "fasting blood sugar", "resting ecg", "max heart rate",
+           "exercise angina", "oldpeak", "ST slope"]
+
+USER = dict(username='parity', password='pw-123456', full_name='Par Ity',
+            date_of_birth='1990-01-02', blood_type='A', gender='F')
+
+# (method, path, json body, extra) where extra may ask for the bearer
+# token ('auth') and/or the ETag of the previous response ('etag')
+SCRIPT = [
+    ('POST', '/auth/register', USER, ()),
+    ('POST', '/auth/register', USER, ()),
+    ('POST', '/auth/register', {'username': 'incomplete'}, ()),
+    ('POST', '/auth/login', {'username': 'parity', 'password': 'wrong'}, ()),
+    ('POST', '/auth/login', {'username': 'parity', 'password': USER['password']}, ()),
+    ('GET', '/user/profile', None, ()),
+    ('GET', '/user/profile', None, ('auth',)),
+    ('GET', '/user/dashboard', None, ('auth',)),
+    ('GET', '/user/history', None, ('auth',)),
+    ('POST', '/api/predict', {'features': ROW}, ('auth',)),
+    ('POST', '/api/predict', {'row': dict(zip(COLUMNS, OTHER))}, ('auth',)),
+    ('POST', '/api/predict', {'features': ROW, 'explain': True}, ('auth',)),
+    ('POST', '/api/predict', {'features': ROW[:5]}, ('auth',)),
+    ('POST', '/api/predict', {'features': ROW[:9] + ['nan', 1]}, ('auth',)),
+    ('POST', '/api/predict', {'row': {'age': 50}}, ('auth',)),
+    ('POST', '/api/predict', {}, ('auth',)),
+    ('POST', '/api/predict', {'features': ROW}, ()),
+    ('POST', '/api/predict/batch',
+     {'features': [ROW, OTHER, ROW[:3], ROW[:9] + ['inf', 1], ROW[:9] + ['x', 1],
+                   ROW[:9] + [10 ** 400, 1], OTHER]}, ('auth',)),
+    ('POST', '/api/predict/batch', {'rows': [dict(zip(COLUMNS, OTHER)), {'age': 1}]}, ('auth',)),
+    ('POST', '/api/predict/batch', {'features': []}, ('auth',)),
+    ('POST', '/api/predict/batch', {'features': [ROW] * 5001}, ('auth',)),
+    ('GET', '/user/dashboard', None, ('auth',)),
+    ('GET', '/user/dashboard', None, ('auth', 'etag')),
+    ('GET', '/user/history', None, ('auth',)),
+    ('GET', '/user/history', None, ('auth', 'etag')),
+    ('GET', '/user/history?per_page=2', None, ('auth',)),
+    ('GET', '/user/history?per_page=2&cursor={next_cursor}', None, ('auth',)),
+    ('GET', '/user/history?per_page=2&cursor={prev_cursor}', None, ('auth',)),
+    ('GET', '/user/history?per_page=3&page=2', None, ('auth',)),
+    ('GET', '/user/history?per_page=3&page=2&include_total=false', None, ('auth',)),
+    ('GET', '/user/history?cursor=garbage', None, ('auth',)),
+    ('GET', '/user/history/export', None, ('auth',)),
+    ('GET', '/user/history/export?format=csv', None, ('auth',)),
+    ('GET', '/user/history/export?format=xml', None, ('auth',)),
+    ('GET', '/user/profile', None, ('auth', 'etag')),
+    ('GET', '/', None, ()),
+]
+
+TIMESTAMP = re.compile(r'\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d(\.\d+)?([+-]\d\d:\d\d)?')
+MASKED_KEYS = {'access_token', 'next_cursor', 'prev_cursor'}
+
+
+def mask(value):
+    if isinstance(value, dict):
+        return {key: ('<masked>' if key in MASKED_KEYS and item is not None else mask(item))
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [mask(item) for item in value]
+    if isinstance(value, str):
+        return TIMESTAMP.sub('<timestamp>', value)
+    return value
+
+
+def decode(mimetype, text):
+    if mimetype == 'application/json':
+        return json.loads(text)
+    if mimetype == 'application/x-ndjson':
+        return [json.loads(line) for line in text.splitlines()]
+    if mimetype == 'text/csv':
+        return list(csv.reader(io.StringIO(text)))
+    return text
+
+
+class Script:
+    """Walks SCRIPT, carrying the token, cursors and last ETag along."""
+
+    def __init__(self):
+        self.state = {}
+        self.results = []
+
+    def request(self, step):
+        method, path, body, extra = step
+        headers = {}
+        if 'auth' in extra:
+            headers['Authorization'] = f"Bearer {self.state['access_token']}"
+        if 'etag' in extra:
+            headers['If-None-Match'] = self.state['etag']
+        return method, path.format(**self.state), body, headers
+
+    def record(self, step, status, mimetype, text, etag):
+        body = decode(mimetype, text) if text else None
+        if isinstance(body, dict):
+            for key in ('access_token', 'next_cursor', 'prev_cursor'):
+                if body.get(key):
+                    self.state[key] = body[key]
+        if etag:
+            self.state['etag'] = etag
+        # A bodiless 304 has no meaningful content type (Quart says text/html)
+        self.results.append((step[0], step[1], status, mimetype if text else None, mask(body)))
+
+
+def run_flask(app):
+    script = Script()
+    client = app.test_client()
+    for step in SCRIPT:
+        method, path, body, headers = script.request(step)
+        response = client.open(path, method=method, json=body, headers=headers)
+        script.record(step, response.status_code, response.mimetype,
+                      response.get_data(as_text=True), response.headers.get('ETag'))
+    return script.results
+
+
+async def run_quart(app):
+    script = Script()
+    async with app.test_app() as test_app:
+        client = test_app.test_client()
+        for step in SCRIPT:
+            method, path, body, headers = script.request(step)
+            response = await client.open(path, method=method, json=body, headers=headers)
+            script.record(step, response.status_code, response.mimetype,
+                          await response.get_data(as_text=True), response.headers.get('ETag'))
+    return script.results
+
+
+def create_tables(flask_app):
+    with flask_app.app_context():
+        db.create_all()
+
+
+@pytest.fixture
+def results(configure):
+    configure('flask')
+    flask_app = create_app()
+    create_tables(flask_app)
+    flask_results = run_flask(flask_app)
+
+    configure('quart')
+    quart_app = create_async_app()
+    create_tables(quart_app.flask_app)
+    quart_results = asyncio.run(run_quart(quart_app))
+    return flask_results, quart_results
+
+
+def test_same_responses(results):
+    flask_results, quart_results = results
+    assert len(flask_results) == len(quart_results) == len(SCRIPT)
+    for flask_result, quart_result in zip(flask_results, quart_results):
+        assert quart_result == flask_result
+
+
+def test_script_covers_the_api(results):
+    # Guards the comparison against both apps failing the same way
+    flask_results, _ = results
+    assert [status for _, path, status, _, _ in flask_results if path == '/api/predict/batch'] == \
+        [200, 200, 400, 413]
+    assert [status for _, path, status, _, _ in flask_results if path == '/api/predict'] == \
+        [200, 200, 200, 400, 400, 400, 400, 401]
+    batch = next(body for _, path, status, _, body in flask_results if path == '/api/predict/batch')
+    assert (batch['succeeded'], batch['failed']) == (3, 4)
+    assert flask_results[22][2] == 304
+    exported = next(body for _, path, _, _, body in flask_results if path == '/user/history/export')
+    assert len(exported) == 7
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.batching import MicroBatcher
+from app.executor import PoolSaturated
+
+BAD = 13.0
+
+
+class FakeModel:
+    """Labels each row by its first value; a row starting with BAD fails the whole call."""
+
+    def __init__(self, error=ValueError):
+        self.error = error
+        self.calls = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def score(self, model, X):
+        self.calls.append(len(X))
+        self.entered.set()
+        self.release.wait(5)
+        if (X[:, 0] == BAD).any():
+            raise self.error('bad row')
+        return X[:, 0].astype(np.int64), None
+
+
+def submit_all(batcher, fake, firsts):
+    """Submit a row that blocks the dispatcher, then `firsts` as one batch."""
+    results = {}
+
+    def go(first):
+        try:
+            results[first] = batcher.submit(fake, [first, 0.0])[0].tolist()
+        except Exception as e:
+            results[first] = type(e).__name__
+
+    blocker = threading.Thread(target=go, args=(0.0,))
+    blocker.start()
+    assert fake.entered.wait(5)
+    threads = [threading.Thread(target=go, args=(first,)) for first in firsts]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while batcher._queue.qsize() < len(firsts) and time.monotonic() < deadline:
+        time.sleep(0.001)
+    fake.release.set()
+    for thread in [blocker] + threads:
+        thread.join(5)
+    return results
+
+
+def test_bad_row_only_fails_its_own_request():
+    fake = FakeModel()
+    batcher = MicroBatcher(max_wait=0.05, score=fake.score)
+    results = submit_all(batcher, fake, [1.0, BAD, 2.0])
+
+    assert results == {0.0: [0], 1.0: [1], BAD: 'ValueError', 2.0: [2]}
+    assert fake.calls[:2] == [1, 3]
+    assert batcher.stats()['split_batches'] == 1
+
+
+def test_capacity_errors_are_not_retried_row_by_row():
+    fake = FakeModel(error=PoolSaturated)
+    batcher = MicroBatcher(max_wait=0.05, score=fake.score)
+    results = submit_all(batcher, fake, [1.0, BAD])
+
+    assert results == {0.0: [0], 1.0: 'PoolSaturated', BAD: 'PoolSaturated'}
+    assert fake.calls == [1, 2]
+    assert batcher.stats()['split_batches'] == 0
+
+
+@pytest.mark.parametrize('value', [np.nan, np.inf, -np.inf])
+def test_non_finite_rows_are_refused(value):
+    fake = FakeModel()
+    batcher = MicroBatcher(score=fake.score)
+    with pytest.raises(ValueError):
+        batcher.submit(fake, [1.0, value])
+    assert fake.calls == []
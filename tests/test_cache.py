@@ -0,0 +1,144 @@
+import os
+
+import pytest
+
+from app import create_app, db
+from app.auth import issue_token
+from app.cache import PredictionCache
+from app.models import Prediction, User
+
+ROW = [54, 1, 2, 150, 195, 0, 0, 122, 0, 0.0, 1]
+OUTPUT = {'prediction': [0], 'probability': [[0.9, 0.1]]}
+ML_DIR = os.path.join(os.path.dirname(__file__), '..', 'app', 'ml')
+
+
+def bound(**kwargs):
+    cache = PredictionCache(**kwargs)
+    cache.bind('v1')
+    return cache
+
+
+def test_hit_after_set():
+    cache = bound()
+    assert cache.get(ROW) is None
+    cache.set(ROW, OUTPUT)
+    hit = cache.get([float(v) for v in ROW], 'v1')
+    assert hit == OUTPUT
+    # Callers may add to the output without touching the cached entry
+    hit['explanation'] = {}
+    assert cache.get(ROW) == OUTPUT
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (2, 1)
+
+
+def test_negative_zero_is_the_same_vector():
+    cache = bound()
+    cache.set(ROW[:9] + [0.0, 1], OUTPUT)
+    assert cache.get(ROW[:9] + [-0.0, 1]) == OUTPUT
+
+
+def test_unbound_cache_never_answers():
+    cache = PredictionCache()
+    cache.set(ROW, OUTPUT)
+    assert cache.get(ROW) is None
+
+
+def test_lookups_for_another_model_miss():
+    cache = bound()
+    cache.set(ROW, OUTPUT, 'v1')
+    assert cache.get(ROW, 'v2') is None
+    cache.set(ROW[:10] + [2], OUTPUT, 'v2')
+    assert cache.stats()['entries'] == 1
+
+
+def test_rebinding_to_a_new_model_clears_entries():
+    cache = bound()
+    cache.set(ROW, OUTPUT)
+    cache.bind('v1')
+    assert cache.get(ROW) == OUTPUT
+    cache.bind('v2')
+    assert cache.get(ROW) is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_least_recently_used_is_evicted_first():
+    cache = bound(max_entries=2)
+    rows = [ROW[:10] + [i] for i in range(3)]
+    cache.set(rows[0], OUTPUT)
+    cache.set(rows[1], OUTPUT)
+    cache.get(rows[0])
+    cache.set(rows[2], OUTPUT)
+    assert [cache.get(row) is not None for row in rows] == [True, False, True]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_memory_cap_bounds_the_entries():
+    cache = bound(max_bytes=1000)
+    for i in range(20):
+        cache.set(ROW[:10] + [i], OUTPUT)
+    stats = cache.stats()
+    assert 0 < stats['entries'] < 20
+    assert stats['bytes'] <= 1000
+
+
+def test_expired_entries_miss():
+    cache = bound(ttl=0)
+    cache.set(ROW, OUTPUT)
+    assert cache.get(ROW) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_changed_model_file_invalidates(tmp_path):
+    path = tmp_path / 'model.joblib'
+    path.write_bytes(b'one')
+    cache = PredictionCache(check_interval=0)
+    cache.bind('v1', str(path))
+    cache.set(ROW, OUTPUT)
+    assert cache.get(ROW) == OUTPUT
+
+    path.write_bytes(b'second version')
+    assert cache.get(ROW) is None
+    assert cache.stats()['invalidations'] == 1
+
+
+@pytest.fixture
+def app(configure):
+    configure()
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(username='ada', password_hash='x', full_name='Ada L')
+        db.session.add(user)
+        db.session.commit()
+        app.test_headers = {
+            'Authorization': f"Bearer {issue_token(user, app.config['JWT_SECRET'])['access_token']}"
+        }
+        yield app
+
+
+def test_cache_hit_skips_the_model_but_keeps_history(app, monkeypatch):
+    client = app.test_client()
+    first = client.post('/api/predict', json={'features': ROW}, headers=app.test_headers)
+    assert first.status_code == 200
+
+    model = app.model_registry.current
+    monkeypatch.setattr(type(model), 'score', lambda self, X: pytest.fail('scored a cached row'))
+    second = client.post('/api/predict', json={'features': ROW}, headers=app.test_headers)
+
+    assert second.json == first.json
+    assert app.prediction_cache.stats()['hits'] == 1
+    assert db.session.scalar(db.select(db.func.count()).select_from(Prediction)) == 2
+
+
+def test_model_swap_invalidates(app):
+    client = app.test_client()
+    client.post('/api/predict', json={'features': ROW}, headers=app.test_headers)
+    old = app.model_registry.current.version
+    assert app.prediction_cache.stats()['entries'] == 1
+
+    swapped = app.model_registry.reload(os.path.join(ML_DIR, 'model.joblib'))
+    assert swapped is not None and swapped.version != old
+    stats = app.prediction_cache.stats()
+    assert (stats['fingerprint'], stats['entries']) == (swapped.version, 0)
+
+    client.post('/api/predict', json={'features': ROW}, headers=app.test_headers)
+    assert app.prediction_cache.stats()['misses'] == 2
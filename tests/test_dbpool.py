@@ -0,0 +1,112 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool, QueuePool
+
+from app import create_app, db
+from app.dbpool import PoolKeepalive, _prepared_statement_name, engine_options, pool_budget, pool_status
+
+STATIC = {'pool_size': 10, 'max_overflow': 20, 'pool_pre_ping': True}
+POSTGRES = 'postgresql+psycopg2://app@db/app'
+
+
+def settings(profile, **overrides):
+    config = {'DB_POOL_PROFILE': profile, 'SQLALCHEMY_ENGINE_OPTIONS': STATIC,
+              'DB_CONNECTION_BUDGET': 60, 'DB_CONNECTION_RESERVE': 5, 'DB_POOL_WORKERS': 4,
+              'DB_POOL_TIMEOUT': 10.0, 'DB_POOL_RECYCLE': 1800}
+    config.update(overrides)
+    return config
+
+
+def test_pool_budget_splits_the_usable_connections():
+    assert pool_budget(settings('budget')) == 13
+    assert pool_budget(settings('budget', DB_POOL_WORKERS=0)) == 55
+    # Every worker keeps at least one connection
+    assert pool_budget(settings('budget', DB_CONNECTION_BUDGET=4, DB_CONNECTION_RESERVE=5)) == 1
+
+
+def test_static_profile_keeps_the_configured_options():
+    options = engine_options(settings('static'), POSTGRES)
+    assert options == STATIC and options is not STATIC
+
+
+def test_budget_profiles_are_hard_capped():
+    budget = engine_options(settings('budget'), POSTGRES)
+    assert budget == {'pool_size': 13, 'max_overflow': 0, 'pool_timeout': 10.0,
+                      'pool_recycle': 1800, 'pool_pre_ping': True}
+    background = engine_options(settings('background'), POSTGRES)
+    assert background == dict(budget, pool_pre_ping=False, pool_use_lifo=True)
+
+
+@pytest.mark.parametrize('uri, connect_args', [
+    (POSTGRES, None),
+    ('postgresql+psycopg://app@db/app', {'prepare_threshold': None}),
+    ('postgresql+asyncpg://app@db/app', {'statement_cache_size': 0, 'prepared_statement_cache_size': 0,
+                                         'prepared_statement_name_func': _prepared_statement_name}),
+])
+def test_pgbouncer_profile(uri, connect_args):
+    options = engine_options(settings('pgbouncer'), uri)
+    assert options.pop('poolclass') is NullPool
+    assert options.pop('pool_pre_ping') is False
+    assert options.get('connect_args') == connect_args
+    assert _prepared_statement_name() != _prepared_statement_name()
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match='DB_POOL_PROFILE'):
+        engine_options(settings('huge'), POSTGRES)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/pool.db', poolclass=QueuePool, pool_size=3)
+    yield engine
+    engine.dispose()
+
+
+def idle_connections(engine, count):
+    connections = [engine.connect() for _ in range(count)]
+    for connection in connections:
+        connection.close()
+
+
+def test_keepalive_pings_every_idle_connection(engine):
+    keepalive = PoolKeepalive(app=None, interval=0)
+    keepalive.check(engine)
+    assert (keepalive.checks, keepalive.pinged) == (1, 0)
+
+    idle_connections(engine, 2)
+    status = pool_status(engine)
+    assert (status['class'], status['checkedin'], status['checkedout']) == ('QueuePool', 2, 0)
+
+    keepalive.check(engine)
+    assert (keepalive.checks, keepalive.pinged, keepalive.failures) == (2, 2, 0)
+    # Nothing opened and nothing left checked out
+    assert (pool_status(engine)['checkedin'], pool_status(engine)['checkedout']) == (2, 0)
+
+
+def test_keepalive_records_failures(engine):
+    idle_connections(engine, 1)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def fail(*args):
+        raise RuntimeError('server closed the connection')
+
+    keepalive = PoolKeepalive(app=None, interval=0)
+    keepalive.check(engine)
+    stats = keepalive.stats()
+    assert (stats['checks'], stats['pinged'], stats['failures']) == (1, 0, 1)
+    assert stats['last_error'] == 'server closed the connection'
+
+
+def test_health_reports_the_budget(configure):
+    configure(MODEL_WARMUP='background', DB_POOL_PROFILE='background', DB_CONNECTION_BUDGET=12,
+              DB_CONNECTION_RESERVE=2, DB_POOL_WORKERS=2, DB_POOL_PING_INTERVAL=0)
+    app = create_app()
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS']['pool_size'] == 5
+
+    pool = app.test_client().get('/health').get_json()['database_pool']
+    assert pool['profile'] == 'background'
+    assert pool['budget'] == {'total': 12, 'reserve': 2, 'workers': 2, 'per_worker': 5}
+    assert pool['keepalive']['interval'] == 0
+    with app.app_context():
+        assert db.engine.pool.size() == 5
@@ -0,0 +1,83 @@
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app import fastjson
+from app.fastjson import FastJSONProvider
+
+pytestmark = pytest.mark.skipif(fastjson.orjson is None, reason='orjson is not installed')
+
+# Bodies the stdlib provider can encode as they are
+PLAIN = [
+    {'k': 1},
+    {'b': [1, 2.5, None, True], 'a': {'z': 'x', 'y': ''}},
+    {'prediction': [0], 'probability': [[0.995, 0.005]]},
+    [1, 'two', 3.0],
+    {'small': 1e-05, 'tiny': 5e-7, 'big': 1e16, 'huge': 2 ** 70},
+    {'name': 'Zoë', 'city': '東京'},
+    {'s': 'quote " backslash \\ newline \n tab \t'},
+    'text',
+    0.1,
+]
+
+# Bodies only FastJSONProvider accepts or writes differently from Flask's
+EXTENDED = [
+    {'nan': float('nan'), 'inf': [float('inf'), -float('inf')], 'ok': 1.5},
+    {'nan': float('nan'), 'name': 'Zoë'},
+    {'nan': float('nan'), 'big': 1e16},
+    {'f32': np.float32(0.1), 'f64': np.float64(0.2), 'i': np.int64(3), 'b': np.bool_(True)},
+    {'array': np.array([[0.1, np.nan], [1e16, 2.0]]), 'f32': np.array([0.1], dtype=np.float32)},
+    {'array': np.array([1e-5, np.inf], dtype=np.float32)},
+    {'when': datetime(2025, 1, 2, 3, 4, 5, 6, tzinfo=timezone.utc), 'day': date(2025, 1, 2)},
+]
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    with app.app_context():
+        yield app
+
+
+def encode(provider, body):
+    return provider.response(body).get_data()
+
+
+def stdlib_only(app, monkeypatch):
+    monkeypatch.setattr(fastjson, 'orjson', None)
+    return FastJSONProvider(app)
+
+
+@pytest.mark.parametrize('body', PLAIN)
+def test_response_matches_flask(app, body):
+    assert encode(FastJSONProvider(app), body) == encode(DefaultJSONProvider(app), body)
+
+
+@pytest.mark.parametrize('body', PLAIN)
+def test_dumps_matches_flask(app, body):
+    assert FastJSONProvider(app).dumps(body) == DefaultJSONProvider(app).dumps(body)
+
+
+@pytest.mark.parametrize('body', PLAIN + EXTENDED)
+def test_both_paths_agree(app, monkeypatch, body):
+    fast = encode(FastJSONProvider(app), body)
+    assert fast == encode(stdlib_only(app, monkeypatch), body)
+
+
+def test_extended_values(app):
+    body = encode(FastJSONProvider(app), EXTENDED[0] | EXTENDED[3] | EXTENDED[6])
+    assert body == (b'{"b":true,"day":"2025-01-02","f32":0.10000000149011612,"f64":0.2,"i":3,'
+                    b'"inf":[null,null],"nan":null,"ok":1.5,"when":"2025-01-02T03:04:05.000006+00:00"}\n')
+
+
+@pytest.mark.parametrize('raw', [
+    b'{"features": [1, 2.5, -3]}',
+    b'{"n": 123456789012345678901234567890}',
+    b'{"x": NaN}',
+    '{"name": "Zoë"}'.encode(),
+])
+def test_loads_matches_flask(app, raw):
+    assert repr(FastJSONProvider(app).loads(raw)) == repr(DefaultJSONProvider(app).loads(raw))
@@ -0,0 +1,150 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import load
+
+from app.forest import ForestEngine
+from app.predict import REQUIRED_COLS
+from app.registry import ModelVersion
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'app', 'ml', 'rf_model.joblib')
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    return load(MODEL_PATH)
+
+
+@pytest.fixture(scope='module')
+def engine(pipeline):
+    engine = ForestEngine.from_model(pipeline)
+    assert engine is not None
+    return engine
+
+
+def split_points(engine):
+    """(feature, threshold) of every internal node, thresholds in the
+    scaled space the trees compare in."""
+    internal = engine.left != np.arange(len(engine.left))
+    pairs = np.unique(np.column_stack([engine.feature[internal], engine.threshold[internal]]), axis=0)
+    return pairs[:, 0].astype(np.intp), pairs[:, 1]
+
+
+def assert_matches(model, engine, X):
+    X_model = pd.DataFrame(X, columns=REQUIRED_COLS) if hasattr(model, 'feature_names_in_') else X
+    pred, proba = engine.predict(X)
+    assert np.array_equal(proba, model.predict_proba(X_model))
+    assert np.array_equal(engine.predict_proba(X), proba)
+    assert np.array_equal(pred, model.predict(X_model))
+
+
+def test_random_rows(pipeline, engine):
+    rng = np.random.default_rng(0)
+    low = -engine.min_ / engine.scale_
+    high = (1 - engine.min_) / engine.scale_
+    X = rng.uniform(low, high, size=(2000, engine.n_features))
+    X[:1000] = np.round(X[:1000])
+    assert_matches(pipeline, engine, X)
+
+
+def test_out_of_range_rows(pipeline, engine):
+    low = -engine.min_ / engine.scale_
+    high = (1 - engine.min_) / engine.scale_
+    span = high - low
+    X = np.vstack([
+        np.zeros(engine.n_features),
+        low, high,
+        low - span, high + span,
+        np.full(engine.n_features, -1e9),
+        np.full(engine.n_features, 1e9),
+    ])
+    assert_matches(pipeline, engine, X)
+
+
+def test_raw_inputs_on_thresholds(pipeline, engine):
+    # Raw values that scale onto each split threshold, and their float64
+    # neighbours, varied one feature at a time from a typical row
+    features, thresholds = split_points(engine)
+    raw = (thresholds - engine.min_[features]) / engine.scale_[features]
+    base = np.array([54, 1, 2, 150, 195, 0, 0, 122, 0, 0.0, 1], dtype=np.float64)
+    rows = []
+    for value in (raw, np.nextafter(raw, -np.inf), np.nextafter(raw, np.inf)):
+        X = np.repeat(base[None, :], len(features), axis=0)
+        X[np.arange(len(features)), features] = value
+        rows.append(X)
+    assert_matches(pipeline, engine, np.vstack(rows))
+
+
+def test_forest_inputs_on_thresholds(pipeline):
+    # Without the scaler the inputs hit the thresholds exactly, both as
+    # stored (float64) and after the float32 cast the trees apply
+    forest = pipeline.named_steps['model']
+    engine = ForestEngine.from_model(forest)
+    features, thresholds = split_points(engine)
+    rng = np.random.default_rng(1)
+    rows = []
+    for value in (
+        thresholds,
+        thresholds.astype(np.float32).astype(np.float64),
+        np.nextafter(thresholds.astype(np.float32), np.float32(-np.inf)).astype(np.float64),
+        np.nextafter(thresholds.astype(np.float32), np.float32(np.inf)).astype(np.float64),
+    ):
+        X = rng.uniform(0, 1, size=(len(features), engine.n_features))
+        X[np.arange(len(features)), features] = value
+        rows.append(X)
+    assert_matches(forest, engine, np.vstack(rows))
+
+
+def test_saved_artifact_matches(pipeline, engine, tmp_path):
+    engine.save(str(tmp_path / 'engine'))
+    mapped = ForestEngine.load(str(tmp_path / 'engine'))
+    X = np.random.default_rng(2).uniform(0, 200, size=(500, engine.n_features))
+    assert_matches(pipeline, mapped, X)
+
+
+def test_verify(pipeline, engine):
+    assert engine.verify(pipeline)
+
+
+def test_rejects_non_finite_rows(engine):
+    X = np.zeros((2, engine.n_features))
+    X[1, 3] = np.nan
+    with pytest.raises(ValueError):
+        engine.predict(X)
+
+
+def explain_rows(engine):
+    return np.random.default_rng(3).uniform(0, 200, size=(300, engine.n_features))
+
+
+def test_explanations_add_up(engine):
+    X = explain_rows(engine)
+    bias, contributions = engine.explain(X)
+    assert contributions.shape == (len(X), engine.n_features, len(engine.classes_))
+    assert np.allclose(bias + contributions.sum(axis=1), engine.predict_proba(X))
+
+    bias_1, contributions_1 = engine.explain(X, class_index=1)
+    assert bias_1 == bias[1]
+    assert np.array_equal(contributions_1, contributions[:, :, 1])
+
+
+def test_per_row_class_index(engine):
+    X = explain_rows(engine)
+    index = np.arange(len(X)) % 2
+    bias, contributions = engine.explain(X, class_index=index)
+    full_bias, full = engine.explain(X)
+    assert np.array_equal(bias, full_bias[index])
+    assert np.array_equal(contributions, full[np.arange(len(X)), :, index])
+
+
+def test_model_explains_the_predicted_class(pipeline, engine):
+    X = explain_rows(engine)
+    labels, proba = engine.predict(X)
+    assert len(set(labels.tolist())) == 2
+
+    explained, bias, contributions = ModelVersion('v1', MODEL_PATH, pipeline, engine, 0).explain(X)
+    assert np.array_equal(explained, labels)
+    predicted = proba[np.arange(len(X)), np.argmax(proba, axis=1)]
+    assert np.allclose(bias + contributions.sum(axis=1), predicted)
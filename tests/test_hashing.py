@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.hashing import HashingBusy, PasswordHasher
+from app.models import User
+
+FAST = 'pbkdf2:sha256:1000'
+
+
+@pytest.fixture
+def blocker():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(method=FAST)
+    pwhash = hasher.hash('secret')
+    assert pwhash.startswith(FAST + '$')
+    assert hasher.verify(pwhash, 'secret') and not hasher.verify(pwhash, 'wrong')
+    stats = hasher.stats()
+    assert (stats['completed'], stats['in_flight'], stats['hash_ms']['samples']) == (3, 0, 3)
+
+
+def test_saturated_pool_rejects(blocker):
+    hasher = PasswordHasher(method=FAST, workers=1, max_queue=1)
+    hasher._submit(blocker.wait, 5)
+    queued = hasher.submit_hash('queued')
+    with pytest.raises(HashingBusy):
+        hasher.submit_hash('one too many')
+    assert hasher.stats()['rejected'] == 1
+
+    blocker.set()
+    assert hasher.wait(queued).startswith(FAST)
+    # Slots come back once the work is done
+    assert hasher.hash('again').startswith(FAST)
+
+
+def test_slow_operations_time_out(blocker):
+    hasher = PasswordHasher(method=FAST, workers=1, timeout=0.05)
+    with pytest.raises(HashingBusy):
+        hasher.wait(hasher._submit(blocker.wait, 5))
+    assert hasher.stats()['timeouts'] == 1
+
+
+def test_needs_rehash():
+    hasher = PasswordHasher(method=FAST)
+    assert not hasher.needs_rehash(generate_password_hash('pw', FAST))
+    assert hasher.needs_rehash(generate_password_hash('pw', 'pbkdf2:sha256:2000'))
+    assert hasher.needs_rehash(generate_password_hash('pw', 'scrypt:1024:8:1'))
+
+
+@pytest.fixture
+def app(configure):
+    configure(MODEL_WARMUP='background', PASSWORD_HASH_METHOD=FAST, PASSWORD_HASH_WORKERS=1,
+              PASSWORD_HASH_MAX_QUEUE=0)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def add_user(pwhash):
+    db.session.add(User(username='ada', password_hash=pwhash, full_name='Ada L'))
+    db.session.commit()
+
+
+def login(client, password='secret'):
+    return client.post('/auth/login', json={'username': 'ada', 'password': password})
+
+
+def test_login_upgrades_old_hashes(app):
+    add_user(generate_password_hash('secret', 'pbkdf2:sha256:2000'))
+    client = app.test_client()
+    assert login(client, 'wrong').status_code == 401
+    assert login(client).status_code == 200
+
+    db.session.expire_all()
+    assert db.session.scalar(db.select(User.password_hash)).startswith(FAST + '$')
+    assert app.password_hasher.stats()['rehashed'] == 1
+    assert login(client).status_code == 200
+    assert app.password_hasher.stats()['rehashed'] == 1
+
+
+def test_busy_pool_answers_503(app, blocker):
+    add_user(generate_password_hash('secret', FAST))
+    app.password_hasher._submit(blocker.wait, 5)
+    response = login(app.test_client())
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
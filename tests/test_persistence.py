@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from app import create_app, db, persistence
+from app.models import Prediction, PredictionSummary, User
+from app.persistence import PredictionWriter, save_predictions
+from app.predict import REQUIRED_COLS
+
+ROW = [54, 1, 2, 150, 195, 0, 0, 122, 0, 0.0, 1]
+
+
+@pytest.fixture
+def app(configure):
+    configure(MODEL_WARMUP='background')
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='ada', password_hash='x', full_name='Ada L'))
+        db.session.commit()
+        yield app
+
+
+def record(label=0, user_id=1):
+    return {
+        'user_id': user_id,
+        'input_json': dict(zip(REQUIRED_COLS, ROW)),
+        'output_json': {'prediction': [label], 'probability': [[1.0 - label, float(label)]]},
+        'model_version': 'v1',
+    }
+
+
+def stored():
+    db.session.expire_all()
+    return db.session.scalar(db.select(db.func.count()).select_from(Prediction))
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_sync_mode_writes_rows_and_summary(app):
+    save_predictions([record(0), record(1), record(1)])
+    summary = db.session.get(PredictionSummary, 1)
+    assert stored() == 3
+    assert (summary.total_count, summary.positive_count, summary.negative_count) == (3, 2, 1)
+
+
+def test_writer_flushes_in_the_background(app):
+    writer = PredictionWriter(app, batch_size=2, flush_interval=0.05)
+    writer.submit([record(), record(), record()])
+    wait_for(lambda: writer.flushed == 3)
+
+    assert stored() == 3
+    assert writer.stats()['batches'] == 2
+    assert db.session.get(PredictionSummary, 1).total_count == 3
+    writer.close()
+
+
+def test_full_queue_writes_inline(app, monkeypatch):
+    # Hold the flusher inside its first insert so the queue fills up
+    entered, release = threading.Event(), threading.Event()
+    insert = persistence.insert_predictions
+
+    def slow_insert(records):
+        if threading.current_thread().name == 'prediction-writer':
+            entered.set()
+            release.wait(5)
+        insert(records)
+
+    monkeypatch.setattr(persistence, 'insert_predictions', slow_insert)
+    writer = PredictionWriter(app, max_queue=1, flush_interval=0.01, put_timeout=0.01)
+    writer.submit([record()])
+    assert entered.wait(5)
+    writer.submit([record(), record(), record()])
+
+    # One record queued behind the flusher, the other two written inline
+    assert writer.sync_fallbacks == 1
+    assert stored() == 2
+
+    release.set()
+    writer.close()
+    assert stored() == 4
+    assert (writer.flushed, writer.dropped) == (4, 0)
+
+
+def test_failed_batch_is_retried_row_by_row(app, monkeypatch, caplog):
+    insert = persistence.insert_predictions
+
+    def picky_insert(records):
+        if any(r['user_id'] == 99 for r in records):
+            raise ValueError('bad row')
+        insert(records)
+
+    monkeypatch.setattr(persistence, 'insert_predictions', picky_insert)
+    writer = PredictionWriter(app)
+    with caplog.at_level(logging.ERROR, logger='app.persistence'):
+        writer._write([record(), record(user_id=99), record()])
+
+    assert stored() == 2
+    assert (writer.flushed, writer.retried_rows, writer.dropped) == (2, 2, 1)
+    assert writer.last_error == 'bad row'
+    assert any('dropped prediction record' in message for message in caplog.messages)
+
+
+def test_close_drains_the_queue(app):
+    writer = PredictionWriter(app, batch_size=1000, flush_interval=0.2)
+    writer.submit([record() for _ in range(5)])
+    writer.close()
+    assert stored() == 5
+    assert writer.stats()['queued'] == 0
+
+
+def test_async_mode_is_wired_into_save_predictions(configure):
+    configure(MODEL_WARMUP='background', PREDICTION_WRITE_MODE='async',
+              PREDICTION_WRITE_FLUSH_INTERVAL=0.05)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        save_predictions([record(user_id=None)])
+        assert app.prediction_writer.submitted == 1
+        wait_for(lambda: app.prediction_writer.flushed == 1)
+        assert stored() == 1
+        app.prediction_writer.close()
@@ -0,0 +1,46 @@
+import pytest
+
+from app.predict import REQUIRED_COLS, parse_batch, parse_row
+
+ROW = [54, 1, 2, 150, 195, 0, 0, 122, 0, 0.0, 1]
+HUGE = 10 ** 400
+
+
+def with_oldpeak(value):
+    return ROW[:9] + [value, 1]
+
+
+@pytest.mark.parametrize('value', ['nan', 'NaN', 'inf', '-inf', float('nan'), float('inf'), 1e999, HUGE])
+def test_single_row_rejects_unscorable_values(value):
+    row, X, error, status = parse_row({'features': with_oldpeak(value)})
+    assert (X, status, error['msg']) == (None, 400, 'invalid feature values')
+
+
+def test_single_row_accepts_numeric_strings():
+    row, X, error, status = parse_row({'row': dict(zip(REQUIRED_COLS, map(str, ROW)))})
+    assert error is None
+    assert X.tolist() == [[float(v) for v in ROW]]
+
+
+def test_bad_rows_are_reported_not_fatal():
+    items = [ROW, with_oldpeak('nan'), with_oldpeak('inf'), with_oldpeak(HUGE),
+             with_oldpeak('x'), with_oldpeak(None), ROW[:3], ROW]
+    batch, error, status = parse_batch({'features': items}, max_rows=100)
+    assert error is None
+    total, rows, values, indices, errors = batch
+    assert (total, indices) == (8, [0, 7])
+    assert values == [[float(v) for v in ROW]] * 2
+    assert [e['index'] for e in errors] == [1, 2, 3, 4, 5, 6]
+    assert {e['msg'] for e in errors[:5]} == {'invalid feature values'}
+
+
+@pytest.mark.parametrize('payload, status', [
+    (None, 400),
+    ({}, 400),
+    ({'features': []}, 400),
+    ({'features': 'x'}, 400),
+    ({'features': [ROW] * 3}, 413),
+])
+def test_batch_level_errors(payload, status):
+    batch, error, got = parse_batch(payload, max_rows=2)
+    assert (batch, got) == (None, status)
@@ -0,0 +1,63 @@
+import io
+import json
+
+import pytest
+
+from app import create_app, db
+from app.models import User
+from app.provision import _validate, provision_users, read_users
+
+USER = dict(username='ada', password='pw-123456', full_name='Ada L', date_of_birth='1990-01-02',
+            blood_type='AB', gender='F')
+
+
+@pytest.fixture
+def app(configure):
+    configure(MODEL_WARMUP='background')
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+@pytest.mark.parametrize('field, limit', [
+    ('username', 80), ('full_name', 200), ('blood_type', 3), ('gender', 10),
+])
+def test_over_long_values_are_invalid(field, limit):
+    row, error = _validate(dict(USER, **{field: 'x' * limit}))
+    assert error is None and row[field] == 'x' * limit
+
+    row, error = _validate(dict(USER, **{field: 'x' * (limit + 1)}))
+    assert row is None
+    assert error == f'{field} must be at most {limit} characters'
+
+
+def test_validate_rejects_bad_rows():
+    assert _validate(['not', 'a', 'dict'])[1] == 'row must be an object'
+    assert _validate(dict(USER, gender=''))[1] == 'all data must be filled in'
+    assert _validate(dict(USER, date_of_birth='02/01/1990'))[1] == 'date_of_birth must be YYYY-MM-DD'
+
+
+def test_provision_reports_invalid_rows_and_loads_the_rest(app):
+    records = [
+        USER,
+        dict(USER, username='bob', blood_type='ABCD'),
+        dict(USER, username='c' * 81),
+        dict(USER, username='dan', gender='x' * 11),
+        dict(USER, username='eve'),
+        USER,
+    ]
+    stream = io.StringIO(''.join(json.dumps(record) + '\n' for record in records) + '{oops\n')
+    errors = []
+
+    report = provision_users(read_users(stream, 'ndjson'), method='pbkdf2:sha256:1000', processes=1,
+                             on_error=lambda line, error: errors.append((line, error)))
+
+    assert {key: report[key] for key in ('read', 'created', 'invalid', 'skipped_duplicate')} == \
+        {'read': 7, 'created': 2, 'invalid': 4, 'skipped_duplicate': 1}
+    assert [line for line, _ in errors] == [2, 3, 4, 7]
+    assert errors[0][1] == 'blood_type must be at most 3 characters'
+    assert sorted(db.session.scalars(db.select(User.username))) == ['ada', 'eve']
+
+    again = provision_users([(1, USER)], method='pbkdf2:sha256:1000', processes=1)
+    assert (again['created'], again['skipped_existing']) == (0, 1)
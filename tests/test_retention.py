@@ -0,0 +1,135 @@
+import json
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from app import create_app, db
+from app.models import Prediction, PredictionDaily, PredictionSummary, User
+from app.partitions import (add_months, apply_retention, month_start, months_to_retire,
+                            partition_name)
+from app.persistence import insert_predictions
+
+THIS_MONTH = month_start(datetime.now(timezone.utc).date())
+OLD = add_months(THIS_MONTH, -2)
+
+
+def test_month_helpers():
+    assert add_months(date(2024, 11, 1), 2) == date(2025, 1, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert month_start(date(2024, 2, 29)) == date(2024, 2, 1)
+    assert partition_name(date(2024, 3, 1)) == 'prediction_p2024_03'
+
+
+@pytest.fixture
+def app(configure):
+    configure(MODEL_WARMUP='background')
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def at(month, day, hour=12):
+    return datetime(month.year, month.month, day, hour, tzinfo=timezone.utc)
+
+
+def record(user_id, created_at, label, probability=None):
+    probability = label * 0.5 + 0.25 if probability is None else probability
+    return {'user_id': user_id, 'created_at': created_at, 'input_json': {'age': 50},
+            'output_json': {'prediction': [label], 'probability': [[1 - probability, probability]]}}
+
+
+@pytest.fixture
+def history(app):
+    ada = User(username='ada', password_hash='x', full_name='Ada L')
+    bob = User(username='bob', password_hash='x', full_name='Bob B')
+    db.session.add_all([ada, bob])
+    db.session.commit()
+    insert_predictions([
+        record(ada.id, at(OLD, 1), 1),
+        record(ada.id, at(OLD, 1, 18), 0),
+        record(ada.id, at(OLD, 2), 1),
+        record(bob.id, at(OLD, 3), 0),
+        record(None, at(OLD, 3), 1),
+        record(ada.id, at(add_months(OLD, 1), 1, 0) - timedelta(microseconds=1), 1),
+        record(ada.id, at(THIS_MONTH, 1), 0),
+    ])
+    return ada.id, bob.id
+
+
+def summary(user_id):
+    db.session.expire_all()
+    row = db.session.get(PredictionSummary, user_id)
+    return row.total_count, row.positive_count, row.negative_count
+
+
+def test_months_to_retire(history):
+    assert months_to_retire(db.session, 1, partitioned=False) == [OLD, add_months(OLD, 1)]
+    assert months_to_retire(db.session, 2, partitioned=False) == [OLD]
+    assert months_to_retire(db.session, 3, partitioned=False) == []
+
+
+def test_retention_rolls_up_and_deletes(history):
+    ada, bob = history
+    assert summary(ada) == (5, 3, 2)
+
+    months = []
+    report = apply_retention(2, on_month=lambda month, rows: months.append((month, rows)))
+    assert report == {'partitioned': False, 'months': [f'{OLD:%Y-%m}'], 'rows': 6}
+    assert months == [(OLD, 6)]
+
+    remaining = db.session.scalars(db.select(Prediction.created_at)).all()
+    assert len(remaining) == 1
+
+    daily = {(row.day, row.user_id): (row.total_count, row.positive_count, row.negative_count,
+                                      row.probability_sum, row.probability_count)
+             for row in db.session.scalars(db.select(PredictionDaily))}
+    last_day = add_months(OLD, 1) - timedelta(days=1)
+    assert daily == {
+        (OLD, ada): (2, 1, 1, 1.0, 2),
+        (OLD.replace(day=2), ada): (1, 1, 0, 0.75, 1),
+        (last_day, ada): (1, 1, 0, 0.75, 1),
+        (OLD.replace(day=3), bob): (1, 0, 1, 0.25, 1),
+        (OLD.replace(day=3), 0): (1, 1, 0, 0.75, 1),
+    }
+
+    # The summaries count only what history can still serve
+    assert summary(ada) == (1, 0, 1)
+    assert summary(bob) == (0, 0, 0)
+    db.session.expire_all()
+    assert db.session.get(PredictionSummary, bob).latest_prediction_id is None
+    assert db.session.get(PredictionSummary, ada).latest_prediction_id is not None
+
+
+def test_rerun_adds_to_existing_rollups(history):
+    ada, _ = history
+    apply_retention(2)
+    insert_predictions([record(ada, at(OLD, 1, 20), 1, probability=0.5)])
+    assert apply_retention(2)['rows'] == 1
+
+    row = db.session.get(PredictionDaily, (OLD, ada))
+    assert (row.total_count, row.positive_count, row.probability_sum) == (3, 2, 1.5)
+    assert summary(ada) == (1, 0, 1)
+
+
+def test_legacy_json_rows_roll_up(app):
+    insert_predictions([record(None, at(OLD, 5), 1, probability=0.6)])
+    # Written before the typed columns existed
+    db.session.execute(db.update(Prediction).values(
+        label=None, probability_0=None, probability_1=None,
+        output_blob={'prediction': [1], 'probability': [[0.4, 0.6]]}))
+    db.session.commit()
+
+    apply_retention(1)
+    row = db.session.get(PredictionDaily, (OLD.replace(day=5), 0))
+    assert (row.total_count, row.positive_count, row.probability_sum) == (1, 1, 0.6)
+
+
+def test_retain_command(history, app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['retain-predictions', '--keep-months', '0'])
+    assert result.exit_code != 0 and 'at least 1' in result.output
+
+    result = runner.invoke(args=['retain-predictions', '--keep-months', '1'])
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.stdout.splitlines()[-1])['rows'] == 6
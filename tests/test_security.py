@@ -0,0 +1,117 @@
+import asyncio
+import time
+from datetime import date
+
+import jwt
+import pytest
+
+from app import create_app, db
+from app.auth import issue_token
+from app.models import User
+from app.security import AuthCache, UserSnapshot, verify_token
+
+SECRET = 'test-secret-' + 'x' * 32
+
+
+def add_user(username='ada'):
+    user = User(username=username, password_hash='x', full_name='Ada L',
+                date_of_birth=date(1990, 1, 2), blood_type='A', gender='F')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def app(configure):
+    configure(MODEL_WARMUP='background')
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def test_tokens_expire_with_their_signature():
+    cache = AuthCache(ttl=60)
+    cache.put_token('a', 1)
+    cache.put_token('b', 2, exp=time.time() - 1)
+    assert (cache.get_token('a'), cache.get_token('b')) == (1, None)
+    assert (cache.stats()['token_hits'], cache.stats()['token_misses']) == (1, 1)
+
+
+def test_least_recently_used_entries_are_dropped():
+    cache = AuthCache(max_entries=2)
+    for token in 'abc':
+        cache.put_token(token, 1)
+    assert [cache.get_token(token) for token in 'abc'] == [None, 1, 1]
+
+
+def test_verify_token_caches_the_user_id():
+    cache = AuthCache()
+    token = jwt.encode({'sub': '7', 'exp': int(time.time()) + 60}, SECRET, algorithm='HS256')
+    assert verify_token(token, SECRET, cache) == 7
+    # Served from the cache: the secret is no longer consulted
+    assert verify_token(token, 'wrong-secret-' + 'y' * 32, cache) == 7
+    with pytest.raises(jwt.InvalidTokenError):
+        verify_token(token, 'wrong-secret-' + 'y' * 32)
+
+
+def test_commit_invalidates_the_users_snapshot(app):
+    ada, bob = add_user('ada'), add_user('bob')
+    cache = app.auth_cache
+    cache.put_user(UserSnapshot(ada))
+    cache.put_user(UserSnapshot(bob))
+
+    ada.full_name = 'Ada King'
+    db.session.flush()
+    # Not before the commit, so a concurrent request can't re-cache the old row
+    assert cache.get_user(ada.id) is not None
+    db.session.commit()
+
+    assert cache.get_user(ada.id) is None
+    assert cache.get_user(bob.id) is not None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_rollback_keeps_the_snapshot(app):
+    ada = add_user()
+    app.auth_cache.put_user(UserSnapshot(ada))
+    ada.full_name = 'Ada King'
+    db.session.flush()
+    db.session.rollback()
+    assert app.auth_cache.get_user(ada.id) is not None
+
+
+def test_profile_reflects_an_update(app):
+    ada = add_user()
+    headers = {'Authorization': f"Bearer {issue_token(ada, app.config['JWT_SECRET'])['access_token']}"}
+    client = app.test_client()
+    assert client.get('/user/profile', headers=headers).json['full_name'] == 'Ada L'
+
+    ada.full_name = 'Ada King'
+    db.session.commit()
+    assert client.get('/user/profile', headers=headers).json['full_name'] == 'Ada King'
+
+
+def test_async_commit_invalidates_the_snapshot(configure):
+    for module in ('quart', 'quart_cors', 'aiosqlite', 'greenlet'):
+        pytest.importorskip(module)
+    from app.aio import create_async_app
+
+    configure(MODEL_WARMUP='background')
+    app = create_async_app()
+    core = app.flask_app
+    with core.app_context():
+        db.create_all()
+        ada = add_user()
+        core.auth_cache.put_user(UserSnapshot(ada))
+
+    async def rename():
+        # No Flask app context here, as in the async app's views
+        async with app.test_app():
+            async with app.db_session() as session:
+                user = await session.get(User, ada.id)
+                user.full_name = 'Ada King'
+                await session.commit()
+
+    asyncio.run(rename())
+    assert core.auth_cache.get_user(ada.id) is None
@@ -0,0 +1,91 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from app import create_app, db
+from app.export import serialize_prediction
+from app.models import FEATURE_COLUMNS, Prediction, compact_values
+from app.persistence import compact_predictions
+
+INPUTS = dict(zip([name for name, _ in FEATURE_COLUMNS], [54, 1, 2, 150, 195, 0, 0, 122, 0, 1.5, 1]))
+OUTPUT = {'prediction': [1], 'probability': [[0.25, 0.75]]}
+
+
+def test_compact_values_types_both_sides():
+    values = compact_values({'user_id': 7, 'input_json': INPUTS, 'output_json': OUTPUT})
+    assert values['input_blob'] is None and values['output_blob'] is None
+    assert (values['user_id'], values['age'], values['oldpeak'], values['st_slope']) == (7, 54, 1.5, 1)
+    # Every feature but oldpeak was sent as an integer
+    assert values['input_ints'] == (1 << len(FEATURE_COLUMNS)) - 1 - (1 << 9)
+    assert (values['label'], values['probability_0'], values['probability_1']) == (1, 0.25, 0.75)
+
+
+@pytest.mark.parametrize('inputs, output', [
+    (dict(INPUTS, extra=1), OUTPUT),
+    (dict(INPUTS, age='54'), OUTPUT),
+    (dict(INPUTS, age=2 ** 60), OUTPUT),
+    (dict(INPUTS, oldpeak=-0.0), OUTPUT),
+    (INPUTS, {'prediction': [1, 0], 'probability': [[0.25, 0.75], [0.5, 0.5]]}),
+    (INPUTS, {'prediction': [1], 'probability': [[0.25, 0.75]], 'model_version': 'v1'}),
+])
+def test_lossy_values_keep_their_json(inputs, output):
+    values = compact_values({'input_json': inputs, 'output_json': output})
+    assert (values['input_blob'], values['output_blob']) in [
+        (inputs, None), (None, output), (inputs, output)]
+    if values['input_blob'] is not None:
+        assert values['input_ints'] is None and values['age'] is None
+    if values['output_blob'] is not None:
+        assert values['label'] is None
+
+
+@pytest.fixture
+def app(configure):
+    configure(MODEL_WARMUP='background')
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def insert_json_rows(rows):
+    # Rows as written before the typed columns existed
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    db.session.execute(db.insert(Prediction), [
+        {'input_blob': inputs, 'output_blob': output, 'created_at': created_at}
+        for inputs, output in rows
+    ])
+    db.session.commit()
+
+
+def snapshot():
+    db.session.expire_all()
+    return [serialize_prediction(pred) for pred in db.session.scalars(
+        db.select(Prediction).order_by(Prediction.id))]
+
+
+def test_compaction_round_trip(app):
+    odd = dict(INPUTS, age='54')
+    insert_json_rows([(INPUTS, OUTPUT), (dict(INPUTS, oldpeak=0.1), OUTPUT), (odd, OUTPUT)] * 2)
+    before = snapshot()
+
+    batches = []
+    assert compact_predictions(batch_size=4, on_batch=lambda *counts: batches.append(counts)) == (6, 6)
+    assert batches == [(4, 4), (6, 6)]
+    after = snapshot()
+    assert json.dumps(after) == json.dumps(before)
+
+    blobs = db.session.execute(
+        db.select(Prediction.input_blob, Prediction.output_blob).order_by(Prediction.id)).all()
+    assert [tuple(row) for row in blobs] == [(None, None), (None, None), (odd, None)] * 2
+
+    # Only the row that has to keep its input JSON is looked at again
+    assert compact_predictions() == (2, 0)
+
+
+def test_compact_command(app):
+    insert_json_rows([(INPUTS, OUTPUT)])
+    result = app.test_cli_runner().invoke(args=['compact-predictions', '--batch-size', '10'])
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.stdout.splitlines()[-1]) == {'scanned': 1, 'compacted': 1}
+    assert snapshot()[0]['input_json'] == INPUTS